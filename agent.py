@@ -1,10 +1,25 @@
 # agent.py
 import json
-from tools import list_files, read_file, write_file, delete_path, search_files, create_folder, open_browser, modify_file, git_push, git_workflow, git_create_branch, git_checkout_branch, git_list_branches, get_pc_config, install_python_package, git_clone, launch_application, print_file, search_web, fetch_webpage, search_and_summarize
-from freya_llm import client  # ton client Groq déjà configuré
-from trm_validator import get_validator, validate_tool_call
+from tools import list_files, read_file, write_file, delete_path, search_files, create_folder, open_browser, modify_file, git_push, git_workflow, git_create_branch, git_checkout_branch, git_list_branches, get_pc_config, install_python_package, git_clone, launch_application, print_file, search_web, fetch_webpage, search_and_summarize, read_stored_result
+from freya_llm import chat_completion, model_for  # backend LLM configuré (avec cache)
+from trm_validator import HIGH_RISK_ACTIONS, get_validator, validate_tool_call, warm_up_validator
+from tool_executor import run_tool_calls, run_plan_steps, resolve_step_refs, step_failed
+from plan_stream import PlanPipeline, StepStreamParser, parse_plan_text, plan_streaming_enabled
+from intent_router import route as route_intents
+from fast_path import get_fast_path
+from disk_cache import get_plan_cache
+from memory_manager import MemoryManager
+from conversation_store import ConversationStore
+from result_store import offload_large_result
+from tool_selection import ToolSelector
+from tracing import get_tracer, traced
+import hashlib
 import os
 import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 # Définition des outils pour Groq
 TOOL_DEFS = [
@@ -309,11 +324,35 @@ TOOL_DEFS = [
                 "required": ["query"]
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "read_stored_result",
+            "description": "Lit la suite d'un gros résultat d'outil stocké (handle indiqué dans le résultat)",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "handle": {"type": "string", "description": "Handle du résultat stocké"},
+                    "offset": {"type": "integer", "description": "Position de départ en caractères (défaut 0)"},
+                    "length": {"type": "integer", "description": "Nombre de caractères à lire (défaut 2000)"}
+                },
+                "required": ["handle"]
+            }
+        }
     }
 
 ]
 
+# Sous-ensembles de TOOL_DEFS envoyés selon les intentions de la requête
+TOOL_SELECTOR = ToolSelector(TOOL_DEFS)
+
+# Réponse enregistrée après un outil du chemin rapide (le résultat est dans le message "tool")
+FAST_PATH_REPLY = "Résultat de {tool} affiché à l'utilisateur."
+
+@traced("call_tool")
 def call_tool(tool_name, arguments):
+    get_tracer().annotate(tool=tool_name)
     if tool_name == "list_files":
         path = arguments.get("path") or "."
         return list_files(path)
@@ -384,36 +423,78 @@ def call_tool(tool_name, arguments):
     elif tool_name == "search_and_summarize":
         query = arguments["query"]
         return search_and_summarize(query)
+    elif tool_name == "read_stored_result":
+        handle = arguments["handle"]
+        offset = arguments.get("offset", 0)
+        length = arguments.get("length", 2000)
+        return read_stored_result(handle, offset, length)
     return "Outil inconnu"
 
 
+def _plan_cache_key(message, context, planning_prompt):
+    """Clé du cache de plans: demande normalisée + hash du contexte + hash du prompt, des outils et du modèle."""
+    normalized = re.sub(r"\s+", " ", message.lower()).strip().rstrip(".!? ")
+    context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+    tool_names = ",".join(tool["function"]["name"] for tool in TOOL_DEFS)
+    prompt_hash = hashlib.sha256((planning_prompt + tool_names + model_for("plan")).encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{normalized}\x00{context_hash}\x00{prompt_hash}".encode("utf-8")).hexdigest()
+
+
 # Agent FREYA en langage naturel
 class FreyaAgentNL:
-    def __init__(self):
-        self.memory = []
-        self.max_memory_length = 3  # Garder seulement les 3 derniers échanges (6 messages max)
+    def __init__(self, speculative=None, session=None):
+        """
+        Args:
+            speculative: lance en parallèle la planification et l'appel direct
+                         (défaut: variable FREYA_SPECULATIVE=1)
+            session: identifiant de la session à enregistrer ou reprendre
+                     (None = conversation non enregistrée)
+        """
+        self.memory = ConversationStore(session)  # Messages récents + journal de la session
+        if speculative is None:
+            speculative = os.getenv("FREYA_SPECULATIVE", "0") == "1"
+        self.speculative = speculative
+        self.memory_manager = MemoryManager()  # Budget de tokens (FREYA_MEMORY_BUDGET)
+        self.memory_manager.summary_lines = list(self.memory.summary_lines)
+        self._on_chunk = None  # Callback de streaming du tour en cours
+        self.last_ttft = None  # Temps jusqu'au premier token du dernier tour (secondes)
+        warm_up_validator()  # Chargement du TRM en arrière-plan (validation par règles en attendant)
 
     def _cleanup_memory(self):
-        """Nettoie la mémoire de manière agressive pour éviter les dépassements de tokens."""
-        # Garder seulement les N derniers échanges (user + assistant)
-        if len(self.memory) > self.max_memory_length * 2:
-            self.memory = self.memory[-(self.max_memory_length * 2):]
-        
-        # Si le dernier message est très long (ex: contenu de fichier), le résumer
-        for i, msg in enumerate(self.memory):
-            # Gérer à la fois les dicts et les objets
-            role = msg.get("role") if isinstance(msg, dict) else getattr(msg, "role", None)
-            content = msg.get("content", "") if isinstance(msg, dict) else getattr(msg, "content", "")
-            
-            if role == "assistant" and content and len(content) > 2000:
-                if isinstance(msg, dict):
-                    msg["content"] = content[:2000] + "\n... [contenu tronqué]"
-                else:
-                    # Remplacer l'objet par un dict
-                    self.memory[i] = {"role": "assistant", "content": content[:2000] + "\n... [contenu tronqué]"}
-
-    def _create_plan(self, message):
-        """Crée un plan d'exécution détaillé en JSON avant d'agir."""
+        """Compacte la mémoire dans le budget de tokens (tours anciens résumés, paires tool_calls/tool intactes)."""
+        self.memory.compact(self.memory_manager.pack(self.memory.to_list()), self.memory_manager.summary_lines)
+
+    def _history(self):
+        """Historique à envoyer au modèle: résumé des tours évincés + mémoire récente."""
+        summary = self.memory_manager.summary_message()
+        return ([summary] if summary else []) + self.memory.to_list()
+
+    def _plan_context(self):
+        """
+        Dernier résultat de la conversation (1500 chars max): dernière réponse
+        assistant, ou résultat de l'outil si le tour est passé par le chemin rapide.
+        """
+        messages = self.memory.to_list()
+        for i in range(len(messages) - 1, -1, -1):
+            msg = messages[i]
+            content = msg.get("content") or ""
+            if msg.get("role") != "assistant" or not content:
+                continue
+            previous = messages[i - 1] if i > 0 else {}
+            if previous.get("role") == "tool" and content == FAST_PATH_REPLY.format(tool=previous.get("name")):
+                return (previous.get("content") or "")[:1500]
+            if len(content) > 50:  # Ignorer les réponses courtes
+                return content[:1500]
+        return ""
+
+    @traced("create_plan")
+    def _create_plan(self, message, on_step=None):
+        """
+        Crée un plan d'exécution détaillé en JSON avant d'agir.
+        
+        Si on_step est fourni, le plan est streamé et on_step(step) reçoit
+        chaque étape dès que son objet JSON est complet.
+        """
         planning_prompt = """Tu es un planificateur d'actions. Analyse la demande et génère un plan JSON.
 
 IMPORTANT: Réponds UNIQUEMENT avec du JSON valide, sans texte avant ou après.
@@ -443,6 +524,7 @@ Outils disponibles:
 - search_and_summarize: {"query": "recherche"} - Recherche + extraction contenu + résumé (pour rapports détaillés)
 - launch_application: {"app_name": "nom"} - Lancer application
 - print_file: {"file_path": "chemin/fichier"} - Imprimer fichier (file_path OBLIGATOIRE!)
+- read_stored_result: {"handle": "handle", "offset": 0} - Lire la suite d'un gros résultat stocké
 
 ⚠️ RÈGLES CRITIQUES pour les fichiers de CODE:
 - Pour AJOUTER une fonction/classe dans un fichier EXISTANT → utilise modify_file avec action="append"
@@ -460,25 +542,42 @@ RÈGLES IMPORTANTES:
 2. Si l'utilisateur dit "ça", "le résumé", "le résultat", utilise le CONTEXTE ci-dessous
 3. Pour write_file, le "content" est OBLIGATOIRE - utilise le contexte si nécessaire
 4. Pour print_file, utilise "file_path" (pas "filename")
+5. Pour utiliser le résultat d'une étape précédente, écris {{step_N}} dans l'argument (N = numéro de l'étape, à partir de 1)
+6. Les étapes indépendantes sont exécutées en parallèle: ajoute "depends_on": [N] si une étape doit attendre l'étape N
 """
         
-        # Ajouter le contexte de la conversation (dernier résultat assistant)
-        context = ""
-        for msg in reversed(self.memory):
-            if isinstance(msg, dict) and msg.get("role") == "assistant" and msg.get("content"):
-                content = msg["content"]
-                if len(content) > 50:  # Ignorer les réponses courtes
-                    context = content[:1500]  # Limiter à 1500 chars
-                    break
+        # Ajouter le contexte de la conversation (dernier résultat)
+        context = self._plan_context()
+        
+        # Cache de plans: demande normalisée + contexte + prompt/outils
+        plan_cache = get_plan_cache()
+        cache_key = _plan_cache_key(message, context, planning_prompt) if plan_cache else None
+        if plan_cache:
+            cached_plan = plan_cache.get(cache_key)
+            if cached_plan is not None:
+                print("📋 Plan récupéré du cache")
+                get_tracer().annotate(cache_hit=True)
+                return cached_plan
         
         if context:
             planning_prompt += f"\n\nCONTEXTE (résultat précédent à utiliser si l'utilisateur y fait référence):\n{context}\n"
         
         planning_prompt += "\nDemande utilisateur: "
         
+        parser = StepStreamParser()
+        
+        def on_chunk(kind, data):
+            if kind == "text":
+                for step in parser.feed(data):
+                    on_step(step)
+        
         try:
-            planning_response = client.chat.completions.create(
-                model="openai/gpt-oss-120b",
+            start = time.perf_counter()
+            planning_msg, _ = chat_completion(
+                stream=on_step is not None,
+                on_chunk=on_chunk if on_step is not None else None,
+                model=model_for("plan"),
+                stage="plan",
                 messages=[
                     {"role": "system", "content": planning_prompt},
                     {"role": "user", "content": message}
@@ -486,16 +585,12 @@ RÈGLES IMPORTANTES:
                 max_tokens=800,
                 temperature=0.1
             )
-            plan_text = planning_response.choices[0].message.content
+            # Parser le JSON complet (backticks markdown enlevés)
+            plan = parse_plan_text(planning_msg.content or "")
             
-            # Nettoyer et parser le JSON
-            plan_text = plan_text.strip()
-            # Enlever les backticks markdown si présents
-            if plan_text.startswith("```"):
-                plan_text = re.sub(r'^```(?:json)?\n?', '', plan_text)
-                plan_text = re.sub(r'\n?```$', '', plan_text)
-            
-            plan = json.loads(plan_text)
+            # Mettre en cache les plans bien formés (ils seront revalidés à chaque utilisation)
+            if plan_cache and isinstance(plan, dict) and isinstance(plan.get("steps"), list):
+                plan_cache.set(cache_key, plan, cost=time.perf_counter() - start)
             return plan
             
         except json.JSONDecodeError as e:
@@ -505,114 +600,69 @@ RÈGLES IMPORTANTES:
             print(f"⚠️ Erreur création plan: {e}")
             return None
 
-    def respond(self, message):
+    def _complete(self, allow_stream=True, cancel=None, **kwargs):
+        """
+        Appel au modèle Groq, en streaming si un callback est actif pour ce tour.
+        Avec cancel (threading.Event), l'appel est streamé sans callback pour
+        pouvoir être abandonné en cours de génération.
+        """
+        if cancel is not None:
+            return chat_completion(stream=True, cancel=cancel, **kwargs)[0]
+        if self._on_chunk is None or not allow_stream:
+            return chat_completion(**kwargs)[0]
+        
+        resp_msg, ttft = chat_completion(stream=True, on_chunk=self._on_chunk, **kwargs)
+        if self.last_ttft is None and ttft is not None:
+            self.last_ttft = ttft
+        return resp_msg
+
+    def respond(self, message, on_chunk=None):
+        """
+        Traite une demande utilisateur et retourne la réponse complète.
+        
+        Si on_chunk est fourni, les appels au modèle sont streamés et
+        on_chunk(kind, data) reçoit les fragments au fil de l'eau
+        ("text" pour le texte, "tool_call" pour les appels d'outils).
+        Le temps jusqu'au premier token est disponible dans self.last_ttft.
+        """
+        self._on_chunk = on_chunk
+        self.last_ttft = None
+        try:
+            with get_tracer().span("respond", message_chars=len(message), streaming=on_chunk is not None):
+                return self._respond(message)
+        finally:
+            self._on_chunk = None
+
+    def _respond(self, message):
         # Ajouter le message utilisateur à la mémoire
         self.memory.append({"role": "user", "content": message})
         
         # Nettoyer la mémoire si elle est trop grosse
         self._cleanup_memory()
         
+        # Demande courante reconnue localement: un seul outil, sans appel au modèle
+        fast_match = get_fast_path().lookup(message)
+        if fast_match is not None:
+            result = self._execute_fast_path(fast_match)
+            if result is not None:
+                return result
+        
         # Déterminer le tool_choice en fonction de la demande
         message_lower = message.lower()
         
-        # Keywords qui demandent explicitement les outils
-        keywords_require_tools = [
-            # Modifications
-            "modifi", "rajoute", "ajoute", "change", "remplace", "crée", "écris", "insère", "supprim", "supprime", "supprimer", "dele", "delete", "efface",
-            # Installation/packages
-            "instal", "pip",
-            # Git
-            "clone", "repo", "dépôt", "push", "commit", "merge", "branch",
-            # Actions système
-            "lance", "ouvre", "exécute", "app",
-            # Impression
-            "imprim", "imprimer", "imprime", "print", "printer",
-            # Recherche web
-            "recherche", "cherche", "google", "web", "internet", "trouve", "chercher", "trouver", "résumé", "article", "page", "site",
-            # Listing/affichage - TOUS les termes pour les requêtes de contenu
-            "liste", "liste moi", "liste tous",  "lister", "affiche", "afficher", "montre", "montrer", "contenu", "quoi", "quel", "quelle",
-            "lis", "voir", "dossier", "fichier", "bureau", "desktop", "élément", "item", "fichiers", "dossiers",
-            "répertoire", "arborescence", "structure", "dans", "aller", "qu'il", "éléments"
-        ]
-        requires_tool = any(keyword in message_lower for keyword in keywords_require_tools)
-        
-        # Contexte supplémentaire: si mention de chemin SPÉCIFIQUE → force les outils
-        context_keywords = ["desktop", "bureau", "documents", "downloads", "téléchargements", "c:\\", "d:\\", "en cours", "actuel", "courant", "ici"]
-        has_specific_context = any(ctx in message_lower for ctx in context_keywords)
-        
-        if has_specific_context:
-            requires_tool = True
+        # Tous les drapeaux d'intention en un seul passage (routeur précompilé)
+        with get_tracer().span("route") as span:
+            intents = route_intents(message_lower)
+            span.set(intents=[name for name, active in intents.items() if active])
+        requires_tool = intents["requires_tool"]
+        has_specific_context = intents["specific_context"]
         
         # ========================================
         # NOUVEAU WORKFLOW AVEC TRM VALIDATION
         # ========================================
         
         # Actions complexes nécessitant planification TRM
-        complex_actions = [
-            # Création/écriture de fichiers
-            "crée", "créer", "créé", "créée", "création",
-            "écris", "écrire", "écrit", "écriture",
-            "génère", "générer", "génère", "génération",
-            "fabrique", "fabriquer", "produis", "produire",
-            "fait", "faire", "fais",
-            "met", "mettre", "mets",
-            "sauvegarde", "sauvegarder", "enregistre", "enregistrer",
-            "stocke", "stocker", "conserve", "conserver",
-            "copie", "copier", "duplique", "dupliquer",
-            "exporte", "exporter",
-            
-            # Modification de fichiers
-            "modifi", "modifier", "modifie",
-            "change", "changer", "changes",
-            "remplace", "remplacer", "remplacement",
-            "rajoute", "rajouter", "ajoute", "ajouter", "ajout",
-            "insère", "insérer", "insertion",
-            "édite", "éditer", "édition",
-            "corrige", "corriger", "correction",
-            "update", "upgrade", "maj", "mise à jour",
-            "renomme", "renommer", "rename",
-            "déplace", "déplacer", "move", "bouge", "bouger",
-            
-            # Suppression
-            "supprim", "supprimer", "supprime", "suppression",
-            "delete", "del", "remove",
-            "efface", "effacer", "effacement",
-            "retire", "retirer", "enlève", "enlever",
-            "vide", "vider", "nettoie", "nettoyer", "nettoyage",
-            "détruit", "détruire", "destruction",
-            
-            # Création de dossiers
-            "dossier", "répertoire", "directory", "folder",
-            "mkdir", "nouveau dossier",
-            
-            # Git operations
-            "git", "push", "commit", "clone", "pull", "fetch",
-            "merge", "branch", "checkout", "stash", "rebase",
-            "add", "staging", "staged",
-            
-            # Impression
-            "imprim", "imprimer", "imprime", "impression",
-            "print", "printer", "imprimante",
-            
-            # Installation
-            "install", "installe", "installer", "installation",
-            "pip", "package", "module", "librairie", "bibliothèque",
-            "désinstall", "uninstall",
-            
-            # Lancement/exécution
-            "lance", "lancer", "exécute", "exécuter", "run",
-            "démarre", "démarrer", "start", "ouvre", "ouvrir",
-            
-            # Téléchargement
-            "télécharge", "télécharger", "download",
-            "récupère", "récupérer", "fetch",
-            
-            # Multi-étapes (plusieurs actions)
-            " et ", " puis ", " ensuite ", " après ", " avant ",
-            " aussi ", " également ", " en plus ",
-            " d'abord ", " finalement ", " enfin "
-        ]
-        needs_planning = any(kw in message_lower for kw in complex_actions)
+        needs_planning = intents["needs_planning"]
         
         if needs_planning and requires_tool:
             return self._execute_with_plan(message, message_lower)
@@ -622,11 +672,10 @@ RÈGLES IMPORTANTES:
         # ========================================
         
         # Détection de demandes vagues (sans contexte spécifique)
-        vague_requests = ["liste", "lister", "affiche", "montre", "contenu"]
-        is_vague = any(kw in message_lower for kw in vague_requests) and not has_specific_context
+        is_vague = intents["is_vague"]
         
         # Utiliser "auto" pour : Git, recherche web, et demandes vagues
-        if any(kw in message_lower for kw in ["push", "commit", "git", "dépôt", "repo", "recherche", "cherche", "google", "web", "internet"]) or is_vague:
+        if intents["git"] or intents["web_search"] or is_vague:
             tool_choice = "auto"
         else:
             tool_choice = "required" if requires_tool else "auto"
@@ -649,29 +698,77 @@ Règles:
 - Git: préfère git_workflow pour workflow complet"""
         
         # Appel au modèle
-        messages_to_send = [{"role": "system", "content": system_prompt}] + self.memory
+        messages_to_send = [{"role": "system", "content": system_prompt}] + self._history()
         
-        response = client.chat.completions.create(
-            model="openai/gpt-oss-120b",
+        resp_msg = self._complete(
+            model=model_for("tools"),
+            stage="tools",
             messages=messages_to_send,
-            tools=TOOL_DEFS,
+            tools=TOOL_SELECTOR.select(intents, self.memory),
             tool_choice=tool_choice
         )
-
-        resp_msg = response.choices[0].message
         
         return self._process_response(resp_msg, message, message_lower, messages_to_send, requires_tool)
     
+    @traced("fast_path")
+    def _execute_fast_path(self, match):
+        """Exécute l'outil reconnu par le chemin rapide (None si les règles le refusent)."""
+        validation = validate_tool_call(match.tool, match.args, "", use_trm=False)
+        if not validation["approved"]:
+            get_fast_path().reject(match)
+            return None
+        
+        print(f"⚡ Chemin rapide: {match.tool}")
+        try:
+            result = call_tool(match.tool, match.args)
+        except Exception as e:
+            result = f"❌ {match.tool}: Erreur - {e}"
+        call_id = f"fast_{uuid.uuid4().hex[:12]}"
+        self.memory.append({
+            "role": "assistant",
+            "content": "",
+            "tool_calls": [{
+                "id": call_id,
+                "type": "function",
+                "function": {"name": match.tool, "arguments": json.dumps(match.args, ensure_ascii=False)}
+            }]
+        })
+        self.memory.append({
+            "role": "tool",
+            "name": match.tool,
+            "content": offload_large_result(result),
+            "tool_call_id": call_id
+        })
+        # Le résultat est déjà dans le message "tool": la réponse ne le répète pas
+        self.memory.append({"role": "assistant", "content": FAST_PATH_REPLY.format(tool=match.tool)})
+        return result
+    
     def _execute_with_plan(self, message, message_lower):
         """Exécute une requête avec planification et validation TRM."""
         print("📋 Création du plan d'exécution...")
         
         # 1. Groq génère un plan JSON
-        plan = self._create_plan(message)
+        pipeline = None
+        if self.speculative:
+            plan, direct_future = self._race_plan_and_direct(message)
+        elif plan_streaming_enabled():
+            # Plan streamé: les lectures indépendantes démarrent pendant la génération
+            pipeline = PlanPipeline(call_tool, lambda action, args: validate_tool_call(action, args, "", use_trm=False))
+            try:
+                plan, direct_future = self._create_plan(message, on_step=pipeline.offer), None
+            finally:
+                pipeline.close()
+            get_tracer().annotate(prefetched_steps=len(pipeline.started))
+        else:
+            plan, direct_future = self._create_plan(message), None
         
         if not plan:
             # Fallback: exécution directe sans plan
             print("⚠️ Plan non généré, exécution directe")
+            if direct_future is not None:
+                # Réponse directe déjà demandée en parallèle: pas de second aller-retour
+                resp_msg, messages_to_send = direct_future.result()
+                return self._process_response(resp_msg, message, message_lower, messages_to_send, True)
             return self._execute_direct(message, message_lower)
         
         print(f"📋 Plan généré: {plan.get('summary', 'N/A')}")
@@ -702,30 +799,52 @@ Règles:
         
         # 5. Exécuter le plan validé
         print("🚀 Exécution du plan validé...")
-        return self._execute_plan(plan, message_lower)
+        return self._execute_plan(plan, message_lower, pipeline, validation.get("trm_checked_steps"))
     
-    def _execute_plan(self, plan, message_lower):
-        """Exécute un plan validé étape par étape."""
-        all_results = []
+    @traced("execute_plan")
+    def _execute_plan(self, plan, message_lower, pipeline=None, trm_checked=None):
+        """
+        Exécute un plan validé, les étapes indépendantes en parallèle.
+        Les lectures déjà lancées pendant la planification (pipeline) ne sont
+        pas réexécutées: leur résultat est attendu.
+        
+        Args:
+            trm_checked: numéros (1-based) des étapes déjà évaluées par le TRM
+                         pendant la validation du plan
+        """
+        steps = plan.get("steps", [])
+        step_outputs = {}  # Résultats bruts, pour les références {{step_N}}
+        trm_checked = set(trm_checked or ())
         
-        for i, step in enumerate(plan.get("steps", [])):
+        def run_step(i, step):
             action = step.get("action", "")
-            args = step.get("args", {})
+            raw_args = step.get("args", {})
+            args = resolve_step_refs(raw_args, step_outputs)
             
             print(f"   [{i+1}] {action}...")
             
-            # Dernière validation avant exécution (règles uniquement, rapide)
-            validation = validate_tool_call(action, args, "")
+            # Dernière validation avant exécution: règles seules si le TRM a déjà
+            # évalué l'étape dans le plan; TRM pour une étape sensible non évaluée
+            # ou dont les arguments viennent d'étapes précédentes ({{step_N}})
+            use_trm = action in HIGH_RISK_ACTIONS and (i + 1 not in trm_checked or args != raw_args)
+            validation = validate_tool_call(action, args, message_lower, use_trm=use_trm)
             if not validation["approved"]:
-                all_results.append(f"❌ Étape {i+1} bloquée: {validation['reason']}")
-                continue
+                step_outputs[i] = validation["reason"]
+                return f"❌ Étape {i+1} bloquée: {validation['reason']}"
             
-            # Exécuter l'outil
+            # Exécuter l'outil (ou récupérer la lecture anticipée)
+            prefetched = pipeline.take(step) if pipeline is not None else None
             try:
-                result = call_tool(action, args)
-                all_results.append(f"✅ {action}: {result[:500] if len(result) > 500 else result}")
+                result = prefetched.result() if prefetched is not None else call_tool(action, args)
+                step_outputs[i] = result
+                # Les outils signalent leurs échecs par "❌ ...": les étapes dépendantes ne sont pas exécutées
+                mark = "❌" if step_failed(result) else "✅"
+                return f"{mark} {action}: {offload_large_result(result, limit=500)}"
             except Exception as e:
-                all_results.append(f"❌ {action}: Erreur - {e}")
+                step_outputs[i] = f"Erreur - {e}"
+                return f"❌ {action}: Erreur - {e}"
+        
+        all_results = run_plan_steps(steps, run_step)
         
         # Compiler les résultats
         combined_result = f"📋 **Plan exécuté: {plan.get('summary', 'N/A')}**\n\n"
@@ -734,24 +853,72 @@ Règles:
         self.memory.append({"role": "assistant", "content": combined_result})
         return combined_result
     
-    def _execute_direct(self, message, message_lower):
-        """Exécution directe sans planification (fallback)."""
+    def _race_plan_and_direct(self, message):
+        """
+        Mode spéculatif: lance la planification et l'appel direct en même temps.
+        
+        Seules les complétions sont demandées en parallèle: aucun outil n'est
+        exécuté avant que le chemin gagnant soit choisi. Si le plan est obtenu,
+        l'appel direct est abandonné: son flux est fermé au fragment suivant
+        (ou la requête n'est pas envoyée si elle n'a pas encore démarré). Les
+        tokens déjà générés par l'appel abandonné restent facturés.
+        
+        Returns:
+            (plan, None) si le plan est obtenu, sinon (None, future de
+            (resp_msg, messages_to_send) pour l'appel direct)
+        """
+        print("⚡ Mode spéculatif: planification et appel direct en parallèle")
+        pool = ThreadPoolExecutor(max_workers=2)
+        # Appel spéculatif streamé sans affichage: il peut être abandonné en cours de génération
+        cancel_direct = threading.Event()
+        tracer = get_tracer()
+        direct_future = pool.submit(tracer.propagate(self._direct_completion), message.lower(), False, cancel_direct)
+        plan_future = pool.submit(tracer.propagate(self._create_plan), message)
+        pool.shutdown(wait=False)
+        
+        try:
+            plan = plan_future.result()
+        except Exception as e:
+            print(f"⚠️ Erreur création plan: {e}")
+            plan = None
+        if plan:
+            # Le plan gagne: la réponse directe est abandonnée (jamais exécutée)
+            cancel_direct.set()
+            direct_future.cancel()
+            return plan, None
+        return None, direct_future
+    
+    def _direct_completion(self, message_lower, allow_stream=True, cancel=None):
+        """
+        Appel direct au modèle avec outils obligatoires, sans exécuter les outils.
+        
+        Args:
+            cancel: threading.Event qui abandonne l'appel (CompletionCancelled)
+        """
         system_prompt = """FREYA - Assistant fichiers/code/Git. Accès complet système.
 Mappings: bureau→C:\\Users\\Payet\\Desktop, documents→C:\\Users\\Payet\\Documents
 Exécute directement la demande avec les outils appropriés."""
         
-        messages_to_send = [{"role": "system", "content": system_prompt}] + self.memory
+        messages_to_send = [{"role": "system", "content": system_prompt}] + self._history()
         
-        response = client.chat.completions.create(
-            model="openai/gpt-oss-120b",
+        resp_msg = self._complete(
+            allow_stream=allow_stream,
+            cancel=cancel,
+            model=model_for("tools"),
+            stage="tools",
             messages=messages_to_send,
-            tools=TOOL_DEFS,
+            tools=TOOL_SELECTOR.select(route_intents(message_lower), self.memory),
             tool_choice="required"
         )
-        
-        return self._process_response(response.choices[0].message, message, message_lower, messages_to_send, True)
+        return resp_msg, messages_to_send
+    
+    def _execute_direct(self, message, message_lower):
+        """Exécution directe sans planification (fallback)."""
+        resp_msg, messages_to_send = self._direct_completion(message_lower)
+        return self._process_response(resp_msg, message, message_lower, messages_to_send, True)
     
     def _process_response(self, resp_msg, message, message_lower, messages_to_send, requires_tool):
+        intents = route_intents(message_lower)  # Déjà calculé dans respond() (cache)
 
         # Gestion des tool_calls (une seule itération pour économiser les tokens)
         if hasattr(resp_msg, "tool_calls") and resp_msg.tool_calls:
@@ -767,48 +934,54 @@ Exécute directement la demande avec les outils appropriés."""
             }
             self.memory.append(msg_dict)
             
-            # Exécuter TOUS les outils et collecter les résultats
-            all_results = []
-            for call in resp_msg.tool_calls:
-                fn_name = call.function.name
-                args = json.loads(call.function.arguments)
-                result = call_tool(fn_name, args)
-                all_results.append(result)
-                
-                # Ajouter le résultat de l'outil à la mémoire
+            # Exécuter TOUS les outils (en parallèle si indépendants) et collecter les résultats
+            calls = [(call.function.name, json.loads(call.function.arguments)) for call in resp_msg.tool_calls]
+            all_results = run_tool_calls(calls, call_tool)
+            
+            # Ajouter les résultats à la mémoire dans l'ordre des tool_call_id
+            # (les gros résultats sont stockés hors conversation, référencés par handle)
+            for call, result in zip(resp_msg.tool_calls, all_results):
                 self.memory.append({
                     "role": "tool",
-                    "name": fn_name,
-                    "content": result,
+                    "name": call.function.name,
+                    "content": offload_large_result(result),
                     "tool_call_id": call.id
                 })
 
             # Pour les requêtes de listing/affichage, retourner directement les résultats
-            if any(kw in message_lower for kw in ["liste", "lister", "affiche", "afficher", "montre", "montrer", "contenu", "élément", "dossier", "fichier", "bureau", "desktop", "voir", "quel", "quoi"]):
+            if intents["listing"]:
                 combined_result = "\n".join(all_results) if all_results else "Aucun résultat."
-                self.memory.append({"role": "assistant", "content": combined_result})
+                self.memory.append({"role": "assistant", "content": offload_large_result(combined_result)})
                 return combined_result
             
             # Pour les impressions, retourner directement le résultat
-            if any(kw in message_lower for kw in ["imprim", "imprimer", "imprime", "print", "printer"]):
+            if intents["printing"]:
                 combined_result = "\n".join(all_results) if all_results else "Impression complétée."
-                self.memory.append({"role": "assistant", "content": combined_result})
+                self.memory.append({"role": "assistant", "content": offload_large_result(combined_result)})
                 return combined_result
             
             # Pour les recherches web, retourner directement les résultats
-            if any(kw in message_lower for kw in ["recherche", "cherche", "google", "web", "internet", "trouve", "chercher", "trouver", "résumé", "article", "page", "site"]):
+            if intents["web"]:
                 combined_result = "\n".join(all_results) if all_results else "Aucun résultat trouvé."
-                self.memory.append({"role": "assistant", "content": combined_result})
+                self.memory.append({"role": "assistant", "content": offload_large_result(combined_result)})
                 return combined_result
             
             # Pour les autres requêtes, demander une réponse au modèle
-            final_resp = client.chat.completions.create(
-                model="openai/gpt-oss-120b",
-                messages=messages_to_send + self.memory,
-                tools=TOOL_DEFS,
+            # (résultats complets pour ce tour, la mémoire ne garde que les extraits)
+            full_results = {call.id: result for call, result in zip(resp_msg.tool_calls, all_results)}
+            history = [
+                dict(msg, content=full_results[msg["tool_call_id"]])
+                if msg.get("role") == "tool" and msg.get("tool_call_id") in full_results else msg
+                for msg in self._history()
+            ]
+            final_msg = self._complete(
+                model=model_for("summarize"),
+                stage="summarize",
+                messages=messages_to_send[:1] + history,
+                tools=TOOL_SELECTOR.select(intents, self.memory),
                 tool_choice="auto"
             )
-            final_content = final_resp.choices[0].message.content or "Opération complétée."
+            final_content = final_msg.content or "Opération complétée."
             self.memory.append({"role": "assistant", "content": final_content})
             return final_content
         else:
@@ -818,7 +991,7 @@ Exécute directement la demande avec les outils appropriés."""
                 # Détecter ce qui était demandé et appeler l'outil approprié
                 
                 # Git push/workflow
-                if any(kw in message_lower for kw in ["push", "commit", "git", "dépôt", "repo"]):
+                if intents["git"]:
                     # Utiliser un message de commit par défaut
                     commit_msg = "Mise à jour du projet"
                     # Chercher un message de commit dans le message original
@@ -839,7 +1012,7 @@ Exécute directement la demande avec les outils appropriés."""
                     return result
                 
                 # Listing/listing
-                if any(kw in message_lower for kw in ["liste", "lister", "affiche", "afficher", "montre", "montrer", "contenu", "élément", "dossier", "fichier", "bureau", "desktop"]):
+                if intents["listing_fallback"]:
                     # C'était une requête de listing - appeler list_files sur Desktop
                     desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
                     result = list_files(desktop_path)
@@ -857,3 +1030,50 @@ Exécute directement la demande avec les outils appropriés."""
             content = resp_msg.content or "Je n'ai pas compris."
             self.memory.append({"role": "assistant", "content": content})
             return content
+
+
+# Test du module: contexte du plan après une demande servie par le chemin rapide
+if __name__ == "__main__":
+    import tempfile
+    from types import SimpleNamespace
+
+    os.environ["FREYA_TRM_WARMUP"] = "0"
+    os.environ["FREYA_PLAN_CACHE"] = "0"
+    prompts = []
+
+    def fake_chat_completion(**kwargs):
+        prompts.append(kwargs["messages"][0]["content"])
+        plan = {"summary": "Écrire le résultat", "steps": [{"action": "write_file", "args": {"filename": "resume.txt", "content": "..."}}]}
+        return SimpleNamespace(content=json.dumps(plan), tool_calls=None), None
+
+    chat_completion = fake_chat_completion
+    failures = 0
+
+    def check(ok, label):
+        global failures
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {label}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        with open("notes.txt", "w", encoding="utf-8") as f:
+            f.write("Réunion lundi: budget validé, livraison en mars.")
+
+        freya = FreyaAgentNL()
+        older = "Réponse plus ancienne sans rapport avec la demande suivante, assez longue pour servir de contexte."
+        freya.memory.append({"role": "assistant", "content": older})
+        result = freya.respond("lis le fichier notes.txt")
+        check("budget validé" in result, "Fichier lu par le chemin rapide")
+        check(freya._create_plan("écris ça dans resume.txt") is not None, "Plan créé pour la demande suivante")
+        check("budget validé" in prompts[-1] and older not in prompts[-1], "CONTEXTE = résultat de l'outil du chemin rapide")
+
+        # Nom d'outil long: la réponse du chemin rapide dépasse 50 caractères
+        freya.memory.append({"role": "assistant", "content": "", "tool_calls": [{
+            "id": "fast_test", "type": "function", "function": {"name": "git_list_branches", "arguments": "{}"}}]})
+        freya.memory.append({"role": "tool", "name": "git_list_branches", "content": "* main\n  dev", "tool_call_id": "fast_test"})
+        freya.memory.append({"role": "assistant", "content": FAST_PATH_REPLY.format(tool="git_list_branches")})
+        check(freya._plan_context() == "* main\n  dev", "CONTEXTE = branches, pas la réponse du chemin rapide")
+        freya.memory.close()
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,332 @@
+"""
+Benchmark de bout en bout de FreyaAgentNL.respond(), reproductible et sans réseau.
+
+Les scénarios (demandes représentatives en français) sont rejoués depuis les
+fixtures de fixtures/: réponses du modèle et résultats d'outils enregistrés,
+avec une latence simulée. Le rapport donne p50/p95 par étape du pipeline
+(routage, plan, validation, appels LLM, outils) et par scénario.
+
+Utilisation:
+    python benchmark.py                          # rejeu avec les durées enregistrées
+    python benchmark.py --runs 20 --latency lognormal:0.3,0.4
+    python benchmark.py --scale 0.1              # latences divisées par 10 (rapide)
+    python benchmark.py --save-baseline          # enregistre la référence
+    python benchmark.py --record                 # réenregistre les fixtures (appels réels!)
+
+Code de sortie 1 si une étape ou un scénario régresse par rapport à
+benchmark_baseline.json (p95 au-delà de la tolérance). La référence fournie
+correspond aux options par défaut (latences enregistrées, échelle 1.0).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCHMARK_DIR, "fixtures")
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "benchmark_baseline.json")
+
+# Demandes représentatives: listing, recherche web, plan multi-étapes, git, conversation
+SCENARIOS = [
+    {"name": "listing_bureau", "message": "liste les fichiers du bureau"},
+    {"name": "web_recherche", "message": "recherche les nouveautés de python 3.13 sur internet"},
+    {"name": "plan_rapport", "message": "recherche napoléon sur internet et écris un rapport dans rapport.txt"},
+    {"name": "git_push", "message": "git push avec le message 'maj doc'"},
+    {"name": "conversation", "message": "bonjour, qui es-tu ?"},
+]
+
+# Ordre d'affichage des étapes
+STAGES = ["route", "llm_plan", "validate", "llm_tools", "tools", "llm_summarize", "total"]
+
+# Marge absolue ajoutée à la tolérance (évite les faux positifs sur les étapes très courtes)
+REGRESSION_SLACK = 0.005
+
+
+class StageTimer:
+    """Intervalles de temps par étape; la durée d'une étape est la longueur de leur union."""
+
+    def __init__(self):
+        self._intervals = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, stage, start, end):
+        with self._lock:
+            self._intervals[stage].append((start, end))
+
+    def wrap(self, stage, func):
+        """Enveloppe une fonction pour chronométrer chacun de ses appels."""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, start, time.perf_counter())
+        return timed
+
+    def reset(self):
+        with self._lock:
+            self._intervals.clear()
+
+    def durations(self):
+        """Durée par étape (les appels parallèles ne sont comptés qu'une fois)."""
+        result = {}
+        with self._lock:
+            for stage, intervals in self._intervals.items():
+                total, current_start, current_end = 0.0, None, None
+                for start, end in sorted(intervals):
+                    if current_end is None or start > current_end:
+                        if current_end is not None:
+                            total += current_end - current_start
+                        current_start, current_end = start, end
+                    else:
+                        current_end = max(current_end, end)
+                if current_end is not None:
+                    total += current_end - current_start
+                result[stage] = total
+        return result
+
+
+class TimedBackend:
+    """Backend chronométré par étape (plan, tools, summarize), streaming compris."""
+
+    def __init__(self, inner, timer):
+        self.inner = inner
+        self.timer = timer
+        self.name = inner.name
+
+    def create(self, stream=False, **kwargs):
+        from replay import infer_stage
+        stage = "llm_" + infer_stage(kwargs)
+        start = time.perf_counter()
+        if not stream:
+            try:
+                return self.inner.create(**kwargs)
+            finally:
+                self.timer.add(stage, start, time.perf_counter())
+
+        def chunks():
+            try:
+                yield from self.inner.create(stream=True, **kwargs)
+            finally:
+                self.timer.add(stage, start, time.perf_counter())
+        return chunks()
+
+
+def percentile(values, p):
+    """Percentile (rang le plus proche) d'une liste de valeurs."""
+    ordered = sorted(values)
+    index = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def fixture_path(name):
+    return os.path.join(FIXTURE_DIR, f"{name}.json")
+
+
+def _instrument(timer):
+    """Chronomètre le routage et la validation dans le module agent."""
+    import agent
+    agent.route_intents = timer.wrap("route", agent.route_intents)
+    agent.validate_tool_call = timer.wrap("validate", agent.validate_tool_call)
+    validator = agent.get_validator()
+    validator.validate_plan = timer.wrap("validate", validator.validate_plan)
+    return agent
+
+
+def run_benchmark(scenarios, runs, warmup, latency, tool_latency, stream):
+    """
+    Rejoue chaque scénario et collecte les durées par étape.
+
+    Returns:
+        (stage_samples, scenario_samples, failures)
+    """
+    import freya_llm
+    from replay import Fixture, ReplayBackend, replay_call_tool
+
+    timer = StageTimer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent = _instrument(timer)
+
+    stage_samples = defaultdict(list)
+    scenario_samples = defaultdict(list)
+    failures = []
+
+    for scenario in scenarios:
+        fixture = Fixture.load(fixture_path(scenario["name"]))
+        freya_llm.backend = TimedBackend(ReplayBackend(fixture, latency), timer)
+        agent.call_tool = timer.wrap("tools", replay_call_tool(fixture, tool_latency))
+
+        for run in range(warmup + runs):
+            fixture.reset()
+            timer.reset()
+            freya = agent.FreyaAgentNL()
+            on_chunk = (lambda kind, data: None) if stream else None
+            start = time.perf_counter()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    freya.respond(scenario["message"], on_chunk=on_chunk)
+            except Exception as e:
+                failures.append(f"{scenario['name']}: {e}")
+                break
+            total = time.perf_counter() - start
+            if run < warmup:
+                continue
+
+            for stage, duration in timer.durations().items():
+                stage_samples[stage].append(duration)
+            stage_samples["total"].append(total)
+            scenario_samples[scenario["name"]].append(total)
+
+    return stage_samples, scenario_samples, failures
+
+
+def summarize(samples):
+    """{clé: {"n", "p50", "p95"}} à partir des échantillons."""
+    return {
+        key: {"n": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95)}
+        for key, values in samples.items() if values
+    }
+
+
+def print_table(title, stats, order, baseline):
+    print(f"\n{title}")
+    print(f"{'':<16} {'n':>4} {'p50 (ms)':>10} {'p95 (ms)':>10} {'réf. p95':>10}")
+    keys = [key for key in order if key in stats] + sorted(key for key in stats if key not in order)
+    for key in keys:
+        row = stats[key]
+        reference = baseline.get(key, {}).get("p95")
+        reference = f"{reference * 1000:>10.1f}" if reference is not None else f"{'-':>10}"
+        print(f"{key:<16} {row['n']:>4} {row['p50'] * 1000:>10.1f} {row['p95'] * 1000:>10.1f} {reference}")
+
+
+def find_regressions(current, baseline, tolerance):
+    """Clés dont le p95 dépasse la référence de plus de la tolérance."""
+    regressions = []
+    for key, reference in baseline.items():
+        if key not in current:
+            continue
+        limit = reference["p95"] * (1 + tolerance) + REGRESSION_SLACK
+        if current[key]["p95"] > limit:
+            regressions.append(
+                f"{key}: p95 {current[key]['p95'] * 1000:.1f} ms > {limit * 1000:.1f} ms "
+                f"(référence {reference['p95'] * 1000:.1f} ms)"
+            )
+    return regressions
+
+
+def record(scenarios):
+    """Réenregistre les fixtures en exécutant réellement le modèle et les outils."""
+    import freya_llm
+    import agent
+    from replay import Fixture, RecordingBackend, recording_call_tool
+
+    real_backend = freya_llm.backend
+    real_call_tool = agent.call_tool
+    for scenario in scenarios:
+        print(f"⏺️  Enregistrement: {scenario['name']} - {scenario['message']}")
+        fixture = Fixture({"scenario": scenario["name"], "message": scenario["message"]})
+        freya_llm.backend = RecordingBackend(real_backend, fixture)
+        agent.call_tool = recording_call_tool(real_call_tool, fixture)
+        agent.FreyaAgentNL().respond(scenario["message"])
+        fixture.save(fixture_path(scenario["name"]))
+        print(f"   {len(fixture.llm)} réponses LLM, {len(fixture.tools)} appels d'outils")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de bout en bout de FREYA (rejeu de fixtures)")
+    parser.add_argument("--runs", type=int, default=5, help="Mesures par scénario")
+    parser.add_argument("--warmup", type=int, default=1, help="Exécutions non mesurées par scénario")
+    parser.add_argument("--latency", default="recorded", help="Latence LLM (TTFT): recorded, fixed:S, uniform:A,B, lognormal:MEDIANE,SIGMA")
+    parser.add_argument("--tool-latency", default="recorded", help="Latence des outils (même format)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Facteur appliqué à toutes les latences simulées")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stream", action="store_true", help="Appels au modèle en streaming")
+    parser.add_argument("--scenario", action="append", help="Limiter à un scénario (répétable)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistrer les résultats comme référence")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Tolérance de régression sur le p95 (0.2 = +20%%)")
+    parser.add_argument("--record", action="store_true", help="Réenregistrer les fixtures avec le backend réel")
+    parser.add_argument("--startup", action="store_true", help="Mesurer le temps jusqu'à l'invite (budget FREYA_STARTUP_BUDGET_MS)")
+    args = parser.parse_args()
+
+    if args.startup:
+        from startup import run_startup_benchmark
+        return run_startup_benchmark(args.runs)
+
+    scenarios = [s for s in SCENARIOS if not args.scenario or s["name"] in args.scenario]
+
+    # Mesures sans cache: chaque exécution doit parcourir tout le pipeline
+    os.environ["FREYA_LLM_CACHE"] = "0"
+    os.environ["FREYA_PLAN_CACHE"] = "0"
+
+    if args.record:
+        answer = input("⚠️ Les outils seront réellement exécutés (fichiers, git push...). Continuer ? [o/N] ")
+        if answer.strip().lower() != "o":
+            return 0
+        record(scenarios)
+        return 0
+
+    # En rejeu, le backend réel est remplacé: pas besoin de clé API
+    os.environ["FREYA_BACKEND"] = "openai"
+    from replay import LatencyModel
+
+    latency = LatencyModel(args.latency, seed=args.seed, scale=args.scale)
+    tool_latency = LatencyModel(args.tool_latency, seed=args.seed + 1, scale=args.scale)
+
+    print("=" * 60)
+    print(f"⏱️  Benchmark FREYA: {len(scenarios)} scénarios x {args.runs} exécutions")
+    print(f"   Latence LLM: {args.latency}, outils: {args.tool_latency}, échelle: {args.scale}")
+    print("=" * 60)
+
+    stage_samples, scenario_samples, failures = run_benchmark(
+        scenarios, args.runs, args.warmup, latency, tool_latency, args.stream
+    )
+    stages = summarize(stage_samples)
+    totals = summarize(scenario_samples)
+
+    baseline = {"stages": {}, "scenarios": {}}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_table("📊 Par étape", stages, STAGES, baseline.get("stages", {}))
+    print_table("📊 Par scénario (total)", totals, [s["name"] for s in SCENARIOS], baseline.get("scenarios", {}))
+
+    if failures:
+        print("\n❌ Échecs:")
+        for failure in failures:
+            print(f"   {failure}")
+        return 1
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            rounded = lambda stats: {
+                key: {"n": row["n"], "p50": round(row["p50"], 6), "p95": round(row["p95"], 6)}
+                for key, row in stats.items()
+            }
+            json.dump({"stages": rounded(stages), "scenarios": rounded(totals)}, f, indent=2)
+            f.write("\n")
+        print(f"\n💾 Référence enregistrée: {args.baseline}")
+        return 0
+
+    regressions = find_regressions(stages, baseline.get("stages", {}), args.tolerance)
+    regressions += find_regressions(totals, baseline.get("scenarios", {}), args.tolerance)
+    if regressions:
+        print("\n❌ Régressions:")
+        for regression in regressions:
+            print(f"   {regression}")
+        return 1
+
+    print("\n✅ Aucune régression" if baseline.get("stages") else "\nℹ️ Pas de référence (--save-baseline pour en créer une)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+Stockage persistant de la conversation.
+
+    - Message: enregistrement à __slots__ (rôle, contenu, tool_calls...), créé
+      depuis un dict ou un message du SDK: la mémoire ne contient qu'un type
+    - ConversationStore: tampon circulaire borné des messages récents, doublé
+      d'un journal JSONL en ajout seul par session (.freya_cache/sessions/)
+    - reprise d'une session: seule la fin du journal est lue (mmap + rfind),
+      le temps de reprise ne dépend pas de la longueur de l'historique
+
+Une ligne du journal est un message, ou un point de reprise
+{"checkpoint": {"summary": [...], "kept": N}} écrit quand la mémoire est
+compactée (et au moins tous les capacity/2 messages): la mémoire est alors
+le résumé glissant plus les N messages qui précèdent la ligne. Le journal
+garde l'historique complet; la reprise part du dernier point de reprise.
+
+Configuration:
+    FREYA_SESSIONS            0 pour ne pas enregistrer les sessions du REPL (défaut 1)
+    FREYA_MEMORY_CAPACITY     messages gardés dans le tampon et relus à la reprise (défaut 200)
+
+Utilisation:
+    python main.py --resume             # reprend la dernière session
+    python main.py --resume <session>   # reprend une session donnée
+    python conversation_store.py        # benchmark de la reprise
+"""
+
+import json
+import mmap
+import os
+import threading
+import time
+from collections import deque
+
+from disk_cache import CACHE_DIR
+
+SESSIONS_DIR = os.path.join(CACHE_DIR, "sessions")
+
+MEMORY_CAPACITY = int(os.getenv("FREYA_MEMORY_CAPACITY", "200"))
+
+
+def sessions_enabled():
+    return os.getenv("FREYA_SESSIONS", "1") == "1"
+
+
+class Message:
+    """Message de la conversation (format de l'API sans les champs vides)."""
+
+    __slots__ = ("role", "content", "name", "tool_call_id", "tool_calls", "ts")
+
+    def __init__(self, role, content="", name=None, tool_call_id=None, tool_calls=None, ts=None):
+        self.role = role
+        self.content = content or ""
+        self.name = name
+        self.tool_call_id = tool_call_id
+        self.tool_calls = tool_calls or None
+        self.ts = ts if ts is not None else time.time()
+
+    @classmethod
+    def from_any(cls, msg):
+        """Message depuis un dict, un Message ou un objet message du SDK."""
+        if isinstance(msg, Message):
+            return msg
+        if isinstance(msg, dict):
+            return cls(msg.get("role", "assistant"), msg.get("content"), msg.get("name"),
+                       msg.get("tool_call_id"), msg.get("tool_calls"), msg.get("ts"))
+        tool_calls = [{
+            "id": tc.id,
+            "type": "function",
+            "function": {"name": tc.function.name, "arguments": tc.function.arguments}
+        } for tc in getattr(msg, "tool_calls", None) or []]
+        return cls(getattr(msg, "role", "assistant"), getattr(msg, "content", ""), tool_calls=tool_calls)
+
+    def to_dict(self):
+        """Dict au format de l'API (sans l'horodatage)."""
+        data = {"role": self.role, "content": self.content}
+        if self.name is not None:
+            data["name"] = self.name
+        if self.tool_call_id is not None:
+            data["tool_call_id"] = self.tool_call_id
+        if self.tool_calls:
+            data["tool_calls"] = self.tool_calls
+        return data
+
+    def to_record(self):
+        """Ligne du journal."""
+        return json.dumps(dict(self.to_dict(), ts=round(self.ts, 3)), ensure_ascii=False)
+
+
+def new_session_id():
+    return time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+
+
+def session_path(session_id, directory=None):
+    return os.path.join(directory or SESSIONS_DIR, f"{session_id}.jsonl")
+
+
+def list_sessions(directory=None):
+    """Sessions enregistrées, de la plus récente à la plus ancienne."""
+    directory = directory or SESSIONS_DIR
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith(".jsonl")]
+    except FileNotFoundError:
+        return []
+    names.sort(key=lambda name: os.path.getmtime(os.path.join(directory, name)), reverse=True)
+    return [name[:-len(".jsonl")] for name in names]
+
+
+def latest_session(directory=None):
+    sessions = list_sessions(directory)
+    return sessions[0] if sessions else None
+
+
+def read_tail(path, max_messages):
+    """
+    Reconstruit la mémoire d'une session en remontant depuis la fin du journal
+    (mmap + rfind), sans lire le début: messages écrits après le dernier point
+    de reprise, plus les messages que ce point de reprise gardait en mémoire.
+
+    Returns:
+        (messages dans l'ordre du journal (max_messages au plus), résumé du dernier point de reprise ou None)
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return [], None
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0 or max_messages <= 0:
+            return [], None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            records = []
+            summary = None
+            wanted = max_messages  # Réduit au premier point de reprise rencontré
+            pos = size
+            while pos > 0 and len(records) < wanted:
+                # pos - 1 exclu: c'est le retour à la ligne qui termine la ligne courante
+                newline = mm.rfind(b"\n", 0, pos - 1)
+                line = mm[newline + 1:pos]
+                pos = newline + 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Ligne vide ou tronquée (arrêt pendant une écriture)
+                if not isinstance(record, dict):
+                    continue
+                if "checkpoint" in record:
+                    if summary is None:
+                        checkpoint = record["checkpoint"]
+                        summary = list(checkpoint.get("summary") or [])
+                        wanted = min(max_messages, len(records) + int(checkpoint.get("kept", max_messages)))
+                else:
+                    records.append(Message.from_any(record))
+    records.reverse()
+    return records, summary
+
+
+class ConversationStore:
+    """
+    Messages récents (tampon circulaire borné) et journal de la session.
+
+    Se parcourt comme la liste de messages qu'il remplace: itération et
+    reversed() rendent des dicts au format de l'API.
+    """
+
+    def __init__(self, session_id=None, capacity=None, directory=None):
+        """
+        Args:
+            session_id: session à créer ou reprendre (None = mémoire seule, sans journal)
+            capacity: nombre max de messages gardés (défaut FREYA_MEMORY_CAPACITY)
+            directory: dossier des journaux (défaut .freya_cache/sessions)
+        """
+        self.session_id = session_id
+        self.capacity = capacity or MEMORY_CAPACITY
+        self.messages = deque(maxlen=self.capacity)
+        self.summary_lines = []
+        self.resume_seconds = None  # Durée de la reprise (si le journal existait)
+        self.path = session_path(session_id, directory) if session_id else None
+        self._log = None
+        self._since_checkpoint = 0  # Messages écrits depuis le dernier point de reprise
+        self._lock = threading.Lock()
+
+        if self.path:
+            start = time.perf_counter()
+            messages, summary = read_tail(self.path, self.capacity)
+            if messages or summary:
+                self.messages.extend(messages)
+                self.summary_lines = list(summary or [])
+                self.resume_seconds = time.perf_counter() - start
+
+    def _open_log(self):
+        """Ouvre le journal au premier message (pas de fichier pour une session vide)."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._log = open(self.path, "ab")
+        if self._log.tell() > 0:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._log.write(b"\n")  # Dernière ligne tronquée: ne pas la prolonger
+
+    def _write(self, line):
+        if self._log is None:
+            self._open_log()
+        self._log.write(line.encode("utf-8") + b"\n")
+        self._log.flush()
+
+    def _checkpoint(self):
+        """Point de reprise: résumé courant et nombre de messages en mémoire."""
+        self._write(json.dumps({"checkpoint": {"summary": self.summary_lines, "kept": len(self.messages)}},
+                               ensure_ascii=False))
+        self._since_checkpoint = 0
+
+    def append(self, msg):
+        """Ajoute un message au tampon et au journal."""
+        message = Message.from_any(msg)
+        with self._lock:
+            self.messages.append(message)
+            if self.path:
+                self._write(message.to_record())
+                self._since_checkpoint += 1
+                # Un point de reprise dans chaque fenêtre relue: le résumé n'est jamais perdu
+                if self._since_checkpoint >= max(1, self.capacity // 2):
+                    self._checkpoint()
+
+    def compact(self, messages, summary_lines):
+        """
+        Remplace le tampon par la mémoire compactée et le résumé glissant, et
+        l'enregistre dans le journal (point de reprise) s'ils ont changé.
+        """
+        compacted = deque((Message.from_any(msg) for msg in messages), maxlen=self.capacity)
+        summary_lines = list(summary_lines)
+        with self._lock:
+            changed = (
+                summary_lines != self.summary_lines
+                or len(compacted) != len(self.messages)
+                or any(a.to_dict() != b.to_dict() for a, b in zip(compacted, self.messages))
+            )
+            self.messages = compacted
+            self.summary_lines = summary_lines
+            if self.path and changed:
+                self._checkpoint()
+
+    def to_list(self):
+        """Messages au format de l'API (dicts)."""
+        return [msg.to_dict() for msg in self.messages]
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __reversed__(self):
+        return (msg.to_dict() for msg in reversed(self.messages))
+
+    def __len__(self):
+        return len(self.messages)
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+
+# Benchmark: la reprise lit la fin du journal, quelle que soit sa longueur
+if __name__ == "__main__":
+    import tempfile
+
+    def replay_all(path):
+        """Référence: relecture complète du journal."""
+        with open(path, "rb") as f:
+            return [Message.from_any(json.loads(line)) for line in f if line.strip() and not line.startswith(b'{"checkpoint"')]
+
+    print("=" * 60)
+    print("🧪 Reprise de session: fin du journal (mmap) vs relecture complète")
+    print("=" * 60)
+    print(f"\n{'messages':>10} {'journal (Mo)':>13} {'reprise (ms)':>13} {'relecture (ms)':>15}")
+    print("-" * 56)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (1_000, 10_000, 100_000):
+            session = f"bench-{size}"
+            with open(session_path(session, directory), "w", encoding="utf-8") as f:
+                for i in range(size):
+                    role = "user" if i % 2 == 0 else "assistant"
+                    f.write(Message(role, f"message {i} " + "contenu " * 20).to_record() + "\n")
+                    if i % 100 == 99:
+                        f.write(json.dumps({"checkpoint": {"summary": [f"- Utilisateur: message {i}"], "kept": 150}}) + "\n")
+
+            resume = []
+            for _ in range(5):
+                store = ConversationStore(session, capacity=200, directory=directory)
+                resume.append(store.resume_seconds)
+                store.close()
+            start = time.perf_counter()
+            replay_all(session_path(session, directory))
+            replay = time.perf_counter() - start
+
+            store = ConversationStore(session, capacity=200, directory=directory)
+            last = store.messages[-1].content.split()[1]
+            ok = len(store) == 150 and last == str(size - 1) and store.summary_lines
+            store.close()
+
+            megabytes = os.path.getsize(session_path(session, directory)) / 1e6
+            print(f"{size:>10} {megabytes:>13.1f} {sorted(resume)[2] * 1000:>13.2f} {replay * 1000:>15.1f} "
+                  f"{'✅' if ok else '❌'}")
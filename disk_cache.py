@@ -0,0 +1,233 @@
+"""
+Cache persistant sur disque (SQLite) avec éviction LRU et expiration (TTL).
+Utilisé pour mettre en cache les plans et les complétions générés par Groq.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Accès en mémoire accumulés avant d'être écrits dans SQLite
+TOUCH_FLUSH_SIZE = 32
+
+# Dossier des caches (ignoré par git)
+CACHE_DIR = os.getenv("FREYA_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".freya_cache"))
+
+
+class DiskCache:
+    """
+    Cache clé → valeur JSON stocké dans SQLite, borné en nombre d'entrées et en taille.
+    Les entrées récentes sont aussi gardées en mémoire pour des hits sans accès disque.
+    """
+
+    def __init__(self, path, max_entries=500, ttl=None, max_bytes=None, memory_entries=64):
+        """
+        Args:
+            path: fichier SQLite
+            max_entries: nombre max d'entrées (les moins récemment utilisées sont évincées)
+            ttl: durée de vie par défaut en secondes (None = pas d'expiration)
+            max_bytes: taille max des valeurs stockées (None = pas de limite)
+            memory_entries: nombre d'entrées gardées en mémoire devant SQLite
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()  # key -> (value JSON, expires, cost)
+        self._touched = {}  # key -> dernier accès servi par la mémoire, pas encore écrit dans SQLite
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0  # Temps de calcul économisé par les hits
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires REAL,"
+            " last_used REAL NOT NULL,"
+            " cost REAL NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON entries(last_used)")
+        self._db.commit()
+
+    def get(self, key):
+        """Retourne la valeur en cache, ou None si absente ou expirée."""
+        now = time.time()
+        with self._lock:
+            row = self._memory.get(key)
+            if row is not None:
+                self._memory.move_to_end(key)
+                self._touched[key] = now
+            else:
+                row = self._db.execute(
+                    "SELECT value, expires, cost FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, expires, cost = row
+            if expires is not None and expires < now:
+                self._memory.pop(key, None)
+                self._touched.pop(key, None)
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._db.commit()
+                self.misses += 1
+                return None
+
+            if key not in self._memory:
+                self._db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                self._remember(key, row)
+            elif len(self._touched) >= TOUCH_FLUSH_SIZE:
+                self._flush_touched()
+                self._db.commit()
+            self.hits += 1
+            self.saved_seconds += cost
+
+        return json.loads(value)
+
+    def _flush_touched(self):
+        """Reporte dans SQLite les accès servis par la mémoire (ordre LRU de l'éviction)."""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE entries SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _remember(self, key, row):
+        """Garde une entrée dans le cache mémoire (LRU)."""
+        self._memory[key] = row
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def set(self, key, value, ttl=None, cost=0.0):
+        """
+        Enregistre une valeur (sérialisable en JSON).
+
+        Args:
+            ttl: durée de vie en secondes (défaut: self.ttl)
+            cost: temps de calcul de la valeur (secondes), compté comme économisé à chaque hit
+        """
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires = now + ttl if ttl else None
+
+        value = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires, last_used, cost) VALUES (?, ?, ?, ?, ?)",
+                (key, value, expires, now, cost)
+            )
+            self._touched.pop(key, None)
+            self._remember(key, (value, expires, cost))
+            # Accès récents d'abord, sinon les entrées les plus utilisées paraîtraient les plus anciennes
+            self._flush_touched()
+            # Éviction LRU au-delà de max_entries
+            evicted = self._db.execute(
+                "SELECT key FROM entries ORDER BY last_used DESC LIMIT -1 OFFSET ?",
+                (self.max_entries,)
+            ).fetchall()
+            # Éviction LRU au-delà de max_bytes (taille cumulée des plus récentes)
+            if self.max_bytes:
+                evicted += self._db.execute(
+                    "SELECT key FROM ("
+                    " SELECT key, SUM(LENGTH(CAST(value AS BLOB))) OVER (ORDER BY last_used DESC) AS total"
+                    " FROM entries) WHERE total > ?",
+                    (self.max_bytes,)
+                ).fetchall()
+            for (old_key,) in evicted:
+                self._memory.pop(old_key, None)
+                self._touched.pop(old_key, None)
+            self._db.executemany("DELETE FROM entries WHERE key = ?", evicted)
+            self._db.commit()
+
+    def delete(self, key):
+        """Supprime une entrée."""
+        with self._lock:
+            self._memory.pop(key, None)
+            self._touched.pop(key, None)
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._db.commit()
+
+    def clear(self):
+        """Vide le cache et remet les compteurs à zéro."""
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+            self.hits = self.misses = 0
+            self.saved_seconds = 0.0
+
+    def stats(self):
+        """Compteurs du cache (hits, misses, taux de hit, entrées, temps économisé)."""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+# Instance globale du cache de plans
+_plan_cache = None
+
+def get_plan_cache():
+    """
+    Retourne le cache global des plans (None si désactivé avec FREYA_PLAN_CACHE=0).
+
+    Configuration:
+        FREYA_PLAN_CACHE_SIZE: nombre max de plans (défaut 200)
+        FREYA_PLAN_CACHE_TTL: durée de vie d'un plan en secondes (défaut 7 jours)
+    """
+    global _plan_cache
+    if os.getenv("FREYA_PLAN_CACHE", "1") == "0":
+        return None
+    if _plan_cache is None:
+        _plan_cache = DiskCache(
+            os.path.join(CACHE_DIR, "plans.sqlite"),
+            max_entries=int(os.getenv("FREYA_PLAN_CACHE_SIZE", "200")),
+            ttl=float(os.getenv("FREYA_PLAN_CACHE_TTL", str(7 * 24 * 3600)))
+        )
+    return _plan_cache
+
+
+# Instance globale du cache de complétions LLM
+_completion_cache = None
+
+def get_completion_cache():
+    """
+    Retourne le cache global des complétions LLM (None si désactivé avec FREYA_LLM_CACHE=0).
+
+    Configuration:
+        FREYA_LLM_CACHE_MB: taille max des réponses stockées en Mo (défaut 50)
+        FREYA_LLM_CACHE_TTL: durée de vie d'une réponse en secondes (défaut 1 jour)
+    """
+    global _completion_cache
+    if os.getenv("FREYA_LLM_CACHE", "1") == "0":
+        return None
+    if _completion_cache is None:
+        _completion_cache = DiskCache(
+            os.path.join(CACHE_DIR, "completions.sqlite"),
+            max_entries=100000,
+            ttl=float(os.getenv("FREYA_LLM_CACHE_TTL", str(24 * 3600))),
+            max_bytes=int(float(os.getenv("FREYA_LLM_CACHE_MB", "50")) * 1024 * 1024),
+            memory_entries=256
+        )
+    return _completion_cache
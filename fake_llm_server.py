@@ -0,0 +1,282 @@
+"""
+Serveur LLM local compatible OpenAI (POST /v1/chat/completions), pour tester
+et mesurer FREYA sans réseau ni clé API.
+
+Les réponses sont déterministes:
+    - prompt de planification → plan JSON d'une étape list_files
+    - outils fournis → appel de l'outil en lecture seule le plus proche de la demande
+    - après des résultats d'outils → courte synthèse du dernier résultat
+    - sinon → réponse texte simulée
+
+La latence est simulée: délai avant le premier token (--ttft) puis débit
+en tokens par seconde (--tps). Des pannes peuvent être injectées pour tester
+le transport: erreurs HTTP aléatoires (--fail-rate, --fail-status) et
+requêtes anormalement lentes (--slow-rate, --slow-delay).
+
+Utilisation:
+    python fake_llm_server.py --port 8080
+    FREYA_BACKEND=openai FREYA_LLM_BASE_URL=http://127.0.0.1:8080/v1 python main.py
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tool_executor import READ_ONLY_TOOLS
+
+# Taille des fragments envoyés en streaming (caractères)
+CHUNK_SIZE = 16
+
+
+def _estimate_tokens(text):
+    return (len(text) + 3) // 4
+
+
+def _last_user_text(messages):
+    for msg in reversed(messages):
+        if msg.get("role") == "user":
+            return msg.get("content") or ""
+    return ""
+
+
+def _choose_tool(text, tools):
+    """Outil en lecture seule dont le nom/la description partage le plus de mots avec la demande."""
+    words = {word for word in re.findall(r"\w+", text.lower()) if len(word) > 3}
+    best, best_score = None, -1
+    for tool in tools:
+        function = tool["function"]
+        if function["name"] not in READ_ONLY_TOOLS:
+            continue
+        vocabulary = set(re.findall(r"\w+", (function["name"].replace("_", " ") + " " + function.get("description", "")).lower()))
+        score = len(words & vocabulary)
+        if score > best_score:
+            best, best_score = function, score
+    return best, best_score
+
+
+def _fake_arguments(function, text):
+    """Arguments plausibles pour les paramètres obligatoires d'un outil."""
+    arguments = {}
+    for name in function.get("parameters", {}).get("required", []):
+        arguments[name] = "." if name == "path" else text
+    return arguments
+
+
+def fake_reply(body):
+    """
+    Construit la réponse simulée d'une requête chat completions.
+
+    Returns:
+        (content, tool_calls) - tool_calls = liste de {"id", "name", "arguments"}
+    """
+    messages = body.get("messages") or []
+    tools = body.get("tools") or []
+    text = _last_user_text(messages)
+    last = messages[-1] if messages else {}
+    system = (messages[0].get("content") or "") if messages and messages[0].get("role") == "system" else ""
+
+    if last.get("role") == "tool":
+        result = (last.get("content") or "").strip()
+        return f"Voici le résultat:\n{result[:300]}", []
+
+    if '"steps"' in system:
+        plan = {"summary": f"Plan simulé: {text[:60]}", "steps": [{"action": "list_files", "args": {"path": "."}}]}
+        return json.dumps(plan, ensure_ascii=False), []
+
+    if tools and body.get("tool_choice") != "none":
+        function, score = _choose_tool(text, tools)
+        if function and (score > 0 or body.get("tool_choice") == "required"):
+            call = {
+                "id": f"call_{uuid.uuid4().hex[:8]}",
+                "name": function["name"],
+                "arguments": json.dumps(_fake_arguments(function, text), ensure_ascii=False)
+            }
+            return None, [call]
+
+    return f"Réponse simulée à: {text[:200]}", []
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """Gestionnaire HTTP: /v1/chat/completions et /v1/models."""
+
+    server_version = "FakeLLM/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "fake-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        self.server.requests += 1
+
+        status, extra_delay = self.server.next_fault()
+        if status:
+            self.send_response(status)
+            if self.server.retry_after is not None:
+                self.send_header("Retry-After", str(self.server.retry_after))
+            data = json.dumps({"error": {"message": f"Erreur simulée {status}"}}).encode("utf-8")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        time.sleep(extra_delay)
+
+        content, tool_calls = fake_reply(body)
+
+        prompt_tokens = _estimate_tokens(json.dumps(body.get("messages") or [], ensure_ascii=False))
+        output = (content or "") + "".join(call["arguments"] for call in tool_calls)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _estimate_tokens(output),
+            "total_tokens": prompt_tokens + _estimate_tokens(output)
+        }
+        base = {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-model")
+        }
+
+        time.sleep(self.server.ttft)
+        if body.get("stream"):
+            self._stream(base, content, tool_calls, usage)
+        else:
+            time.sleep(_estimate_tokens(output) / self.server.tps)
+            message = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = [
+                    {"id": call["id"], "type": "function",
+                     "function": {"name": call["name"], "arguments": call["arguments"]}}
+                    for call in tool_calls
+                ]
+            finish = "tool_calls" if tool_calls else "stop"
+            self._send_json(200, dict(base, object="chat.completion", usage=usage, choices=[
+                {"index": 0, "message": message, "finish_reason": finish}
+            ]))
+
+    def _stream(self, base, content, tool_calls, usage):
+        """Envoie la réponse en Server-Sent Events, au débit simulé."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def send(delta, finish=None, **extra):
+            chunk = dict(base, object="chat.completion.chunk",
+                         choices=[{"index": 0, "delta": delta, "finish_reason": finish}], **extra)
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        delay = CHUNK_SIZE / 4 / self.server.tps
+        send({"role": "assistant"})
+        for i in range(0, len(content or ""), CHUNK_SIZE):
+            send({"content": content[i:i + CHUNK_SIZE]})
+            time.sleep(delay)
+        for index, call in enumerate(tool_calls):
+            send({"tool_calls": [{"index": index, "id": call["id"], "type": "function",
+                                  "function": {"name": call["name"], "arguments": ""}}]})
+            send({"tool_calls": [{"index": index, "function": {"arguments": call["arguments"]}}]})
+            time.sleep(delay)
+        send({}, finish="tool_calls" if tool_calls else "stop", usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """Serveur simulé avec injection de pannes (modifiable pendant l'exécution)."""
+
+    daemon_threads = True
+
+    def __init__(self, address, ttft=0.05, tps=500.0, verbose=False,
+                 fail_rate=0.0, fail_status=503, slow_rate=0.0, slow_delay=1.0, seed=0):
+        super().__init__(address, FakeLLMHandler)
+        self.ttft = ttft
+        self.tps = tps
+        self.verbose = verbose
+        self.requests = 0
+        self.fail_next = 0          # Nombre de prochaines requêtes en erreur
+        self.fail_rate = fail_rate  # Probabilité d'erreur aléatoire
+        self.fail_status = fail_status
+        self.retry_after = None     # En-tête Retry-After des erreurs (secondes)
+        self.slow_rate = slow_rate  # Probabilité d'une requête lente
+        self.slow_delay = slow_delay
+        self._random = random.Random(seed)
+        self._fault_lock = threading.Lock()
+
+    def next_fault(self):
+        """(code d'erreur ou None, délai supplémentaire) pour la requête suivante."""
+        with self._fault_lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return self.fail_status, 0.0
+            if self._random.random() < self.fail_rate:
+                return self.fail_status, 0.0
+            if self._random.random() < self.slow_rate:
+                return None, self.slow_delay
+        return None, 0.0
+
+
+def start_fake_server(host="127.0.0.1", port=0, ttft=0.05, tps=500.0, verbose=False, **faults):
+    """
+    Démarre le serveur dans un thread de fond.
+
+    Args:
+        faults: fail_rate, fail_status, slow_rate, slow_delay, seed (voir FakeLLMServer)
+
+    Returns:
+        (server, base_url) - server.shutdown() pour l'arrêter
+    """
+    server = FakeLLMServer((host, port), ttft, tps, verbose, **faults)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur LLM local compatible OpenAI (réponses simulées)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--ttft", type=float, default=0.05, help="Délai avant le premier token (secondes)")
+    parser.add_argument("--tps", type=float, default=500.0, help="Débit simulé (tokens par seconde)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Probabilité d'erreur HTTP par requête")
+    parser.add_argument("--fail-status", type=int, default=503, help="Code HTTP des erreurs simulées")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Probabilité d'une requête lente")
+    parser.add_argument("--slow-delay", type=float, default=1.0, help="Délai supplémentaire d'une requête lente (secondes)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(
+        args.host, args.port, args.ttft, args.tps, verbose=True,
+        fail_rate=args.fail_rate, fail_status=args.fail_status,
+        slow_rate=args.slow_rate, slow_delay=args.slow_delay, seed=args.seed
+    )
+    print(f"🧪 Serveur LLM simulé sur {base_url}")
+    print(f"   FREYA_BACKEND=openai FREYA_LLM_BASE_URL={base_url} python main.py")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("\n👋 Serveur arrêté")
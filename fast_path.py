@@ -0,0 +1,195 @@
+"""
+Chemin rapide sans LLM pour les demandes courantes.
+
+Les demandes qui se terminent toujours par un seul appel d'outil en lecture
+("liste le bureau", "montre mes documents", "liste les branches", "config du
+pc") sont reconnues localement par des motifs d'intention avec extraction des
+arguments (emplacement, nom de fichier). Si la confiance du motif atteint le
+seuil, l'outil est appelé directement, sans aller-retour avec Groq.
+
+Seule la demande entière est reconnue (formules de politesse et ponctuation
+mises à part): une demande avec plusieurs actions ou du texte en plus passe
+par le modèle.
+
+Configuration:
+    FREYA_FAST_PATH               0 pour toujours passer par le modèle (défaut 1)
+    FREYA_FAST_PATH_CONFIDENCE    confiance minimale d'un motif (0-1, défaut 0.9)
+
+Test: python fast_path.py
+"""
+
+import os
+import re
+import threading
+
+from tool_executor import READ_ONLY_TOOLS
+from tracing import get_tracer
+
+HOME = os.path.expanduser("~")
+
+# Emplacements nommés → chemin (même convention que le repli list_files de l'agent)
+LOCATIONS = {
+    "bureau": os.path.join(HOME, "Desktop"),
+    "desktop": os.path.join(HOME, "Desktop"),
+    "documents": os.path.join(HOME, "Documents"),
+    "téléchargements": os.path.join(HOME, "Downloads"),
+    "downloads": os.path.join(HOME, "Downloads"),
+    "dossier courant": ".",
+    "dossier actuel": ".",
+    "répertoire courant": ".",
+    "projet": ".",
+}
+
+_LOCATION = "(?P<location>" + "|".join(sorted((re.escape(name) for name in LOCATIONS), key=len, reverse=True)) + ")"
+_VERB = r"(?:liste|lister|listes|montre|montre-moi|affiche|affiche-moi|donne|donne-moi|voir)(?: moi)?"
+_DET = r"(?:(?:le|la|les|l'|mes|mon|ma|du|de|des|d'|dans|sur|tout|tous|contenu|fichiers|éléments|dossier|répertoire)\s*)*"
+_FILENAME = r"(?P<filename>[\w./\\:-]+\.[a-z0-9]{1,5})"
+_PATH = r"(?P<path>[a-z]:\\[^\s\"']*|/[^\s\"']+)"
+
+# Formules de politesse et ponctuation ignorées autour de la demande
+_POLITE = re.compile(r"^(?:freya[,\s]+)?(?:peux-tu |tu peux |stp |svp )?|(?:[\s,]*(?:stp|svp|s'il te pla[iî]t|merci))*[\s.!?]*$", re.IGNORECASE)
+
+# (outil, motif sur la demande entière, confiance, fonction motif -> arguments)
+RULES = [
+    ("git_list_branches", rf"{_VERB} {_DET}branches(?: git| du dépôt| du repo)?", 0.95, lambda m: {}),
+    ("get_pc_config",
+     r"(?:(?:quelle est |donne(?:-moi)? |affiche |montre )?(?:la |ma )?config(?:uration)?|specs|caractéristiques)"
+     r" (?:du |de mon |de l'|de la |de ma )?(?:pc|ordinateur|machine)",
+     0.95, lambda m: {}),
+    ("list_files", rf"{_VERB} {_DET}{_LOCATION}", 0.95, lambda m: {"path": LOCATIONS[m.group("location").lower()]}),
+    ("list_files", rf"{_VERB} {_DET}{_PATH}", 0.9, lambda m: {"path": m.group("path")}),
+    ("read_file", rf"(?:lis|lire|affiche|montre)(?: moi)? (?:le |le fichier |le contenu de |le contenu du fichier )?{_FILENAME}",
+     0.9, lambda m: {"filename": m.group("filename")}),
+    # Sans emplacement: dossier courant, mais l'utilisateur pensait peut-être au bureau
+    ("list_files", rf"{_VERB} (?:les |mes |tous les )?fichiers", 0.7, lambda m: {"path": "."}),
+]
+
+
+class FastMatch:
+    """Demande reconnue: outil, arguments extraits et confiance du motif."""
+
+    __slots__ = ("tool", "args", "confidence")
+
+    def __init__(self, tool, args, confidence):
+        self.tool = tool
+        self.args = args
+        self.confidence = confidence
+
+    def __repr__(self):
+        return f"FastMatch({self.tool}, {self.args}, {self.confidence})"
+
+
+class FastPath:
+    """Motifs compilés + statistiques de taux de succès."""
+
+    def __init__(self, threshold=None, enabled=None):
+        if threshold is None:
+            threshold = float(os.getenv("FREYA_FAST_PATH_CONFIDENCE", "0.9"))
+        if enabled is None:
+            enabled = os.getenv("FREYA_FAST_PATH", "1") == "1"
+        self.threshold = threshold
+        self.enabled = enabled
+        # Insensible à la casse: les chemins et noms de fichiers extraits gardent la leur
+        self.rules = [(tool, re.compile(pattern, re.IGNORECASE), confidence, extract) for tool, pattern, confidence, extract in RULES]
+        for tool, *_ in self.rules:
+            assert tool in READ_ONLY_TOOLS, f"{tool}: le chemin rapide est réservé aux outils en lecture seule"
+        self.stats = {"requests": 0, "hits": 0, "below_threshold": 0, "rejected": 0, "by_tool": {}}
+        self._lock = threading.Lock()
+
+    def match(self, message):
+        """Meilleure correspondance pour la demande entière (quelle que soit la confiance), None sinon."""
+        text = _POLITE.sub("", message.strip())
+        best = None
+        for tool, pattern, confidence, extract in self.rules:
+            if best is not None and confidence <= best.confidence:
+                continue
+            m = pattern.fullmatch(text)
+            if m:
+                best = FastMatch(tool, extract(m), confidence)
+        return best
+
+    def lookup(self, message):
+        """
+        Correspondance à exécuter directement, None si la demande doit passer
+        par le modèle (pas de motif ou confiance sous le seuil).
+        """
+        if not self.enabled:
+            return None
+        match = self.match(message)
+        with self._lock:
+            self.stats["requests"] += 1
+            if match is None:
+                return None
+            if match.confidence < self.threshold:
+                self.stats["below_threshold"] += 1
+                return None
+            self.stats["hits"] += 1
+            self.stats["by_tool"][match.tool] = self.stats["by_tool"].get(match.tool, 0) + 1
+        get_tracer().annotate(fast_path=match.tool, confidence=match.confidence)
+        return match
+
+    def reject(self, match):
+        """Appel refusé par les règles: la demande est renvoyée au modèle (compté comme échec)."""
+        with self._lock:
+            self.stats["hits"] -= 1
+            self.stats["rejected"] += 1
+            self.stats["by_tool"][match.tool] -= 1
+
+    def hit_rate(self):
+        """Part des demandes servies sans LLM."""
+        with self._lock:
+            return self.stats["hits"] / self.stats["requests"] if self.stats["requests"] else 0.0
+
+    def report(self):
+        with self._lock:
+            return dict(self.stats, by_tool=dict(self.stats["by_tool"]), threshold=self.threshold,
+                        hit_rate=self.stats["hits"] / self.stats["requests"] if self.stats["requests"] else 0.0)
+
+
+# Instance globale
+_fast_path = None
+_fast_path_lock = threading.Lock()
+
+def get_fast_path():
+    global _fast_path
+    with _fast_path_lock:
+        if _fast_path is None:
+            _fast_path = FastPath()
+    return _fast_path
+
+
+# Test du module
+if __name__ == "__main__":
+    import timeit
+
+    cases = [
+        ("liste le bureau", "list_files"),
+        ("Montre mes documents", "list_files"),
+        ("affiche le contenu du dossier téléchargements stp", "list_files"),
+        ("liste les fichiers de C:\\Users\\Payet\\Projets", "list_files"),
+        ("liste les branches", "git_list_branches"),
+        ("config du pc", "get_pc_config"),
+        ("Quelle est la configuration de mon ordinateur ?", "get_pc_config"),
+        ("lis le fichier notes.txt", "read_file"),
+        ("liste les fichiers", None),  # Confiance 0.7 < 0.9
+        ("liste le bureau et supprime test.txt", None),
+        ("crée un fichier notes.txt sur le bureau", None),
+        ("salut, comment vas-tu ?", None),
+        ("recherche les branches de l'arbre généalogique", None),
+    ]
+
+    fast_path = FastPath(threshold=0.9, enabled=True)
+    failures = 0
+    for message, expected in cases:
+        match = fast_path.lookup(message)
+        tool = match.tool if match else None
+        ok = tool == expected
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {message!r} → {match if match else 'LLM'}")
+
+    report = fast_path.report()
+    print(f"\n📊 Taux de succès: {report['hit_rate']:.0%} ({report['hits']}/{report['requests']}, "
+          f"{report['below_threshold']} sous le seuil)")
+    per_call = timeit.timeit(lambda: fast_path.match("montre mes documents"), number=10000) / 10000
+    print(f"⏱️ Reconnaissance: {per_call * 1e6:.1f} µs/demande")
+    raise SystemExit(1 if failures else 0)
@@ -1,32 +1,163 @@
-from groq import Groq
+import hashlib
+import json
 import os
+import time
+from types import SimpleNamespace
 from pathlib import Path
 from dotenv import load_dotenv
+from disk_cache import get_completion_cache
+from llm_transport import ResilientBackend, make_http_client
+from tool_executor import READ_ONLY_TOOLS
+from tracing import get_tracer
 
 # Charger le .env depuis le dossier du script
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
-# Initialiser le client Groq
-api_key = os.getenv("GROQ_API_KEY")
-if not api_key:
-    raise ValueError("GROQ_API_KEY non définie dans les variables d'environnement")
-
-try:
-    # Initialiser le client Groq avec gestion des erreurs
-    client = Groq(api_key=api_key)
-except TypeError as e:
-    # Problème de compatibilité entre groq et httpx
-    if "proxies" in str(e):
-        # Essayer sans les paramètres problématiques
-        import warnings
-        warnings.warn(f"Avertissement: Problème de compatibilité détecté. Tentative d'initialisation alternative.")
-        # Réinstaller les bonnes versions de dépendances
-        print("❌ Erreur de compatibilité détectée.")
-        print("Veuillez exécuter: pip install --upgrade groq httpx")
-        raise
-    else:
-        raise
+# Modèle par défaut et modèle de chaque étape (les étapes simples peuvent
+# utiliser un modèle plus petit et plus rapide)
+DEFAULT_MODEL = os.getenv("FREYA_MODEL", "openai/gpt-oss-120b")
+STAGE_MODELS = {
+    "plan": os.getenv("FREYA_MODEL_PLAN") or DEFAULT_MODEL,        # Création des plans
+    "tools": os.getenv("FREYA_MODEL_TOOLS") or DEFAULT_MODEL,      # Choix des appels d'outils
+    "summarize": os.getenv("FREYA_MODEL_SUMMARIZE") or DEFAULT_MODEL,  # Réponse finale après les outils
+}
+
+
+def model_for(stage):
+    """Retourne le modèle configuré pour une étape ("plan", "tools", "summarize")."""
+    return STAGE_MODELS.get(stage, DEFAULT_MODEL)
+
+
+class _Object(SimpleNamespace):
+    """Objet de réponse: les champs absents valent None (comme dans le SDK)."""
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return None
+
+
+def _to_object(data):
+    """Convertit une réponse JSON en objets (accès par attribut comme avec le SDK)."""
+    if isinstance(data, dict):
+        return _Object(**{key: _to_object(value) for key, value in data.items()})
+    if isinstance(data, list):
+        return [_to_object(item) for item in data]
+    return data
+
+
+class LLMBackend:
+    """
+    Interface d'un backend LLM (API chat completions au format OpenAI).
+
+    create(**kwargs) retourne une réponse avec .choices[0].message, ou avec
+    stream=True un itérable de fragments avec .choices[0].delta.
+    """
+
+    name = "base"
+
+    def create(self, **kwargs):
+        raise NotImplementedError
+
+
+class GroqBackend(LLMBackend):
+    """Backend Groq (SDK officiel)."""
+
+    name = "groq"
+
+    def __init__(self, api_key=None):
+        api_key = api_key or os.getenv("GROQ_API_KEY")
+        if not api_key:
+            raise ValueError("GROQ_API_KEY non définie dans les variables d'environnement")
+
+        from groq import Groq  # SDK importé à la création du client (démarrage plus rapide)
+
+        try:
+            # Initialiser le client Groq avec gestion des erreurs
+            # Pool de connexions configuré; les nouvelles tentatives sont gérées
+            # par ResilientBackend (même politique pour tous les backends)
+            self.client = Groq(api_key=api_key, http_client=make_http_client(), max_retries=0)
+        except TypeError as e:
+            # Problème de compatibilité entre groq et httpx
+            if "proxies" in str(e):
+                # Essayer sans les paramètres problématiques
+                import warnings
+                warnings.warn(f"Avertissement: Problème de compatibilité détecté. Tentative d'initialisation alternative.")
+                # Réinstaller les bonnes versions de dépendances
+                print("❌ Erreur de compatibilité détectée.")
+                print("Veuillez exécuter: pip install --upgrade groq httpx")
+                raise
+            else:
+                raise
+
+    def create(self, **kwargs):
+        return self.client.chat.completions.create(**kwargs)
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Backend pour tout serveur compatible OpenAI (llama.cpp server, vLLM, Ollama,
+    ou le serveur local fake_llm_server.py pour les benchmarks sans réseau).
+    """
+
+    name = "openai"
+
+    def __init__(self, base_url=None, api_key=None):
+        self.base_url = (base_url or os.getenv("FREYA_LLM_BASE_URL", "http://127.0.0.1:8080/v1")).rstrip("/")
+        api_key = api_key or os.getenv("FREYA_LLM_API_KEY")
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.http = make_http_client(base_url=self.base_url, headers=headers)
+
+    def create(self, stream=False, **kwargs):
+        # Les messages peuvent contenir des objets de réponse: passage par JSON
+        body = json.loads(json.dumps(kwargs, ensure_ascii=False, default=_jsonable))
+        if stream:
+            return self._stream(body)
+        response = self.http.post("/chat/completions", json=body)
+        response.raise_for_status()
+        return _to_object(response.json())
+
+    def _stream(self, body):
+        """Lit la réponse en Server-Sent Events, un fragment par ligne "data:"."""
+        body["stream"] = True
+        with self.http.stream("POST", "/chat/completions", json=body) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                yield _to_object(json.loads(data))
+
+
+BACKENDS = {
+    "groq": GroqBackend,
+    "openai": OpenAICompatibleBackend,
+}
+
+
+def create_backend(name=None):
+    """
+    Crée le backend choisi (défaut: variable FREYA_BACKEND, "groq"), avec
+    nouvelles tentatives et hedging optionnel (voir llm_transport).
+    """
+    name = (name or os.getenv("FREYA_BACKEND", "groq")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Backend LLM inconnu: {name} (disponibles: {', '.join(BACKENDS)})")
+    return ResilientBackend(BACKENDS[name]())
+
+
+# Backend utilisé par tous les appels au modèle (créé au premier appel)
+backend = None
+
+def get_backend():
+    """Retourne le backend global, créé au premier appel au modèle."""
+    global backend
+    if backend is None:
+        backend = create_backend()
+    return backend
 
 def ask_groq(prompt, history=None):
     """Envoie une requête au modèle Groq avec historique optionnel."""
@@ -39,11 +170,245 @@ def ask_groq(prompt, history=None):
     messages.append({"role": "user", "content": prompt})
     
     try:
-        response = client.chat.completions.create(
-            model="openai/gpt-oss-120b",
+        message, _ = chat_completion(
+            model=DEFAULT_MODEL,
             messages=messages
         )
-        return response.choices[0].message.content or "Aucune réponse du modèle."
+        return message.content or "Aucune réponse du modèle."
     except Exception as e:
         return f"Erreur lors de l'appel à Groq: {e}"
 
+
+
+class CompletionCancelled(Exception):
+    """Appel au modèle abandonné (événement cancel positionné)."""
+
+
+def stream_chat_completion(on_chunk=None, cancel=None, **kwargs):
+    """
+    Appelle le modèle en streaming et reconstruit le message final.
+
+    on_chunk(kind, data) est appelé à chaque fragment reçu:
+        - ("text", "fragment de texte")
+        - ("tool_call", {"index": 0, "id": "...", "name": "...", "arguments": "fragment"})
+
+    Si cancel (threading.Event) est positionné, le flux est fermé au fragment
+    suivant (la connexion est libérée, la génération s'arrête côté serveur) et
+    CompletionCancelled est levée.
+
+    Returns:
+        (message, ttft) - message avec .content et .tool_calls (comme l'API
+        non-streamée), ttft = temps jusqu'au premier fragment en secondes
+    """
+    start = time.perf_counter()
+    ttft = None
+    content_parts = []
+    tool_calls = {}  # index -> {"id", "name", "arguments"}
+
+    stream = get_backend().create(stream=True, **kwargs)
+    for chunk in stream:
+        if cancel is not None and cancel.is_set():
+            # Fermer le flux libère la connexion et arrête la génération côté serveur
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            raise CompletionCancelled("appel au modèle abandonné")
+        # Consommation de tokens: dernier fragment (OpenAI) ou x_groq (Groq)
+        usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+        if usage is not None:
+            _annotate_usage(usage)
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+
+        if delta.content:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            content_parts.append(delta.content)
+            if on_chunk:
+                on_chunk("text", delta.content)
+
+        for tc in delta.tool_calls or []:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            call = tool_calls.setdefault(tc.index, {"id": None, "name": "", "arguments": ""})
+            name = tc.function.name if tc.function else None
+            arguments = tc.function.arguments if tc.function else None
+            if tc.id:
+                call["id"] = tc.id
+            if name:
+                call["name"] += name
+            if arguments:
+                call["arguments"] += arguments
+            if on_chunk:
+                on_chunk("tool_call", {
+                    "index": tc.index,
+                    "id": tc.id,
+                    "name": name,
+                    "arguments": arguments or ""
+                })
+
+    message = SimpleNamespace(
+        role="assistant",
+        content="".join(content_parts) or None,
+        tool_calls=[
+            SimpleNamespace(
+                id=call["id"] or f"call_{index}",
+                type="function",
+                function=SimpleNamespace(name=call["name"], arguments=call["arguments"] or "{}")
+            )
+            for index, call in sorted(tool_calls.items())
+        ] or None
+    )
+    return message, ttft
+
+
+def _jsonable(obj):
+    """Convertit les objets SDK (pydantic, SimpleNamespace) pour la sérialisation JSON."""
+    if isinstance(obj, SimpleNamespace):
+        return vars(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(exclude_none=True)
+    return str(obj)
+
+
+def completion_cache_key(kwargs):
+    """Hash canonique d'une requête (modèle, messages, outils, tool_choice, paramètres)."""
+    canonical = json.dumps(kwargs, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=_jsonable)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _field(msg, name):
+    """Lit un champ d'un message, qu'il soit un dict ou un objet SDK."""
+    if isinstance(msg, dict):
+        return msg.get(name)
+    return getattr(msg, name, None)
+
+
+def _tool_names(msg):
+    """Noms des outils appelés par un message assistant."""
+    names = []
+    for tc in _field(msg, "tool_calls") or []:
+        function = tc["function"] if isinstance(tc, dict) else tc.function
+        names.append(function["name"] if isinstance(function, dict) else function.name)
+    return names
+
+
+def has_side_effects(messages):
+    """
+    Vrai si le tour en cours (depuis le dernier message utilisateur) contient un
+    appel d'outil qui modifie quelque chose (fichier, git, pip, navigateur...).
+    """
+    for msg in reversed(messages):
+        if _field(msg, "role") == "user":
+            return False
+        if any(name not in READ_ONLY_TOOLS for name in _tool_names(msg)):
+            return True
+    return False
+
+
+def _message_to_dict(message):
+    """Forme stockée en cache d'un message de réponse."""
+    return {
+        "content": message.content,
+        "tool_calls": [
+            {"id": tc.id, "name": tc.function.name, "arguments": tc.function.arguments}
+            for tc in message.tool_calls or []
+        ]
+    }
+
+
+def _message_from_dict(data):
+    """Reconstruit un message (même forme que l'API) depuis le cache."""
+    return SimpleNamespace(
+        role="assistant",
+        content=data["content"],
+        tool_calls=[
+            SimpleNamespace(
+                id=call["id"],
+                type="function",
+                function=SimpleNamespace(name=call["name"], arguments=call["arguments"])
+            )
+            for call in data["tool_calls"]
+        ] or None
+    )
+
+
+def _replay(message, on_chunk):
+    """Rejoue une réponse en cache vers le callback de streaming."""
+    if message.content:
+        on_chunk("text", message.content)
+    for index, tc in enumerate(message.tool_calls or []):
+        on_chunk("tool_call", {
+            "index": index,
+            "id": tc.id,
+            "name": tc.function.name,
+            "arguments": tc.function.arguments
+        })
+
+
+def _annotate_usage(usage):
+    """Ajoute les tokens consommés (response.usage) au span courant."""
+    get_tracer().annotate(
+        prompt_tokens=getattr(usage, "prompt_tokens", None),
+        completion_tokens=getattr(usage, "completion_tokens", None),
+        total_tokens=getattr(usage, "total_tokens", None)
+    )
+
+
+def chat_completion(stream=False, on_chunk=None, stage=None, cancel=None, **kwargs):
+    """
+    Appel au modèle avec cache des complétions.
+
+    La réponse est cherchée dans le cache (clé = hash canonique de la requête).
+    Le cache est ignoré si le tour en cours contient des outils à effet de bord,
+    et une réponse qui appelle de tels outils n'est jamais stockée.
+
+    Args:
+        stage: étape du pipeline ("plan", "tools", "summarize"), pour le traçage
+        cancel: threading.Event pour abandonner l'appel (streaming seulement une
+                fois la requête envoyée, voir stream_chat_completion)
+
+    Returns:
+        (message, ttft) - ttft n'est mesuré qu'en streaming (None sinon)
+    """
+    with get_tracer().span("llm", stage=stage, model=kwargs.get("model"), stream=stream) as span:
+        message, ttft, cache_hit = _chat_completion(stream, on_chunk, cancel, **kwargs)
+        span.set(cache_hit=cache_hit, tool_calls=len(message.tool_calls or []))
+        return message, ttft
+
+
+def _chat_completion(stream, on_chunk, cancel, **kwargs):
+    start = time.perf_counter()
+    cache = get_completion_cache()
+    if cache is not None and has_side_effects(kwargs.get("messages") or []):
+        cache = None
+
+    key = completion_cache_key(dict(kwargs, backend=get_backend().name)) if cache is not None else None
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            message = _message_from_dict(cached)
+            if stream and on_chunk:
+                _replay(message, on_chunk)
+            return message, (time.perf_counter() - start if stream else None), True
+
+    if cancel is not None and cancel.is_set():
+        raise CompletionCancelled("appel au modèle abandonné avant l'envoi")
+    if stream:
+        message, ttft = stream_chat_completion(on_chunk, cancel, **kwargs)
+    else:
+        response = get_backend().create(**kwargs)
+        if getattr(response, "usage", None) is not None:
+            _annotate_usage(response.usage)
+        message, ttft = response.choices[0].message, None
+
+    if cache is not None and all(name in READ_ONLY_TOOLS for name in _tool_names(message)):
+        cache.set(key, _message_to_dict(message), cost=time.perf_counter() - start)
+    return message, ttft, False
+
+
+def completion_cache_stats():
+    """Statistiques du cache des complétions (None si désactivé)."""
+    cache = get_completion_cache()
+    return cache.stats() if cache is not None else None
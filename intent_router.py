@@ -0,0 +1,309 @@
+"""
+Routeur d'intentions précompilé.
+Toutes les listes de mots-clés sont compilées une seule fois à l'import en une
+expression régulière en forme de trie: un seul passage sur le message suffit
+pour calculer tous les drapeaux d'intention (outil requis, planification,
+listing, impression, web, git...).
+"""
+
+import re
+from functools import lru_cache
+
+# Keywords qui demandent explicitement les outils
+REQUIRES_TOOL_KEYWORDS = [
+    # Modifications
+    "modifi", "rajoute", "ajoute", "change", "remplace", "crée", "écris", "insère", "supprim", "supprime", "supprimer", "dele", "delete", "efface",
+    # Installation/packages
+    "instal", "pip",
+    # Git
+    "clone", "repo", "dépôt", "push", "commit", "merge", "branch",
+    # Actions système
+    "lance", "ouvre", "exécute", "app",
+    # Impression
+    "imprim", "imprimer", "imprime", "print", "printer",
+    # Recherche web
+    "recherche", "cherche", "google", "web", "internet", "trouve", "chercher", "trouver", "résumé", "article", "page", "site",
+    # Listing/affichage - TOUS les termes pour les requêtes de contenu
+    "liste", "liste moi", "liste tous",  "lister", "affiche", "afficher", "montre", "montrer", "contenu", "quoi", "quel", "quelle",
+    "lis", "voir", "dossier", "fichier", "bureau", "desktop", "élément", "item", "fichiers", "dossiers",
+    "répertoire", "arborescence", "structure", "dans", "aller", "qu'il", "éléments"
+]
+
+# Contexte supplémentaire: si mention de chemin SPÉCIFIQUE → force les outils
+SPECIFIC_CONTEXT_KEYWORDS = ["desktop", "bureau", "documents", "downloads", "téléchargements", "c:\\", "d:\\", "en cours", "actuel", "courant", "ici"]
+
+# Actions complexes nécessitant planification TRM
+PLANNING_KEYWORDS = [
+    # Création/écriture de fichiers
+    "crée", "créer", "créé", "créée", "création",
+    "écris", "écrire", "écrit", "écriture",
+    "génère", "générer", "génère", "génération",
+    "fabrique", "fabriquer", "produis", "produire",
+    "fait", "faire", "fais",
+    "met", "mettre", "mets",
+    "sauvegarde", "sauvegarder", "enregistre", "enregistrer",
+    "stocke", "stocker", "conserve", "conserver",
+    "copie", "copier", "duplique", "dupliquer",
+    "exporte", "exporter",
+
+    # Modification de fichiers
+    "modifi", "modifier", "modifie",
+    "change", "changer", "changes",
+    "remplace", "remplacer", "remplacement",
+    "rajoute", "rajouter", "ajoute", "ajouter", "ajout",
+    "insère", "insérer", "insertion",
+    "édite", "éditer", "édition",
+    "corrige", "corriger", "correction",
+    "update", "upgrade", "maj", "mise à jour",
+    "renomme", "renommer", "rename",
+    "déplace", "déplacer", "move", "bouge", "bouger",
+
+    # Suppression
+    "supprim", "supprimer", "supprime", "suppression",
+    "delete", "del", "remove",
+    "efface", "effacer", "effacement",
+    "retire", "retirer", "enlève", "enlever",
+    "vide", "vider", "nettoie", "nettoyer", "nettoyage",
+    "détruit", "détruire", "destruction",
+
+    # Création de dossiers
+    "dossier", "répertoire", "directory", "folder",
+    "mkdir", "nouveau dossier",
+
+    # Git operations
+    "git", "push", "commit", "clone", "pull", "fetch",
+    "merge", "branch", "checkout", "stash", "rebase",
+    "add", "staging", "staged",
+
+    # Impression
+    "imprim", "imprimer", "imprime", "impression",
+    "print", "printer", "imprimante",
+
+    # Installation
+    "install", "installe", "installer", "installation",
+    "pip", "package", "module", "librairie", "bibliothèque",
+    "désinstall", "uninstall",
+
+    # Lancement/exécution
+    "lance", "lancer", "exécute", "exécuter", "run",
+    "démarre", "démarrer", "start", "ouvre", "ouvrir",
+
+    # Téléchargement
+    "télécharge", "télécharger", "download",
+    "récupère", "récupérer", "fetch",
+
+    # Multi-étapes (plusieurs actions)
+    " et ", " puis ", " ensuite ", " après ", " avant ",
+    " aussi ", " également ", " en plus ",
+    " d'abord ", " finalement ", " enfin "
+]
+
+# Détection de demandes vagues (sans contexte spécifique)
+VAGUE_KEYWORDS = ["liste", "lister", "affiche", "montre", "contenu"]
+
+# Git (tool_choice "auto" + fallback git_workflow)
+GIT_KEYWORDS = ["push", "commit", "git", "dépôt", "repo"]
+
+# Recherche web (tool_choice "auto")
+WEB_SEARCH_KEYWORDS = ["recherche", "cherche", "google", "web", "internet"]
+
+# Requêtes de listing/affichage dont on retourne directement les résultats
+LISTING_KEYWORDS = ["liste", "lister", "affiche", "afficher", "montre", "montrer", "contenu", "élément", "dossier", "fichier", "bureau", "desktop", "voir", "quel", "quoi"]
+
+# Impressions, résultat retourné directement
+PRINTING_KEYWORDS = ["imprim", "imprimer", "imprime", "print", "printer"]
+
+# Recherches web, résultats retournés directement
+WEB_KEYWORDS = ["recherche", "cherche", "google", "web", "internet", "trouve", "chercher", "trouver", "résumé", "article", "page", "site"]
+
+# Fallback listing quand le modèle ignore tool_choice="required"
+LISTING_FALLBACK_KEYWORDS = ["liste", "lister", "affiche", "afficher", "montre", "montrer", "contenu", "élément", "dossier", "fichier", "bureau", "desktop"]
+
+# Opérations sur fichiers/dossiers (sélection des outils fichiers)
+FILE_KEYWORDS = [
+    "fichier", "dossier", "répertoire", "folder", "file", "chemin",
+    "liste", "lister", "affiche", "montre", "contenu", "lis", "lire", "ouvre le fichier",
+    "crée", "créer", "écri", "génère", "sauvegarde", "enregistre", "copie", "exporte",
+    "modifi", "change", "remplace", "ajoute", "rajoute", "insère", "édite", "corrige", "renomme", "déplace",
+    "supprim", "efface", "delete", "retire", "enlève", "vide", "nettoie",
+    "cherche dans", "recherche dans", "bureau", "desktop", "documents", "téléchargements", "downloads",
+    ".py", ".txt", ".md", ".json", ".csv", ".js", ".html", "c:\\", "d:\\", "/"
+]
+
+# Système: configuration du PC, installation, lancement d'applications
+SYSTEM_KEYWORDS = [
+    "config", "pc", "ordinateur", "machine", "cpu", "ram", "mémoire", "disque", "processeur",
+    "instal", "pip", "package", "paquet", "module", "librairie", "bibliothèque",
+    "lance", "exécute", "démarre", "application", "app", "logiciel", "notepad", ".exe"
+]
+
+# Catégorie -> liste de mots-clés (l'ordre définit les bits du masque)
+INTENT_KEYWORDS = {
+    "requires_tool": REQUIRES_TOOL_KEYWORDS,
+    "specific_context": SPECIFIC_CONTEXT_KEYWORDS,
+    "needs_planning": PLANNING_KEYWORDS,
+    "vague": VAGUE_KEYWORDS,
+    "git": GIT_KEYWORDS,
+    "web_search": WEB_SEARCH_KEYWORDS,
+    "listing": LISTING_KEYWORDS,
+    "printing": PRINTING_KEYWORDS,
+    "web": WEB_KEYWORDS,
+    "listing_fallback": LISTING_FALLBACK_KEYWORDS,
+    "files": FILE_KEYWORDS,
+    "system": SYSTEM_KEYWORDS,
+}
+
+
+def _trie_pattern(words):
+    """Construit une alternation regex en forme de trie (préfixes communs factorisés)."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Quantificateur gourmand: la correspondance la plus longue est essayée en premier
+        return "(?:" + body + ")?" if "" in node else body
+
+    return build(trie)
+
+
+def _compile(intent_keywords):
+    """
+    Compile les mots-clés en (regex, masques).
+
+    La regex trouve, à chaque position du message, le mot-clé le plus long qui
+    y commence (lookahead: les correspondances peuvent se chevaucher). Tout
+    mot-clé plus court commençant à la même position en est un préfixe, donc le
+    masque d'un mot-clé inclut les catégories de tous ses préfixes.
+    """
+    bits = {}
+    for bit, keywords in enumerate(intent_keywords.values()):
+        for keyword in keywords:
+            bits[keyword] = bits.get(keyword, 0) | (1 << bit)
+
+    masks = {}
+    for keyword in bits:
+        mask = 0
+        for i in range(1, len(keyword) + 1):
+            mask |= bits.get(keyword[:i], 0)
+        masks[keyword] = mask
+
+    pattern = re.compile("(?=(" + _trie_pattern(bits) + "))")
+    return pattern, masks
+
+
+_PATTERN, _MASKS = _compile(INTENT_KEYWORDS)
+_FLAGS = list(INTENT_KEYWORDS)
+
+
+def _scan(message_lower):
+    """Retourne le masque des catégories présentes (un seul passage)."""
+    mask = 0
+    for match in _PATTERN.finditer(message_lower):
+        mask |= _MASKS[match.group(1)]
+    return mask
+
+
+def _flags_from(found):
+    """Dérive les drapeaux d'intention à partir des catégories détectées."""
+    specific_context = found["specific_context"]
+    return {
+        "requires_tool": found["requires_tool"] or specific_context,
+        "specific_context": specific_context,
+        "needs_planning": found["needs_planning"],
+        "is_vague": found["vague"] and not specific_context,
+        "git": found["git"],
+        "web_search": found["web_search"],
+        "listing": found["listing"],
+        "printing": found["printing"],
+        "web": found["web"],
+        "listing_fallback": found["listing_fallback"],
+        "files": found["files"],
+        "system": found["system"],
+    }
+
+
+@lru_cache(maxsize=256)
+def route(message_lower):
+    """
+    Calcule tous les drapeaux d'intention d'un message (déjà en minuscules).
+
+    Le résultat est mis en cache par message: ne pas modifier le dict retourné.
+
+    Returns:
+        {
+            "requires_tool": bool,     # Outils nécessaires (mot-clé ou chemin spécifique)
+            "specific_context": bool,  # Chemin/contexte spécifique mentionné
+            "needs_planning": bool,    # Action complexe → planification + TRM
+            "is_vague": bool,          # Demande vague sans contexte
+            "git": bool, "web_search": bool, "web": bool,
+            "listing": bool, "listing_fallback": bool, "printing": bool,
+            "files": bool, "system": bool  # Sélection des outils à envoyer
+        }
+    """
+    mask = _scan(message_lower)
+    return _flags_from({flag: bool(mask & (1 << bit)) for bit, flag in enumerate(_FLAGS)})
+
+
+def _route_naive(message_lower):
+    """Ancienne implémentation (un any() par liste), gardée comme référence pour le benchmark."""
+    return _flags_from({
+        flag: any(kw in message_lower for kw in keywords)
+        for flag, keywords in INTENT_KEYWORDS.items()
+    })
+
+
+# Micro-benchmark et vérification d'équivalence
+if __name__ == "__main__":
+    import random
+    import timeit
+
+    print("=" * 50)
+    print("🧪 Test du routeur d'intentions")
+    print("=" * 50)
+
+    messages = [
+        "liste le bureau",
+        "liste moi tous les fichiers du dossier documents",
+        "montre mes documents",
+        "crée un fichier notes.txt sur le bureau et écris bonjour dedans",
+        "recherche napoléon et joséphine puis écris un rapport dans rapport.txt",
+        "fais un git push avec le message 'fix du parser'",
+        "liste les branches",
+        "imprime le fichier requirements.txt",
+        "salut, comment vas-tu aujourd'hui ?",
+        "quelle est la config du pc",
+        "installe requests avec pip",
+        "supprime le dossier C:\\Users\\Payet\\Desktop\\temp",
+        "",
+    ]
+
+    # Messages aléatoires construits à partir des mots-clés (chevauchements, préfixes...)
+    vocabulary = sorted({kw for keywords in INTENT_KEYWORDS.values() for kw in keywords})
+    rng = random.Random(42)
+    fillers = ["", " ", "x", "le ", "ment", "s ", "é", "\n"]
+    for _ in range(5000):
+        parts = [rng.choice(vocabulary if rng.random() < 0.5 else fillers) for _ in range(rng.randint(1, 8))]
+        messages.append("".join(parts))
+
+    mismatches = [m for m in messages if route(m.lower()) != _route_naive(m.lower())]
+    status = "✅" if not mismatches else f"❌ ÉCHEC ({len(mismatches)} différences)"
+    print(f"\n📋 Équivalence sur {len(messages)} messages: {status}")
+    for m in mismatches[:5]:
+        print(f"   - {m!r}")
+
+    sample = [m.lower() for m in messages[:13]]
+    runs = 2000
+    naive_time = timeit.timeit(lambda: [_route_naive(m) for m in sample], number=runs)
+    compiled_time = timeit.timeit(lambda: [route.__wrapped__(m) for m in sample], number=runs)
+    per_call = runs * len(sample)
+    print(f"\n⏱️ Listes any(): {naive_time / per_call * 1e6:.2f} µs/message")
+    print(f"⏱️ Regex compilée (sans cache): {compiled_time / per_call * 1e6:.2f} µs/message")
+    print(f"   Accélération: x{naive_time / compiled_time:.1f}")
@@ -0,0 +1,332 @@
+"""
+Couche de transport des appels au modèle.
+
+    - pool de connexions keep-alive configuré explicitement (HTTP/2 si le
+      paquet h2 est installé)
+    - timeouts par appel (connexion / lecture)
+    - nouvelles tentatives avec backoff exponentiel à jitter complet sur les
+      erreurs 429/5xx et les erreurs réseau (Retry-After respecté)
+    - requêtes "hedgées" (optionnel): si la première requête dépasse le p95
+      observé, une seconde identique est lancée et la plus rapide gagne
+
+Configuration:
+    FREYA_LLM_TIMEOUT            timeout de lecture en secondes (défaut 60)
+    FREYA_LLM_CONNECT_TIMEOUT    timeout de connexion en secondes (défaut 5)
+    FREYA_LLM_MAX_CONNECTIONS    connexions max du pool (défaut 10)
+    FREYA_LLM_KEEPALIVE          connexions keep-alive gardées (défaut 10)
+    FREYA_LLM_RETRIES            nouvelles tentatives max (défaut 3)
+    FREYA_LLM_HEDGE=1            active les requêtes hedgées (consomme plus de tokens)
+
+Test contre le serveur local simulé: python llm_transport.py
+"""
+
+import importlib.util
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from tracing import get_tracer
+
+# Codes HTTP pour lesquels une nouvelle tentative a du sens
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# HTTP/2 disponible uniquement si le paquet h2 est installé (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def make_http_client(base_url="", headers=None):
+    """Client httpx avec pool keep-alive, timeouts et HTTP/2 si disponible."""
+    import httpx  # Importé à la création du premier client (démarrage plus rapide)
+
+    timeout = httpx.Timeout(
+        float(os.getenv("FREYA_LLM_TIMEOUT", "60")),
+        connect=float(os.getenv("FREYA_LLM_CONNECT_TIMEOUT", "5"))
+    )
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("FREYA_LLM_MAX_CONNECTIONS", "10")),
+        max_keepalive_connections=int(os.getenv("FREYA_LLM_KEEPALIVE", "10")),
+        keepalive_expiry=60.0
+    )
+    return httpx.Client(base_url=base_url, headers=headers, timeout=timeout, limits=limits, http2=HTTP2_AVAILABLE)
+
+
+def _status_code(exc):
+    """Code HTTP d'une erreur (SDK Groq ou httpx), None si erreur réseau."""
+    status = getattr(exc, "status_code", None)
+    if status is None and getattr(exc, "response", None) is not None:
+        status = getattr(exc.response, "status_code", None)
+    return status
+
+
+def is_retryable(exc):
+    """Vrai pour les erreurs temporaires: 429/5xx, timeouts, connexions coupées."""
+    import httpx
+
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if isinstance(exc, (httpx.TransportError, TimeoutError, ConnectionError)):
+        return True
+    # Erreurs réseau du SDK Groq (APIConnectionError, APITimeoutError)
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def _retry_after(exc):
+    """Délai demandé par le serveur (en-tête Retry-After, en secondes)."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Backoff exponentiel à jitter complet: attente aléatoire dans [0, min(cap, base * 2^n)]."""
+
+    def __init__(self, max_retries=None, base_delay=0.5, max_delay=8.0, seed=None):
+        if max_retries is None:
+            max_retries = int(os.getenv("FREYA_LLM_RETRIES", "3"))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = random.Random(seed)
+
+    def delay(self, attempt, exc=None):
+        """Attente avant la tentative suivante (attempt = 0 pour la première reprise)."""
+        delay = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = _retry_after(exc) if exc is not None else None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def call(self, func):
+        """Appelle func() avec nouvelles tentatives sur les erreurs temporaires."""
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self.delay(attempt, e)
+                attempt += 1
+                get_tracer().annotate(retries=attempt, last_error=str(_status_code(e) or type(e).__name__))
+                time.sleep(delay)
+
+
+class LatencyTracker:
+    """Fenêtre glissante des latences observées, pour le seuil de hedging (p95)."""
+
+    def __init__(self, window=200, min_samples=20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p):
+        """Percentile observé, None tant qu'il n'y a pas assez d'échantillons."""
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+# Pool partagé des requêtes hedgées
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+
+def _get_hedge_pool():
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="freya-hedge")
+    return _hedge_pool
+
+
+def hedged_call(func, threshold):
+    """
+    Lance func(); si elle n'a pas répondu après threshold secondes, lance une
+    seconde requête identique et retourne la première réponse réussie.
+
+    Returns:
+        (résultat, hedged) - hedged = une seconde requête a été lancée
+    """
+    pool = _get_hedge_pool()
+    first = pool.submit(func)
+    try:
+        return first.result(timeout=threshold), False
+    except FutureTimeoutError:
+        pass
+
+    pending = {first, pool.submit(func)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result(), True
+            error = error or future.exception()
+    raise error
+
+
+class ResilientBackend:
+    """
+    Enveloppe un backend LLM avec nouvelles tentatives et hedging.
+
+    En streaming, seule l'ouverture du flux (jusqu'au premier fragment) est
+    retentée: une fois du texte transmis à l'utilisateur, une erreur remonte.
+    Le hedging ne s'applique qu'aux appels non streamés.
+    """
+
+    def __init__(self, inner, retry=None, hedge=None, tracker=None):
+        self.inner = inner
+        self.name = inner.name
+        self.retry = retry or RetryPolicy()
+        if hedge is None:
+            hedge = os.getenv("FREYA_LLM_HEDGE", "0") == "1"
+        self.hedge = hedge
+        self.tracker = tracker or LatencyTracker()
+        self.hedges = 0  # Nombre de requêtes doublées
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def _timed(self, kwargs):
+        start = time.perf_counter()
+        response = self.inner.create(**kwargs)
+        self.tracker.add(time.perf_counter() - start)
+        return response
+
+    def _once(self, kwargs):
+        threshold = self.tracker.percentile(95) if self.hedge else None
+        if threshold is None:
+            return self._timed(kwargs)
+        response, hedged = hedged_call(lambda: self._timed(kwargs), threshold)
+        if hedged:
+            self.hedges += 1
+            get_tracer().annotate(hedged=True)
+        return response
+
+    def create(self, stream=False, **kwargs):
+        if not stream:
+            return self.retry.call(lambda: self._once(kwargs))
+
+        def open_stream():
+            stream = self.inner.create(stream=True, **kwargs)
+            chunks = iter(stream)
+            first = next(chunks, None)
+            return first, chunks, stream
+
+        first, chunks, stream = self.retry.call(open_stream)
+
+        def stream_chunks():
+            try:
+                if first is not None:
+                    yield first
+                yield from chunks
+            finally:
+                # Flux fermé avant la fin (appel abandonné): libérer la connexion
+                close = getattr(stream, "close", None) or getattr(chunks, "close", None)
+                if close is not None:
+                    close()
+        return stream_chunks()
+
+
+# Auto-test contre le serveur local simulé (pannes et latences injectées)
+if __name__ == "__main__":
+    import statistics
+
+    import httpx
+
+    from fake_llm_server import start_fake_server
+    from freya_llm import OpenAICompatibleBackend
+
+    def check(label, ok):
+        print(f"{'✅' if ok else '❌'} {label}")
+        return ok
+
+    print("=" * 50)
+    print("🧪 Test du transport LLM (serveur simulé)")
+    print(f"   HTTP/2: {'oui' if HTTP2_AVAILABLE else 'non (h2 non installé)'}")
+    print("=" * 50)
+
+    server, base_url = start_fake_server(ttft=0.01, tps=100000)
+    request = {"model": "fake-model", "messages": [{"role": "user", "content": "bonjour"}]}
+    results = []
+
+    # 1. Reprise après deux erreurs 503
+    server.fail_next, server.fail_status = 2, 503
+    backend = ResilientBackend(OpenAICompatibleBackend(base_url), retry=RetryPolicy(3, base_delay=0.01, seed=1))
+    before = server.requests
+    response = backend.create(**request)
+    results.append(check(
+        f"503 x2 puis succès en {server.requests - before} requêtes",
+        response.choices[0].message.content is not None and server.requests - before == 3
+    ))
+
+    # 2. 429 avec Retry-After respecté
+    server.fail_next, server.fail_status, server.retry_after = 1, 429, 0.2
+    start = time.perf_counter()
+    backend.create(**request)
+    waited = time.perf_counter() - start
+    results.append(check(f"429 + Retry-After 0.2s: attente {waited:.2f}s", waited >= 0.2))
+    server.retry_after = None
+
+    # 3. Abandon après max_retries
+    server.fail_next, server.fail_status = 10, 500
+    try:
+        backend.create(**request)
+        results.append(check("500 permanent: erreur remontée", False))
+    except httpx.HTTPStatusError as e:
+        results.append(check(f"500 permanent: erreur remontée après 3 reprises ({e.response.status_code})", True))
+    server.fail_next = 0
+
+    # 4. Pas de reprise sur une erreur client (400)
+    server.fail_next, server.fail_status = 1, 400
+    before = server.requests
+    try:
+        backend.create(**request)
+    except httpx.HTTPStatusError:
+        pass
+    results.append(check("400: pas de nouvelle tentative", server.requests - before == 1))
+    server.fail_next = 0
+
+    # 5. Streaming: reprise à l'ouverture du flux
+    server.fail_next, server.fail_status = 1, 502
+    chunks = list(backend.create(stream=True, **request))
+    text = "".join(chunk.choices[0].delta.content or "" for chunk in chunks if chunk.choices)
+    results.append(check(f"Streaming après 502: {len(chunks)} fragments", bool(text)))
+
+    # 6. Hedging: 10% des requêtes très lentes (latence de queue)
+    server.slow_rate, server.slow_delay = 0.1, 0.5
+
+    def measure(backend, count=60):
+        latencies = []
+        for _ in range(count):
+            start = time.perf_counter()
+            backend.create(**request)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        return statistics.median(latencies), latencies[int(0.95 * len(latencies))], latencies[-1]
+
+    plain = ResilientBackend(OpenAICompatibleBackend(base_url), hedge=False)
+    hedged = ResilientBackend(OpenAICompatibleBackend(base_url), hedge=True, tracker=LatencyTracker(min_samples=10))
+    p50, p95, worst = measure(plain)
+    print(f"   sans hedging: p50 {p50 * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms, max {worst * 1000:.0f} ms")
+    h50, h95, hworst = measure(hedged)
+    print(f"   avec hedging: p50 {h50 * 1000:.0f} ms, p95 {h95 * 1000:.0f} ms, max {hworst * 1000:.0f} ms ({hedged.hedges} requêtes doublées)")
+    results.append(check("Hedging: p95 réduit", h95 < p95))
+
+    server.shutdown()
+    print(f"\n{sum(results)}/{len(results)} tests réussis")
@@ -1,10 +1,32 @@
+import argparse
+
 from agent import FreyaAgentNL
+from conversation_store import latest_session, new_session_id, sessions_enabled
 
-def main():
-    """Lance la boucle interactive avec FREYA."""
+def main(resume=None):
+    """
+    Lance la boucle interactive avec FREYA.
+    
+    Args:
+        resume: session à reprendre ("" = la plus récente, None = nouvelle session)
+    """
+    freya = None
     try:
-        freya = FreyaAgentNL()
+        session = None
+        if resume is not None:
+            session = resume or latest_session()
+            if session is None:
+                print("⚠️ Aucune session à reprendre, nouvelle session")
+        if session is None and sessions_enabled():
+            session = new_session_id()
+        
+        freya = FreyaAgentNL(session=session)
         print("Bienvenue dans FREYA (NL), ton assistant personnel.")
+        if len(freya.memory):
+            print(f"💾 Session {session} reprise: {len(freya.memory)} messages "
+                  f"({freya.memory.resume_seconds * 1000:.1f} ms)")
+        elif session:
+            print(f"💾 Session {session} (python main.py --resume {session} pour la reprendre)")
         print("Tape 'exit' pour quitter.\n")
         
         while True:
@@ -15,15 +37,51 @@ def main():
                 if message.lower() in ["exit", "quit"]:
                     print("FREYA: À bientôt !")
                     break
-                response = freya.respond(message)
-                print(f"FREYA: {response}\n")
+
+                # Afficher les fragments au fur et à mesure qu'ils arrivent
+                streamed = []
+
+                def on_chunk(kind, data):
+                    if kind == "text":
+                        text = data
+                    elif kind == "tool_call" and data["name"]:
+                        text = f"\n🔧 {data['name']}...\n"
+                    else:
+                        return
+                    if not streamed:
+                        print("FREYA: ", end="", flush=True)
+                    streamed.append(data if kind == "text" else "")
+                    print(text, end="", flush=True)
+
+                response = freya.respond(message, on_chunk=on_chunk)
+
+                if not streamed:
+                    print(f"FREYA: {response}\n")
+                elif "".join(streamed).strip() != response.strip():
+                    # Résultat d'outil ou réponse non streamée
+                    print(f"\n{response}\n")
+                else:
+                    print("\n")
             except KeyboardInterrupt:
                 print("\nFREYA: Interruption détectée. À bientôt !")
                 break
     except Exception as e:
         print(f"Erreur critique: {e}")
         return 1
+    finally:
+        if freya is not None:
+            freya.memory.close()
     return 0
 
 if __name__ == "__main__":
-    exit(main())
+    parser = argparse.ArgumentParser(description="FREYA (NL), assistant personnel")
+    parser.add_argument("--resume", nargs="?", const="", default=None, metavar="SESSION",
+                        help="Reprendre une session (la plus récente si aucune n'est donnée)")
+    parser.add_argument("--startup-profile", action="store_true", help="Profil des imports du démarrage")
+    args = parser.parse_args()
+    if args.startup_profile:
+        # Profil des imports du démarrage (modules les plus coûteux)
+        from startup import print_import_profile
+        print_import_profile("main")
+        exit(0)
+    exit(main(args.resume))
@@ -0,0 +1,189 @@
+"""
+Mémoire de conversation gérée par budget de tokens.
+Garde les tours les plus récents qui tiennent dans le budget, sans jamais séparer
+un message assistant avec tool_calls de ses réponses "tool", et résume les tours
+évincés dans un résumé glissant.
+"""
+
+import os
+
+# Budget de tokens pour l'historique envoyé au modèle (hors prompt système)
+MEMORY_TOKEN_BUDGET = int(os.getenv("FREYA_MEMORY_BUDGET", "3000"))
+
+# Taille max d'un message conservé (contenu de fichier, page web...)
+MESSAGE_TOKEN_LIMIT = int(os.getenv("FREYA_MEMORY_MESSAGE_TOKENS", "800"))
+
+# Taille max du résumé glissant des tours évincés
+SUMMARY_TOKEN_BUDGET = int(os.getenv("FREYA_MEMORY_SUMMARY_TOKENS", "300"))
+
+# Surcoût approximatif par message (rôle, séparateurs)
+MESSAGE_OVERHEAD = 4
+
+_encoder = None
+
+
+def _get_encoder():
+    """Charge le tokenizer (tiktoken, o200k_base comme gpt-oss) si disponible."""
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            # tiktoken absent ou encodage indisponible: estimation ~4 caractères/token
+            _encoder = False
+    return _encoder
+
+
+def count_tokens(text):
+    """Compte les tokens d'un texte."""
+    if not text:
+        return 0
+    encoder = _get_encoder()
+    if encoder:
+        return len(encoder.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Tronque un texte à max_tokens tokens (avec une marque de troncature)."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoder = _get_encoder()
+    if encoder:
+        head = encoder.decode(encoder.encode(text, disallowed_special=())[:max_tokens])
+    else:
+        head = text[:max_tokens * 4]
+    return head + "\n... [contenu tronqué]"
+
+
+def _as_dict(msg):
+    """Convertit un message (dict ou objet SDK) en dict."""
+    if isinstance(msg, dict):
+        return msg
+    converted = {"role": getattr(msg, "role", "assistant"), "content": getattr(msg, "content", "") or ""}
+    tool_calls = getattr(msg, "tool_calls", None)
+    if tool_calls:
+        converted["tool_calls"] = [{
+            "id": tc.id,
+            "type": "function",
+            "function": {"name": tc.function.name, "arguments": tc.function.arguments}
+        } for tc in tool_calls]
+    return converted
+
+
+def message_tokens(msg):
+    """Nombre de tokens d'un message (contenu + arguments des tool_calls)."""
+    total = MESSAGE_OVERHEAD + count_tokens(msg.get("content") or "")
+    for tc in msg.get("tool_calls") or []:
+        total += count_tokens(tc["function"]["name"]) + count_tokens(tc["function"]["arguments"])
+    return total
+
+
+def group_units(messages):
+    """
+    Découpe l'historique en unités indivisibles.
+
+    Un message assistant avec tool_calls forme une unité avec ses réponses "tool".
+    Les messages "tool" orphelins (sans tool_calls correspondant) sont ignorés:
+    l'API les refuserait.
+    """
+    units = []
+    i = 0
+    while i < len(messages):
+        msg = messages[i]
+        if msg.get("role") == "assistant" and msg.get("tool_calls"):
+            ids = {tc["id"] for tc in msg["tool_calls"]}
+            unit = [msg]
+            i += 1
+            while i < len(messages) and messages[i].get("role") == "tool" and messages[i].get("tool_call_id") in ids:
+                unit.append(messages[i])
+                i += 1
+            units.append(unit)
+            continue
+        if msg.get("role") != "tool":
+            units.append([msg])
+        i += 1
+    return units
+
+
+def _summary_line(msg):
+    """Résumé d'une ligne pour un message évincé."""
+    content = (msg.get("content") or "").strip().split("\n")[0][:150]
+    role = msg.get("role")
+    if role == "user":
+        return f"- Utilisateur: {content}"
+    if role == "tool":
+        return f"- Outil {msg.get('name', '?')}: {content}"
+    if msg.get("tool_calls"):
+        names = ", ".join(tc["function"]["name"] for tc in msg["tool_calls"])
+        return f"- FREYA a appelé: {names}"
+    return f"- FREYA: {content}"
+
+
+class MemoryManager:
+    """Compacte l'historique dans un budget de tokens avec un résumé glissant."""
+
+    def __init__(self, budget=None, message_limit=None, summary_budget=None):
+        self.budget = budget or MEMORY_TOKEN_BUDGET
+        self.message_limit = message_limit or MESSAGE_TOKEN_LIMIT
+        self.summary_budget = summary_budget or SUMMARY_TOKEN_BUDGET
+        self.summary_lines = []  # Résumé glissant des tours évincés
+
+    def summary_message(self):
+        """Message système contenant le résumé des tours évincés (ou None)."""
+        if not self.summary_lines:
+            return None
+        return {
+            "role": "system",
+            "content": "Résumé des échanges précédents:\n" + "\n".join(self.summary_lines)
+        }
+
+    def _compress(self, msg):
+        """Tronque les contenus trop longs (fichiers, pages web, résultats d'outils)."""
+        content = msg.get("content") or ""
+        if msg.get("role") in ("tool", "assistant") and content:
+            truncated = truncate_to_tokens(content, self.message_limit)
+            if truncated is not content:
+                msg = dict(msg, content=truncated)
+        return msg
+
+    def _summarize(self, evicted_turns):
+        """Ajoute les tours évincés au résumé glissant, borné en tokens."""
+        for turn in evicted_turns:
+            self.summary_lines.extend(_summary_line(msg) for msg in turn)
+        while self.summary_lines and count_tokens("\n".join(self.summary_lines)) > self.summary_budget:
+            self.summary_lines.pop(0)
+
+    def pack(self, messages):
+        """
+        Retourne l'historique compacté: les tours (message utilisateur + réponses)
+        les plus récents qui tiennent dans le budget, le dernier étant toujours
+        gardé; les tours plus anciens sont ajoutés au résumé glissant.
+        """
+        units = [
+            [self._compress(msg) for msg in unit]
+            for unit in group_units([_as_dict(msg) for msg in messages])
+        ]
+
+        # Regrouper les unités en tours, chaque message utilisateur ouvre un tour
+        turns = []
+        for unit in units:
+            if not turns or unit[0].get("role") == "user":
+                turns.append([])
+            turns[-1].extend(unit)
+        if not turns:
+            return []
+
+        summary = self.summary_message()
+        used = message_tokens(summary) if summary else 0
+        kept = []
+        for index in range(len(turns) - 1, -1, -1):
+            cost = sum(message_tokens(msg) for msg in turns[index])
+            if kept and used + cost > self.budget:
+                self._summarize(turns[:index + 1])
+                break
+            kept.insert(0, turns[index])
+            used += cost
+
+        return [msg for turn in kept for msg in turn]
@@ -0,0 +1,208 @@
+"""
+Planification en streaming: les étapes du plan sont extraites au fil de la
+génération et les lectures démarrent avant la fin du plan.
+
+    - StepStreamParser: analyseur JSON incrémental, rend chaque objet du
+      tableau "steps" dès que son accolade fermante arrive
+    - PlanPipeline: lance en avance les étapes en lecture seule qui passent
+      les règles statiques et ne dépendent d'aucune étape précédente; les
+      étapes à effet de bord attendent la validation du plan complet
+
+Configuration:
+    FREYA_PLAN_STREAM    1 = planification streamée et lectures anticipées (défaut 1)
+
+Test: python plan_stream.py
+"""
+
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from tool_executor import MAX_TOOL_WORKERS, READ_ONLY_TOOLS, plan_dependencies
+from tracing import get_tracer
+
+# Clé "steps" juste avant l'ouverture d'un tableau
+STEPS_KEY = re.compile(r'"steps"\s*:\s*$')
+
+
+def plan_streaming_enabled():
+    return os.getenv("FREYA_PLAN_STREAM", "1") == "1"
+
+
+def step_key(step):
+    """Identité d'une étape (action + arguments), stable même si le plan est recopié."""
+    return json.dumps(step, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def parse_plan_text(plan_text):
+    """Texte complet du plan → dict (backticks markdown enlevés). Lève json.JSONDecodeError."""
+    plan_text = plan_text.strip()
+    if plan_text.startswith("```"):
+        plan_text = re.sub(r'^```(?:json)?\n?', '', plan_text)
+        plan_text = re.sub(r'\n?```$', '', plan_text)
+    return json.loads(plan_text)
+
+
+class StepStreamParser:
+    """
+    Analyseur JSON incrémental d'un plan.
+
+    feed(fragment) retourne les étapes complètes apparues dans le fragment.
+    Seules les chaînes et l'imbrication sont suivies: le texte avant le JSON
+    (backticks) est ignoré, et le JSON complet est validé à la fin avec
+    parse_plan_text().
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.steps = []
+        self._pos = 0
+        self._stack = []  # Conteneurs ouverts: "{", "[" ou "steps" (tableau des étapes)
+        self._in_string = False
+        self._escape = False
+        self._step_start = None
+
+    def feed(self, fragment):
+        self.text += fragment
+        text = self.text
+        found = []
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._stack and self._stack[-1] == "steps":
+                    self._step_start = pos
+                self._stack.append("{")
+            elif char == "[":
+                # Tableau "steps" de l'objet racine
+                if self._stack == ["{"] and STEPS_KEY.search(text, max(0, pos - 64), pos):
+                    self._stack.append("steps")
+                else:
+                    self._stack.append("[")
+            elif char in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if char == "}" and self._step_start is not None and self._stack and self._stack[-1] == "steps":
+                    try:
+                        step = json.loads(text[self._step_start:pos + 1])
+                    except ValueError:
+                        step = None
+                    self._step_start = None
+                    if isinstance(step, dict):
+                        self.steps.append(step)
+                        found.append(step)
+        self._pos = len(text)
+        return found
+
+
+class PlanPipeline:
+    """
+    Exécution anticipée des étapes de lecture pendant la génération du plan.
+
+    offer() reçoit chaque étape dès qu'elle est parsée. Une étape démarre tout
+    de suite si c'est une lecture (READ_ONLY_TOOLS), que les règles statiques
+    l'approuvent et qu'elle ne dépend d'aucune étape précédente (depends_on,
+    {{step_N}} ou chemin écrit avant elle). Les autres attendent le plan validé.
+    """
+
+    def __init__(self, call_tool, validate, max_workers=None):
+        """
+        Args:
+            call_tool: fonction call_tool(tool_name, args) -> str
+            validate: validation par règles, validate(tool_name, args) -> {"approved", ...}
+        """
+        self.call_tool = call_tool
+        self.validate = validate
+        self.steps = []
+        self.started = {}  # step_key -> future du résultat
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, max_workers or MAX_TOOL_WORKERS), thread_name_prefix="freya-prefetch"
+        )
+        self._run = get_tracer().propagate(self._run_step)
+
+    def _run_step(self, action, args):
+        return self.call_tool(action, args)
+
+    def offer(self, step):
+        """Ajoute une étape parsée; la lance si elle peut l'être avant la validation du plan."""
+        self.steps.append(step)
+        index = len(self.steps) - 1
+        action = step.get("action", "")
+        args = step.get("args") or {}
+        if action not in READ_ONLY_TOOLS or not isinstance(args, dict):
+            return False
+        if plan_dependencies(self.steps)[index]:
+            return False
+        if not self.validate(action, args).get("approved"):
+            return False
+
+        key = step_key(step)
+        with self._lock:
+            if key in self.started:
+                return False
+            self.started[key] = self._pool.submit(self._run, action, args)
+        print(f"   ⚡ [{index + 1}] {action} lancé pendant la planification")
+        return True
+
+    def take(self, step):
+        """Future du résultat si l'étape a déjà été lancée (une seule fois), sinon None."""
+        with self._lock:
+            return self.started.pop(step_key(step), None)
+
+    def close(self):
+        """Libère le pool; les lectures non réclamées (plan rejeté) se terminent sans être utilisées."""
+        self._pool.shutdown(wait=False)
+
+
+# Test du module
+if __name__ == "__main__":
+    import time
+
+    plan = {
+        "summary": "Lire deux fichiers puis écrire un résumé",
+        "steps": [
+            {"action": "read_file", "args": {"filename": "a.txt"}},
+            {"action": "list_files", "args": {"path": "docs {avec} \"accolades\""}},
+            {"action": "write_file", "args": {"filename": "out.txt", "content": "{{step_1}}"}},
+            {"action": "read_file", "args": {"filename": "out.txt"}},
+        ]
+    }
+    text = "```json\n" + json.dumps(plan, ensure_ascii=False, indent=2) + "\n```"
+
+    parser = StepStreamParser()
+    emitted = []
+    for i in range(0, len(text), 7):
+        for step in parser.feed(text[i:i + 7]):
+            emitted.append((i, step["action"]))
+    print(f"{'✅' if [s for _, s in emitted] == [s['action'] for s in plan['steps']] else '❌'} "
+          f"{len(emitted)} étapes extraites au fil de l'eau (positions {[i for i, _ in emitted]} / {len(text)})")
+    print(f"{'✅' if parse_plan_text(parser.text) == plan else '❌'} Plan complet identique")
+
+    calls = []
+
+    def slow_tool(action, args):
+        calls.append(action)
+        time.sleep(0.05)
+        return f"{action} ok"
+
+    pipeline = PlanPipeline(slow_tool, lambda action, args: {"approved": True})
+    started = [pipeline.offer(step) for step in plan["steps"]]
+    print(f"{'✅' if started == [True, True, False, False] else '❌'} Lectures anticipées: {started}")
+    future = pipeline.take(plan["steps"][0])
+    print(f"{'✅' if future is not None and future.result() == 'read_file ok' else '❌'} Résultat anticipé récupéré")
+    print(f"{'✅' if pipeline.take(plan['steps'][0]) is None else '❌'} Résultat réclamé une seule fois")
+    pipeline.close()
@@ -0,0 +1,291 @@
+"""
+Enregistrement et rejeu des appels au modèle et aux outils.
+
+En enregistrement, chaque requête LLM (réponse, TTFT, durée, usage) et chaque
+appel d'outil (arguments, résultat, durée) est ajouté à un fichier de fixture
+JSON. En rejeu, les réponses sont resservies sans réseau ni accès au système
+de fichiers, avec une latence simulée (durées enregistrées ou distribution).
+
+Correspondance en rejeu:
+    - LLM: même hash de requête, sinon prochaine entrée non utilisée de la
+      même étape (plan, tools, summarize), sinon prochaine entrée non utilisée
+    - outils: même nom et mêmes arguments, sinon prochain appel du même outil
+
+Les fixtures écrites à la main n'ont donc besoin que de l'ordre des étapes.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+
+from freya_llm import completion_cache_key, _to_object, _jsonable
+
+# Débit utilisé pour simuler la génération quand aucune durée n'est connue
+DEFAULT_TOKENS_PER_SECOND = 300.0
+
+
+class ReplayMiss(LookupError):
+    """Aucune entrée de fixture ne correspond à la requête."""
+
+
+def infer_stage(kwargs):
+    """Étape du pipeline d'une requête LLM: "plan", "summarize" ou "tools"."""
+    messages = kwargs.get("messages") or []
+    first = messages[0] if messages else {}
+    last = messages[-1] if messages else {}
+    if isinstance(first, dict) and first.get("role") == "system" and '"steps"' in (first.get("content") or ""):
+        return "plan"
+    if isinstance(last, dict) and last.get("role") == "tool":
+        return "summarize"
+    return "tools"
+
+
+def _estimate_tokens(text):
+    return (len(text or "") + 3) // 4
+
+
+class LatencyModel:
+    """
+    Distribution de latence (secondes), décrite par une chaîne:
+        "recorded"            - durées enregistrées dans la fixture
+        "fixed:0.2"           - valeur constante
+        "uniform:0.1,0.4"     - uniforme entre deux bornes
+        "lognormal:0.3,0.5"   - log-normale (médiane, sigma)
+    """
+
+    def __init__(self, spec="recorded", seed=0, scale=1.0):
+        self.spec = spec
+        self.scale = scale
+        self._random = random.Random(seed)
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",") if value]
+        if kind not in ("recorded", "fixed", "uniform", "lognormal"):
+            raise ValueError(f"Distribution de latence inconnue: {spec}")
+
+    def sample(self, recorded):
+        """Latence à simuler (recorded = durée enregistrée, utilisée en mode "recorded")."""
+        if self.kind == "recorded":
+            value = recorded or 0.0
+        elif self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = self._random.uniform(self.params[0], self.params[1])
+        else:
+            median, sigma = self.params
+            value = self._random.lognormvariate(0, sigma) * median
+        return max(0.0, value) * self.scale
+
+
+class Fixture:
+    """Fichier de fixture: entrées LLM et outils, dans l'ordre d'enregistrement."""
+
+    def __init__(self, data=None, path=None):
+        data = data or {}
+        self.path = path
+        self.meta = {key: value for key, value in data.items() if key not in ("llm", "tools")}
+        self.llm = data.get("llm", [])
+        self.tools = data.get("tools", [])
+        self._lock = threading.Lock()
+        self.reset()
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), path=path)
+
+    def save(self, path=None):
+        path = path or self.path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(dict(self.meta, llm=self.llm, tools=self.tools), f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+    def reset(self):
+        """Remet toutes les entrées à l'état "non utilisée" (nouveau rejeu)."""
+        self._used_llm = set()
+        self._used_tools = set()
+
+    def record_llm(self, entry):
+        with self._lock:
+            self.llm.append(entry)
+
+    def record_tool(self, entry):
+        with self._lock:
+            self.tools.append(entry)
+
+    def next_llm(self, key, stage):
+        """Entrée LLM correspondant à une requête (hash, puis étape, puis ordre)."""
+        with self._lock:
+            candidates = [i for i in range(len(self.llm)) if i not in self._used_llm]
+            for match in (
+                lambda entry: entry.get("key") == key,
+                lambda entry: entry.get("stage") == stage,
+                lambda entry: True,
+            ):
+                for i in candidates:
+                    if match(self.llm[i]):
+                        self._used_llm.add(i)
+                        return self.llm[i]
+        raise ReplayMiss(f"Aucune réponse enregistrée pour l'étape {stage}")
+
+    def next_tool(self, name, arguments):
+        """Entrée d'outil correspondant à un appel (arguments identiques, puis ordre)."""
+        with self._lock:
+            candidates = [
+                i for i in range(len(self.tools))
+                if i not in self._used_tools and self.tools[i]["name"] == name
+            ]
+            for i in candidates:
+                if self.tools[i].get("arguments") == arguments:
+                    self._used_tools.add(i)
+                    return self.tools[i]
+            if candidates:
+                self._used_tools.add(candidates[0])
+                return self.tools[candidates[0]]
+        return None
+
+
+def _response_dict(message):
+    """Message de réponse (objet) → dict stocké dans la fixture."""
+    return {
+        "content": message.content,
+        "tool_calls": [
+            {"id": tc.id, "name": tc.function.name, "arguments": tc.function.arguments}
+            for tc in message.tool_calls or []
+        ]
+    }
+
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    return json.loads(json.dumps(usage, default=_jsonable))
+
+
+class RecordingBackend:
+    """
+    Backend qui transmet au backend réel et enregistre chaque échange.
+    Les requêtes streamées sont enregistrées via un appel non streamé puis
+    resservies en fragments.
+    """
+
+    def __init__(self, inner, fixture):
+        self.inner = inner
+        self.fixture = fixture
+        self.name = inner.name
+
+    def create(self, stream=False, **kwargs):
+        start = time.perf_counter()
+        response = self.inner.create(**kwargs)
+        duration = time.perf_counter() - start
+        message = response.choices[0].message
+        self.fixture.record_llm({
+            "key": completion_cache_key(kwargs),
+            "stage": infer_stage(kwargs),
+            "model": kwargs.get("model"),
+            "response": _response_dict(message),
+            "ttft": duration,
+            "duration": duration,
+            "usage": _usage_dict(getattr(response, "usage", None)),
+        })
+        if stream:
+            return _chunks(_response_dict(message), 0.0, 0.0)
+        return response
+
+
+def _message_object(data):
+    message = {"role": "assistant", "content": data.get("content")}
+    if data.get("tool_calls"):
+        message["tool_calls"] = [
+            {"id": call["id"], "type": "function",
+             "function": {"name": call["name"], "arguments": call["arguments"]}}
+            for call in data["tool_calls"]
+        ]
+    return message
+
+
+def _chunks(data, ttft, generation):
+    """Fragments de streaming d'une réponse, avec TTFT puis génération simulés."""
+    time.sleep(ttft)
+    content = data.get("content") or ""
+    pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+    calls = data.get("tool_calls") or []
+    delay = generation / max(1, len(pieces) + len(calls))
+
+    for piece in pieces:
+        yield _to_object({"choices": [{"index": 0, "delta": {"content": piece}}]})
+        time.sleep(delay)
+    for index, call in enumerate(calls):
+        yield _to_object({"choices": [{"index": 0, "delta": {"tool_calls": [{
+            "index": index, "id": call["id"], "type": "function",
+            "function": {"name": call["name"], "arguments": call["arguments"]}
+        }]}}]})
+        time.sleep(delay)
+
+
+class ReplayBackend:
+    """Backend qui resservit les réponses d'une fixture avec une latence simulée."""
+
+    name = "replay"
+
+    def __init__(self, fixture, latency=None, tokens_per_second=DEFAULT_TOKENS_PER_SECOND):
+        self.fixture = fixture
+        self.latency = latency or LatencyModel()
+        self.tokens_per_second = tokens_per_second
+
+    def _timings(self, entry):
+        """(ttft, durée de génération) simulés pour une entrée."""
+        data = entry["response"]
+        output = (data.get("content") or "") + "".join(call["arguments"] for call in data.get("tool_calls") or [])
+        generation_default = _estimate_tokens(output) / self.tokens_per_second
+        recorded_ttft = entry.get("ttft")
+        recorded_generation = max(0.0, (entry.get("duration") or 0.0) - (recorded_ttft or 0.0)) or generation_default
+        ttft = self.latency.sample(recorded_ttft)
+        if self.latency.kind == "recorded":
+            generation = recorded_generation * self.latency.scale
+        else:
+            generation = generation_default * self.latency.scale
+        return ttft, generation
+
+    def create(self, stream=False, **kwargs):
+        key = completion_cache_key(kwargs)
+        entry = self.fixture.next_llm(key, infer_stage(kwargs))
+        ttft, generation = self._timings(entry)
+        if stream:
+            return _chunks(entry["response"], ttft, generation)
+        time.sleep(ttft + generation)
+        return _to_object({
+            "choices": [{"index": 0, "message": _message_object(entry["response"]), "finish_reason": "stop"}],
+            "usage": entry.get("usage"),
+        })
+
+
+def recording_call_tool(call_tool, fixture):
+    """Enveloppe call_tool pour enregistrer chaque appel dans la fixture."""
+    def wrapper(tool_name, arguments):
+        start = time.perf_counter()
+        result = call_tool(tool_name, arguments)
+        fixture.record_tool({
+            "name": tool_name,
+            "arguments": json.loads(json.dumps(arguments, default=str)),
+            "result": result if isinstance(result, str) else str(result),
+            "duration": time.perf_counter() - start,
+        })
+        return result
+    return wrapper
+
+
+def replay_call_tool(fixture, latency=None):
+    """call_tool de rejeu: résultats enregistrés, aucun effet sur le système."""
+    latency = latency or LatencyModel()
+
+    def wrapper(tool_name, arguments):
+        entry = fixture.next_tool(tool_name, arguments)
+        if entry is None:
+            return f"❌ {tool_name}: aucun résultat enregistré"
+        time.sleep(latency.sample(entry.get("duration")))
+        return entry["result"]
+    return wrapper
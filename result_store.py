@@ -0,0 +1,120 @@
+"""
+Stockage hors conversation des gros résultats d'outils.
+Les résultats volumineux (fichiers, pages web, recherches) sont rangés par hash
+de contenu (en mémoire + sur disque); la conversation ne garde qu'un extrait et
+un handle que le modèle peut relire page par page avec read_stored_result.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from disk_cache import CACHE_DIR
+
+# Au-delà de cette taille (caractères), un résultat est stocké hors conversation
+RESULT_INLINE_LIMIT = int(os.getenv("FREYA_RESULT_INLINE_LIMIT", "1500"))
+
+# Taille de l'extrait gardé dans la conversation
+RESULT_EXCERPT_LENGTH = int(os.getenv("FREYA_RESULT_EXCERPT_LENGTH", "600"))
+
+# Taille d'une page lue avec read_stored_result
+RESULT_PAGE_SIZE = 2000
+
+# Nombre de résultats gardés en mémoire (les autres sont relus depuis le disque)
+MEMORY_ENTRIES = 32
+
+
+class ResultStore:
+    """Stockage adressé par contenu: handle = début du sha256 du texte."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, handle):
+        return os.path.join(self.directory, f"{handle}.txt")
+
+    def put(self, text):
+        """Stocke un texte et retourne son handle."""
+        handle = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            self._memory[handle] = text
+            self._memory.move_to_end(handle)
+            while len(self._memory) > MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+
+        path = self._path(handle)
+        if not os.path.exists(path):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return handle
+
+    def get(self, handle):
+        """Retourne le texte d'un handle, ou None s'il est inconnu."""
+        with self._lock:
+            if handle in self._memory:
+                self._memory.move_to_end(handle)
+                return self._memory[handle]
+
+        if not handle.isalnum():
+            return None
+        path = self._path(handle)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        with self._lock:
+            self._memory[handle] = text
+        return text
+
+    def read(self, handle, offset=0, length=RESULT_PAGE_SIZE):
+        """Retourne une page du résultat stocké, avec la position de la suite."""
+        text = self.get(handle)
+        if text is None:
+            return f"❌ Résultat stocké introuvable: {handle}"
+
+        offset = max(0, int(offset or 0))
+        length = max(1, int(length or RESULT_PAGE_SIZE))
+        page = text[offset:offset + length]
+        end = offset + len(page)
+
+        header = f"📦 {handle} - caractères {offset} à {end} sur {len(text)}"
+        if end < len(text):
+            footer = f"\n\n[... suite avec offset={end}]"
+        else:
+            footer = "\n\n[fin du résultat]"
+        return f"{header}\n\n{page}{footer}"
+
+
+# Instance globale du stockage
+_store = None
+
+def get_result_store():
+    """Retourne le stockage global des résultats."""
+    global _store
+    if _store is None:
+        _store = ResultStore(os.path.join(CACHE_DIR, "results"))
+    return _store
+
+
+def offload_large_result(text, limit=None):
+    """
+    Version à garder dans la conversation d'un résultat d'outil.
+
+    Les résultats courts sont retournés tels quels; les longs sont stockés et
+    remplacés par un extrait suivi du handle.
+    """
+    limit = RESULT_INLINE_LIMIT if limit is None else limit
+    if not isinstance(text, str) or len(text) <= limit:
+        return text
+
+    handle = get_result_store().put(text)
+    excerpt = text[:min(RESULT_EXCERPT_LENGTH, limit)]
+    return (
+        f"{excerpt}\n\n"
+        f"📦 Résultat complet stocké (handle: {handle}, {len(text)} caractères). "
+        f"Utilise read_stored_result avec ce handle et un offset pour lire la suite."
+    )
@@ -0,0 +1,382 @@
+"""
+Moteur de règles statiques du validateur TRM.
+
+Les règles sont décrites par une table de politique déclarative (par outil),
+compilée une seule fois:
+    - chemins protégés → arbre de préfixes (trie) par composants de chemin,
+      insensible à la casse et aux séparateurs (C:\\Windows, c:/windows/, ...)
+    - arguments obligatoires, valeurs interdites, avertissements par valeur
+    - extensions protégées contre l'écrasement
+
+Les accès au système de fichiers (existence, dossier) sont mémorisés par
+plan: chaque chemin n'est consulté qu'une fois (un seul os.stat), et
+seulement si une règle en a besoin.
+
+Configuration:
+    FREYA_RULES_FILE    fichier JSON de politique, fusionné avec la politique par défaut
+                        (python rules_engine.py --dump-policy pour un point de départ)
+
+Benchmark (10 000 étapes): python rules_engine.py
+"""
+
+import copy
+import json
+import ntpath
+import os
+import posixpath
+import re
+import stat
+import sys
+import threading
+import time
+
+# Politique par défaut (même comportement que les règles historiques)
+DEFAULT_POLICY = {
+    # Chemins système: toute action sur ces chemins ou leurs sous-chemins est bloquée
+    "protected_paths": [
+        "C:\\Windows",
+        "C:\\Program Files",
+        "C:\\Program Files (x86)",
+        "C:\\Users\\Default",
+        "C:\\System32",
+    ],
+    # Fragments de chemin qui déclenchent un avertissement
+    "sensitive_markers": ["WINDOWS", "SYSTEM32"],
+    # Arguments contenant un chemin
+    "path_args": ["path", "filename", "target_path"],
+    "tools": {
+        "delete_path": {
+            "required": ["path"],
+            "forbidden_values": {"path": [".", "/", "\\", "C:\\", "D:\\"]},
+            "forbidden_message": "🚫 BLOQUÉ: Tentative de suppression de la racine",
+            "warn_if_directory": "path",
+        },
+        "write_file": {
+            "required": ["filename", "content"],
+            "no_overwrite": {
+                "arg": "filename",
+                "extensions": [".py", ".js", ".ts", ".java", ".cpp", ".c", ".h", ".cs", ".go", ".rs", ".rb", ".php"],
+            },
+        },
+        "read_file": {"required": ["filename"]},
+        "create_folder": {"required": ["path"]},
+        # search_text peut être vide pour append
+        "modify_file": {"required": ["filename", "replacement_text"]},
+        "git_push": {
+            "warn_values": {"branch": {"main": "⚠️ Push sur la branche main"}},
+            "defaults": {"branch": "main"},
+        },
+    },
+}
+
+_DRIVE_RE = re.compile(r"^[A-Za-z]:$")
+
+
+def path_components(path):
+    """
+    Composants normalisés d'un chemin, pour Windows comme pour POSIX:
+    séparateurs \\ et / équivalents, casse ignorée, "." et ".." résolus.
+    "C:\\Windows\\" et "c:/windows" donnent ("c:", "windows").
+
+    Le lecteur (ou la racine) est séparé avant la normalisation: ".." s'arrête
+    à la racine, comme pour ntpath ("C:\\..\\Windows" → ("c:", "windows")).
+    """
+    text = path.replace("\\", "/")
+    drive, rest = ntpath.splitdrive(text)
+    if drive or rest.startswith("/"):
+        # Chemin absolu (ou relatif au lecteur, traité comme absolu): normalisé depuis la racine
+        normalized = posixpath.normpath("/" + rest)
+    else:
+        normalized = posixpath.normpath(rest) if rest else ""
+    parts = [part.casefold() for part in normalized.split("/") if part and part != "."]
+    if drive:
+        parts.insert(0, drive.casefold())
+    elif text.startswith("/") and not (parts and _DRIVE_RE.match(parts[0])):
+        parts.insert(0, "/")
+    return tuple(parts)
+
+
+class PathTrie:
+    """Arbre de préfixes des chemins protégés, par composants de chemin."""
+
+    __slots__ = ("root",)
+
+    _LABEL = object()  # Clé du chemin protégé d'origine dans un nœud terminal
+
+    def __init__(self, paths=()):
+        self.root = {}
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        node = self.root
+        for part in path_components(path):
+            node = node.setdefault(part, {})
+        node.setdefault(self._LABEL, path)
+
+    def match(self, path):
+        """Chemin protégé qui contient path (ou path lui-même), None sinon."""
+        node = self.root
+        for part in path_components(path):
+            node = node.get(part)
+            if node is None:
+                return None
+            label = node.get(self._LABEL)
+            if label is not None:
+                return label
+        return None
+
+
+class FileSystemProbe:
+    """
+    Accès au système de fichiers mémorisés pendant la validation d'un plan:
+    un seul os.stat par chemin, même s'il apparaît dans plusieurs étapes.
+    """
+
+    __slots__ = ("_stats",)
+
+    def __init__(self):
+        self._stats = {}  # chemin -> (existe, est un dossier)
+
+    def _stat(self, path):
+        entry = self._stats.get(path)
+        if entry is None:
+            try:
+                mode = os.stat(path).st_mode
+                entry = (True, stat.S_ISDIR(mode))
+            except (OSError, ValueError):
+                entry = (False, False)
+            self._stats[path] = entry
+        return entry
+
+    def exists(self, path):
+        return self._stat(path)[0]
+
+    def isdir(self, path):
+        return self._stat(path)[1]
+
+
+class _ToolRules:
+    """Règles compilées d'un outil."""
+
+    __slots__ = ("required", "forbidden", "forbidden_message", "warn_if_directory",
+                 "no_overwrite_arg", "no_overwrite_extensions", "warn_values", "defaults")
+
+    def __init__(self, spec):
+        self.required = tuple(spec.get("required", ()))
+        self.forbidden = {arg: frozenset(values) for arg, values in spec.get("forbidden_values", {}).items()}
+        self.forbidden_message = spec.get("forbidden_message", "🚫 BLOQUÉ: Valeur interdite")
+        self.warn_if_directory = spec.get("warn_if_directory")
+        no_overwrite = spec.get("no_overwrite") or {}
+        self.no_overwrite_arg = no_overwrite.get("arg")
+        self.no_overwrite_extensions = tuple(no_overwrite.get("extensions", ()))
+        self.warn_values = spec.get("warn_values", {})
+        self.defaults = spec.get("defaults", {})
+
+
+class RulesEngine:
+    """Politique compilée: validation d'un appel ou d'un plan complet."""
+
+    # Nombre max de chemins dont l'analyse est mémorisée
+    PATH_CACHE_SIZE = 4096
+
+    def __init__(self, policy=None):
+        self.policy = policy or DEFAULT_POLICY
+        self.path_args = tuple(self.policy.get("path_args", ()))
+        self.protected = PathTrie(self.policy.get("protected_paths", ()))
+        markers = self.policy.get("sensitive_markers", ())
+        self.sensitive = re.compile("|".join(re.escape(m.casefold()) for m in markers)) if markers else None
+        self.tools = {name: _ToolRules(spec) for name, spec in self.policy.get("tools", {}).items()}
+        self._paths = {}  # chemin -> (chemin protégé correspondant ou None, chemin sensible)
+
+    def _path_info(self, path):
+        """Analyse d'un chemin (mémorisée: les mêmes chemins reviennent d'un plan à l'autre)."""
+        info = self._paths.get(path)
+        if info is None:
+            sensitive = self.sensitive is not None and self.sensitive.search("/".join(path_components(path))) is not None
+            info = (self.protected.match(path), sensitive)
+            if len(self._paths) >= self.PATH_CACHE_SIZE:
+                self._paths.clear()
+            self._paths[path] = info
+        return info
+
+    def check(self, tool_name: str, arguments: dict, probe=None) -> dict:
+        """
+        Validation d'un appel d'outil par règles statiques.
+
+        Returns:
+            {"approved": bool, "reason": str, "warnings": list[str]}
+        """
+        result = {"approved": True, "reason": "", "warnings": []}
+
+        # Chemins protégés
+        for arg in self.path_args:
+            path = arguments.get(arg)
+            if isinstance(path, str):
+                protected, sensitive = self._path_info(path)
+                if protected is not None:
+                    result["approved"] = False
+                    result["reason"] = f"🚫 BLOQUÉ: Chemin système protégé ({protected})"
+                    return result
+                if sensitive:
+                    result["warnings"].append(f"⚠️ Attention: chemin sensible détecté ({path})")
+
+        rules = self.tools.get(tool_name)
+        if rules is None:
+            return result
+        if probe is None and (rules.warn_if_directory or rules.no_overwrite_arg):
+            probe = FileSystemProbe()
+
+        # Valeurs interdites (ex: suppression de la racine)
+        for arg, values in rules.forbidden.items():
+            if arguments.get(arg, "") in values:
+                result["approved"] = False
+                result["reason"] = rules.forbidden_message
+                return result
+
+        if rules.warn_if_directory:
+            path = arguments.get(rules.warn_if_directory, "")
+            if isinstance(path, str) and path and probe.isdir(path):
+                result["warnings"].append(f"⚠️ Suppression d'un dossier: {path}")
+
+        # Fichiers de code existants: pas d'écrasement (DANGEREUX)
+        if rules.no_overwrite_arg:
+            filename = arguments.get(rules.no_overwrite_arg, "")
+            if isinstance(filename, str) and filename.endswith(rules.no_overwrite_extensions) and probe.exists(filename):
+                result["approved"] = False
+                result["reason"] = f"🚫 BLOQUÉ: write_file sur fichier de code existant '{filename}'. Utilise modify_file avec action='append' pour ajouter du code!"
+                return result
+
+        for arg, warnings in rules.warn_values.items():
+            message = warnings.get(arguments.get(arg, rules.defaults.get(arg)))
+            if message:
+                result["warnings"].append(message)
+
+        # Arguments requis
+        for req in rules.required:
+            if not arguments.get(req):
+                result["approved"] = False
+                result["reason"] = f"🚫 Argument manquant: {req}"
+                return result
+
+        return result
+
+    def check_plan(self, steps) -> list:
+        """
+        Valide toutes les étapes d'un plan, avec un accès disque par chemin au plus.
+
+        Returns:
+            liste des résultats de check(), dans l'ordre des étapes
+        """
+        probe = FileSystemProbe()
+        return [self.check(step.get("action", ""), step.get("args") or {}, probe) for step in steps]
+
+
+def merge_policy(base, override):
+    """Politique par défaut complétée/remplacée par celle d'un fichier (fusion par outil)."""
+    policy = copy.deepcopy(base)
+    for key, value in override.items():
+        if key == "tools":
+            for tool, spec in value.items():
+                policy["tools"][tool] = dict(policy["tools"].get(tool, {}), **spec)
+        else:
+            policy[key] = value
+    return policy
+
+
+def load_policy(path=None):
+    """Politique par défaut, fusionnée avec le fichier FREYA_RULES_FILE s'il est défini."""
+    path = path or os.getenv("FREYA_RULES_FILE")
+    if not path:
+        return DEFAULT_POLICY
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return merge_policy(DEFAULT_POLICY, json.load(f))
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Politique de règles illisible ({path}): {e} - politique par défaut utilisée")
+        return DEFAULT_POLICY
+
+
+# Instance globale du moteur de règles
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_rules_engine():
+    """Retourne le moteur de règles global (politique compilée une fois)."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = RulesEngine(load_policy())
+    return _engine
+
+
+def _benchmark(count=10000):
+    """Validation de count étapes de plan: appel par appel puis par plan (accès disque mémorisés)."""
+    import random
+
+    rng = random.Random(0)
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples = [
+        ("list_files", {"path": here}),
+        ("read_file", {"filename": os.path.join(here, "agent.py")}),
+        ("write_file", {"filename": os.path.join(here, "agent.py"), "content": "x"}),
+        ("write_file", {"filename": "notes.txt", "content": "x"}),
+        ("delete_path", {"path": "C:\\Windows\\System32"}),
+        ("delete_path", {"path": "c:/program files/app"}),
+        ("delete_path", {"path": here}),
+        ("delete_path", {"path": "/"}),
+        ("modify_file", {"filename": "README.md", "search_text": "a", "replacement_text": "b"}),
+        ("git_push", {"branch": "main"}),
+        ("create_folder", {"path": ""}),
+        ("search_web", {"query": "python"}),
+    ]
+    steps = [{"action": action, "args": args} for action, args in (rng.choice(samples) for _ in range(count))]
+    plans = [steps[i:i + 8] for i in range(0, count, 8)]
+    engine = RulesEngine(load_policy())
+
+    print("=" * 50)
+    print(f"⏱️  Moteur de règles: {count} étapes de plan")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    for step in steps:
+        engine.check(step["action"], step["args"])
+    per_call = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [result for plan in plans for result in engine.check_plan(plan)]
+    per_plan = time.perf_counter() - start
+
+    blocked = sum(not result["approved"] for result in results)
+    print(f"Appel par appel:   {per_call * 1000:8.1f} ms ({per_call / count * 1e6:.1f} µs/étape)")
+    print(f"Par plan:          {per_plan * 1000:8.1f} ms ({per_plan / count * 1e6:.1f} µs/étape)")
+    print(f"{blocked} étapes bloquées sur {count}")
+
+
+def _self_test():
+    """Chemins protégés: variantes d'écriture et tentatives de contournement."""
+    engine = RulesEngine(load_policy())
+    cases = [
+        ("C:\\Windows\\System32", False),
+        ("c:/windows/", False),
+        ("C:\\..\\Windows\\System32", False),
+        ("C:/../../Windows", False),
+        ("C:\\Temp\\..\\Program Files\\app", False),
+        ("C:\\Windows2\\notes", True),
+        ("D:\\Windows\\notes", True),
+    ]
+    failures = 0
+    for path, expected in cases:
+        approved = engine.check("delete_path", {"path": path})["approved"]
+        failures += approved != expected
+        print(f"{'✅' if approved == expected else '❌'} delete_path {path!r}: {'approuvé' if approved else 'bloqué'}")
+    return failures
+
+
+if __name__ == "__main__":
+    if "--dump-policy" in sys.argv:
+        print(json.dumps(DEFAULT_POLICY, indent=2, ensure_ascii=False))
+    else:
+        if _self_test():
+            sys.exit(1)
+        _benchmark()
@@ -0,0 +1,125 @@
+"""
+Mesure du démarrage de FREYA.
+
+    - profil des imports (python -X importtime): modules les plus coûteux
+    - temps jusqu'à l'invite: lancement de main.py jusqu'à l'affichage de "Vous: "
+
+Configuration:
+    FREYA_STARTUP_BUDGET_MS    budget du temps jusqu'à l'invite (défaut 200 ms)
+
+Utilisation:
+    python main.py --startup-profile
+    python benchmark.py --startup
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PROMPT = b"Vous: "
+
+
+def startup_budget_ms():
+    """Budget du temps jusqu'à l'invite (millisecondes)."""
+    return float(os.getenv("FREYA_STARTUP_BUDGET_MS", "200"))
+
+
+def import_profile(module="main"):
+    """
+    Importe un module dans un sous-processus avec -X importtime.
+
+    Returns:
+        liste de {"module", "self_ms", "cumulative_ms", "depth"}, dans l'ordre de la sortie
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"Import de {module} impossible")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+        })
+    return entries
+
+
+def print_import_profile(module="main", top=15):
+    """Affiche le total et les imports les plus coûteux (temps cumulé)."""
+    entries = import_profile(module)
+    total = sum(entry["self_ms"] for entry in entries)
+    print(f"⏱️  Imports de {module}: {total:.1f} ms ({len(entries)} modules)\n")
+    print(f"{'Module':<40} {'cumulé (ms)':>12} {'propre (ms)':>12}")
+    print("-" * 66)
+    for entry in sorted(entries, key=lambda e: e["cumulative_ms"], reverse=True)[:top]:
+        name = "  " * entry["depth"] + entry["module"]
+        print(f"{name:<40} {entry['cumulative_ms']:>12.1f} {entry['self_ms']:>12.1f}")
+    return entries
+
+
+def time_to_prompt(timeout=30.0):
+    """
+    Lance main.py et mesure le temps jusqu'à l'affichage de l'invite "Vous: ",
+    puis le quitte avec "exit".
+
+    Returns:
+        durée en secondes
+    """
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "main.py")],
+        cwd=ROOT, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    output = b""
+    try:
+        while PROMPT not in output:
+            data = os.read(process.stdout.fileno(), 4096)
+            if not data:
+                raise RuntimeError(f"main.py s'est arrêté avant l'invite: {output.decode('utf-8', 'replace')[-200:]}")
+            output += data
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"Invite non affichée après {timeout:.0f} s")
+        elapsed = time.perf_counter() - start
+        process.communicate(b"exit\n", timeout=timeout)
+        return elapsed
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def run_startup_benchmark(runs=5):
+    """
+    Mesure le temps jusqu'à l'invite (médiane et max sur runs lancements) et le
+    compare au budget.
+
+    Returns:
+        0 si la médiane respecte le budget, 1 sinon
+    """
+    budget = startup_budget_ms()
+    time_to_prompt()  # Lancement à froid non mesuré (cache des fichiers .pyc)
+    samples = sorted(time_to_prompt() * 1000 for _ in range(runs))
+    median = samples[len(samples) // 2]
+    print(f"🚀 Temps jusqu'à l'invite ({runs} lancements): médiane {median:.0f} ms, "
+          f"min {samples[0]:.0f} ms, max {samples[-1]:.0f} ms (budget {budget:.0f} ms)")
+    if median > budget:
+        print(f"❌ Budget de démarrage dépassé de {median - budget:.0f} ms (voir python main.py --startup-profile)")
+        return 1
+    print("✅ Budget de démarrage respecté")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_startup_benchmark())
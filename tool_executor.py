@@ -0,0 +1,274 @@
+"""
+Exécution concurrente des appels d'outils et des plans.
+Les appels indépendants tournent en parallèle dans un pool de threads,
+les appels qui touchent le même chemin restent séquentiels (dans l'ordre d'origine).
+"""
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from tracing import get_tracer
+
+# Nombre maximum d'outils exécutés en parallèle
+MAX_TOOL_WORKERS = int(os.getenv("FREYA_TOOL_CONCURRENCY", "4"))
+
+# Outils sans effet de bord (lecture seule)
+READ_ONLY_TOOLS = {
+    "list_files", "read_file", "search_files", "get_pc_config", "git_list_branches",
+    "search_web", "fetch_webpage", "search_and_summarize", "read_stored_result",
+}
+
+# Clés de ressources qui ne sont pas des chemins
+GIT_RESOURCE = "<git>"
+PIP_RESOURCE = "<pip>"
+ALL_RESOURCES = "<*>"  # Outil inconnu: conflit avec tout
+
+# Référence au résultat d'une étape précédente dans les arguments d'un plan
+STEP_REF = re.compile(r"\{\{\s*step_(\d+)\s*\}\}")
+
+
+def _norm(path):
+    """Normalise un chemin pour comparer les ressources."""
+    return os.path.normcase(os.path.abspath(path or "."))
+
+
+def tool_resources(tool_name, args):
+    """
+    Retourne les ressources lues et écrites par un appel d'outil.
+
+    Returns:
+        (reads, writes) - deux sets de chemins normalisés ou de clés spéciales
+    """
+    reads, writes = set(), set()
+
+    if tool_name in ("list_files", "search_files"):
+        reads.add(_norm(args.get("path")))
+    elif tool_name == "read_file":
+        reads.add(_norm(args.get("filename")))
+    elif tool_name == "print_file":
+        reads.add(_norm(args.get("file_path")))
+    elif tool_name in ("write_file", "modify_file"):
+        writes.add(_norm(args.get("filename")))
+    elif tool_name in ("delete_path", "create_folder"):
+        writes.add(_norm(args.get("path")))
+    elif tool_name == "git_clone":
+        repo_name = (args.get("repo_url") or "").rstrip("/").split("/")[-1]
+        if repo_name.endswith(".git"):
+            repo_name = repo_name[:-4]
+        writes.add(_norm(args.get("target_path") or repo_name))
+    elif tool_name == "git_list_branches":
+        reads.update({GIT_RESOURCE, _norm(".")})
+    elif tool_name in ("git_push", "git_workflow", "git_create_branch", "git_checkout_branch"):
+        # git add/checkout touchent tout le dossier courant
+        writes.update({GIT_RESOURCE, _norm(".")})
+    elif tool_name == "install_python_package":
+        writes.add(PIP_RESOURCE)
+    elif tool_name in READ_ONLY_TOOLS or tool_name in ("open_browser", "launch_application"):
+        pass
+    else:
+        writes.add(ALL_RESOURCES)
+
+    return reads, writes
+
+
+def _overlap(a, b):
+    """Deux ressources se recouvrent si identiques ou si l'une contient l'autre."""
+    if a == b or ALL_RESOURCES in (a, b):
+        return True
+    if a.startswith("<") or b.startswith("<"):
+        return False
+    return b.startswith(a.rstrip(os.sep) + os.sep) or a.startswith(b.rstrip(os.sep) + os.sep)
+
+
+def conflicts(res_a, res_b):
+    """Vrai si deux appels ne peuvent pas tourner en même temps (au moins une écriture commune)."""
+    reads_a, writes_a = res_a
+    reads_b, writes_b = res_b
+    return (
+        any(_overlap(w, r) for w in writes_a for r in reads_b | writes_b)
+        or any(_overlap(w, r) for w in writes_b for r in reads_a)
+    )
+
+
+def _safe_call(call_tool, tool_name, args):
+    try:
+        return call_tool(tool_name, args)
+    except Exception as e:
+        return f"❌ {tool_name}: Erreur - {e}"
+
+
+def run_tool_calls(calls, call_tool, max_workers=None):
+    """
+    Exécute une liste d'appels d'outils en parallèle quand c'est possible.
+
+    Les appels en conflit (même chemin, dépôt git, pip) sont regroupés dans une
+    même file exécutée séquentiellement dans l'ordre d'origine.
+
+    Args:
+        calls: [(tool_name, args), ...]
+        call_tool: fonction call_tool(tool_name, args) -> str
+        max_workers: limite de concurrence (défaut: FREYA_TOOL_CONCURRENCY)
+
+    Returns:
+        Liste des résultats dans le même ordre que calls
+    """
+    if len(calls) <= 1:
+        return [_safe_call(call_tool, name, args) for name, args in calls]
+
+    # Regrouper les appels en conflit (union-find)
+    resources = [tool_resources(name, args) for name, args in calls]
+    parent = list(range(len(calls)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(calls)):
+        for j in range(i):
+            if conflicts(resources[i], resources[j]):
+                parent[find(i)] = find(j)
+
+    lanes = {}
+    for i in range(len(calls)):
+        lanes.setdefault(find(i), []).append(i)
+
+    results = [None] * len(calls)
+
+    def run_lane(indexes):
+        for i in indexes:
+            name, args = calls[i]
+            results[i] = _safe_call(call_tool, name, args)
+
+    if len(lanes) == 1:
+        run_lane(range(len(calls)))
+        return results
+
+    workers = min(max_workers or MAX_TOOL_WORKERS, len(lanes))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        run_lane = get_tracer().propagate(run_lane)  # Spans des outils rattachés au tour
+        for future in [pool.submit(run_lane, indexes) for indexes in lanes.values()]:
+            future.result()
+
+    return results
+
+
+def _step_refs(value):
+    """Numéros d'étapes (1-based) référencés par {{step_N}} dans une valeur d'argument."""
+    if isinstance(value, str):
+        return {int(n) for n in STEP_REF.findall(value)}
+    if isinstance(value, dict):
+        return set().union(*[_step_refs(v) for v in value.values()]) if value else set()
+    if isinstance(value, list):
+        return set().union(*[_step_refs(v) for v in value]) if value else set()
+    return set()
+
+
+def resolve_step_refs(value, step_results):
+    """Remplace les {{step_N}} par le résultat de l'étape N (step_results: {index 0-based: str})."""
+    if isinstance(value, str):
+        return STEP_REF.sub(lambda m: step_results.get(int(m.group(1)) - 1, ""), value)
+    if isinstance(value, dict):
+        return {k: resolve_step_refs(v, step_results) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve_step_refs(v, step_results) for v in value]
+    return value
+
+
+def plan_dependencies(steps):
+    """
+    Construit le DAG d'un plan.
+
+    Une étape dépend d'une étape précédente si:
+    - elle la cite dans "depends_on" (numéros 1-based)
+    - elle référence son résultat avec {{step_N}}
+    - leurs ressources sont en conflit (chemins lus/écrits, git, pip)
+
+    Returns:
+        Liste de sets: deps[i] = indices (0-based) des étapes à terminer avant l'étape i
+    """
+    resources = []
+    deps = []
+    for i, step in enumerate(steps):
+        args = step.get("args") or {}
+        if not isinstance(args, dict):
+            args = {}
+        resources.append(tool_resources(step.get("action", ""), args))
+
+        explicit = step.get("depends_on") or []
+        if not isinstance(explicit, list):
+            explicit = [explicit]
+        refs = {n - 1 for n in _step_refs(args)}
+        refs.update(n - 1 for n in explicit if isinstance(n, int))
+
+        step_deps = {j for j in refs if 0 <= j < i}
+        step_deps.update(j for j in range(i) if conflicts(resources[i], resources[j]))
+        deps.append(step_deps)
+
+    return deps
+
+
+def step_failed(result):
+    """Vrai si le résultat d'une étape signale un échec (convention "❌ ...")."""
+    return isinstance(result, str) and result.lstrip().startswith("❌")
+
+
+def run_plan_steps(steps, run_step, max_workers=None, failed=step_failed):
+    """
+    Exécute les étapes d'un plan en respectant leurs dépendances.
+
+    Les étapes indépendantes tournent en parallèle; chaque étape démarre dès
+    que toutes ses dépendances sont terminées. Une étape dont une dépendance a
+    échoué (ou a été bloquée) n'est pas exécutée, ni ses propres dépendantes.
+
+    Args:
+        steps: liste des étapes du plan ({"action", "args", ...})
+        run_step: fonction run_step(index, step) -> str
+        max_workers: limite de concurrence (défaut: FREYA_TOOL_CONCURRENCY)
+        failed: fonction failed(résultat) -> bool (défaut: résultat commençant par "❌")
+
+    Returns:
+        Liste des résultats dans l'ordre d'origine des étapes
+    """
+    deps = plan_dependencies(steps)
+    results = [None] * len(steps)
+    failures = set()  # Étapes en échec, bloquées ou non exécutées
+
+    def safe_run(i):
+        try:
+            return run_step(i, steps[i])
+        except Exception as e:
+            return f"❌ {steps[i].get('action', '')}: Erreur - {e}"
+
+    pending = set(range(len(steps)))
+    done = set()
+    running = {}
+    safe_run = get_tracer().propagate(safe_run)  # Spans des étapes rattachés au tour
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers or MAX_TOOL_WORKERS)) as pool:
+        while pending or running:
+            for i in sorted(pending):
+                if deps[i] <= done:
+                    pending.discard(i)
+                    failed_deps = sorted(deps[i] & failures)
+                    if failed_deps:
+                        results[i] = (f"⏭️ Étape {i + 1} non exécutée "
+                                      f"(dépendance {', '.join(str(j + 1) for j in failed_deps)} en échec)")
+                        failures.add(i)
+                        done.add(i)
+                        continue
+                    running[pool.submit(safe_run, i)] = i
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = running.pop(future)
+                results[i] = future.result()
+                if failed(results[i]):
+                    failures.add(i)
+                done.add(i)
+
+    return results
@@ -0,0 +1,141 @@
+"""
+Sélection des définitions d'outils à envoyer au modèle pour chaque requête.
+Au lieu d'envoyer les ~20 schémas de TOOL_DEFS à chaque appel, on n'envoie que
+les groupes d'outils correspondant aux intentions détectées par le routeur,
+plus les outils déjà utilisés dans la conversation.
+"""
+
+import json
+import os
+
+# Groupes d'outils par intention
+TOOL_GROUPS = {
+    "files": ["list_files", "read_file", "write_file", "modify_file", "delete_path", "create_folder", "search_files"],
+    "git": ["git_push", "git_workflow", "git_create_branch", "git_checkout_branch", "git_list_branches", "git_clone"],
+    "web": ["search_web", "fetch_webpage", "search_and_summarize", "open_browser"],
+    "system": ["get_pc_config", "install_python_package", "launch_application", "open_browser"],
+    "printing": ["print_file", "list_files"],
+}
+
+# Intention du routeur -> groupes d'outils
+INTENT_GROUPS = {
+    "files": ["files"],
+    "specific_context": ["files"],
+    "listing": ["files"],
+    "git": ["git"],
+    "web_search": ["web"],
+    "web": ["web"],
+    "printing": ["printing"],
+    "system": ["system"],
+}
+
+# Marque laissée dans la mémoire par le stockage des gros résultats
+STORED_RESULT_MARK = "📦 Résultat complet stocké (handle:"
+
+
+def tools_in_memory(memory):
+    """Noms des outils déjà utilisés dans la conversation."""
+    names = set()
+    for msg in memory:
+        if not isinstance(msg, dict):
+            continue
+        for tc in msg.get("tool_calls") or []:
+            names.add(tc["function"]["name"])
+        if msg.get("role") == "tool" and msg.get("name"):
+            names.add(msg["name"])
+        if STORED_RESULT_MARK in (msg.get("content") or ""):
+            names.add("read_stored_result")
+    return names
+
+
+class ToolSelector:
+    """Choisit et mémorise les sous-ensembles de TOOL_DEFS envoyés au modèle."""
+
+    def __init__(self, tool_defs, enabled=None):
+        if enabled is None:
+            enabled = os.getenv("FREYA_TOOL_PRUNING", "1") != "0"
+        self.enabled = enabled
+        self.tool_defs = tool_defs
+        self._order = [tool["function"]["name"] for tool in tool_defs]
+        self._by_name = {tool["function"]["name"]: tool for tool in tool_defs}
+        self._subsets = {}  # frozenset(noms) -> liste construite une seule fois
+        self._tokens = None  # Coût en tokens de chaque schéma (calculé à la demande)
+
+    def select_names(self, intents, memory=()):
+        """Noms des outils pertinents (None = aucun groupe reconnu, tout envoyer)."""
+        names = set()
+        for intent, groups in INTENT_GROUPS.items():
+            if intents.get(intent):
+                for group in groups:
+                    names.update(TOOL_GROUPS[group])
+        if not names:
+            return None
+        names.update(tools_in_memory(memory))
+        return frozenset(name for name in names if name in self._by_name)
+
+    def select(self, intents, memory=()):
+        """
+        Retourne la liste des définitions d'outils à envoyer pour cette requête.
+
+        Les sous-ensembles sont construits une seule fois puis réutilisés tels
+        quels (mêmes objets) pour toutes les requêtes de la même classe.
+        """
+        if not self.enabled:
+            return self.tool_defs
+        names = self.select_names(intents, memory)
+        if names is None:
+            return self.tool_defs
+
+        subset = self._subsets.get(names)
+        if subset is None:
+            subset = [self._by_name[name] for name in self._order if name in names]
+            self._subsets[names] = subset
+        return subset
+
+    def tool_tokens(self, tools):
+        """Nombre de tokens des schémas d'outils (sérialisés une seule fois)."""
+        if self._tokens is None:
+            from memory_manager import count_tokens
+            self._tokens = {
+                name: count_tokens(json.dumps(tool, ensure_ascii=False, separators=(",", ":")))
+                for name, tool in self._by_name.items()
+            }
+        return sum(self._tokens[tool["function"]["name"]] for tool in tools)
+
+
+# Rapport: tokens économisés par classe de requête
+if __name__ == "__main__":
+    from agent import TOOL_DEFS
+    from intent_router import route
+
+    print("=" * 50)
+    print("📊 Tokens de définitions d'outils par classe de requête")
+    print("=" * 50)
+
+    request_classes = {
+        "Listing": ["liste le bureau", "montre mes documents", "affiche le contenu du dossier src"],
+        "Fichiers": ["crée un fichier notes.txt avec bonjour", "modifie main.py et remplace a par b", "supprime test.txt"],
+        "Git": ["fais un git push avec le message 'fix'", "liste les branches", "crée une branche develop"],
+        "Web": ["recherche napoléon sur internet", "récupère le contenu de github.com"],
+        "Système": ["quelle est la config du pc", "installe requests avec pip", "lance notepad"],
+        "Impression": ["imprime requirements.txt"],
+        "Multi-étapes": ["recherche napoléon et écris un rapport dans rapport.txt"],
+        "Conversation": ["salut, comment vas-tu ?"],
+    }
+
+    selector = ToolSelector(TOOL_DEFS, enabled=True)
+    full = selector.tool_tokens(TOOL_DEFS)
+    print(f"\nTOOL_DEFS complet: {len(TOOL_DEFS)} outils, {full} tokens\n")
+    print(f"{'Classe':<14} {'Outils':>7} {'Tokens':>8} {'Économisés':>11}")
+
+    for name, requests in request_classes.items():
+        counts = []
+        tokens = []
+        for request in requests:
+            tools = selector.select(route(request.lower()))
+            counts.append(len(tools))
+            tokens.append(selector.tool_tokens(tools))
+        avg_tools = sum(counts) / len(counts)
+        avg_tokens = sum(tokens) / len(tokens)
+        saved = full - avg_tokens
+        print(f"{name:<14} {avg_tools:>7.1f} {avg_tokens:>8.0f} {saved:>6.0f} ({saved / full:.0%})")
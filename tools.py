@@ -2,8 +2,6 @@ import os
 import shutil
 import webbrowser
 import subprocess
-import requests
-import trafilatura
 from urllib.parse import urljoin
 
 def list_files(path="."):
@@ -722,6 +720,7 @@ def search_web(query, num_results=5):
 
 def fetch_webpage(url):
     """Récupère et extrait le contenu textuel d'une page web avec Trafilatura."""
+    import requests  # Importé au premier usage (démarrage plus rapide)
     try:
         import trafilatura
         
@@ -814,6 +813,14 @@ def search_and_summarize(query):
     except Exception as e:
         return f"❌ Erreur lors de la recherche et résumé: {e}"
 
+def read_stored_result(handle, offset=0, length=2000):
+    """Lit une page d'un gros résultat d'outil stocké hors conversation."""
+    try:
+        from result_store import get_result_store
+        return get_result_store().read(handle, offset, length)
+    except Exception as e:
+        return f"❌ Erreur lors de la lecture du résultat stocké: {e}"
+
 
 def monitor_network_traffic(interface: str = 'eth0', duration: int = 10) -> str:
     """Surveille le trafic réseau sur l'interface spécifiée pendant une durée donnée.
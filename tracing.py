@@ -0,0 +1,278 @@
+"""
+Traçage structuré par spans.
+
+Chaque tour respond() ouvre un span racine; le routage, la planification, la
+validation, chaque appel d'outil et chaque appel au modèle y ouvrent des spans
+enfants. À la fin du span racine, la trace est exportée:
+    - en JSONL (un span par ligne) dans spans.jsonl
+    - au format Chrome trace-event (trace-<date>-<id>.json), à ouvrir dans
+      chrome://tracing, https://ui.perfetto.dev ou speedscope
+
+Configuration:
+    FREYA_TRACE=1        active le traçage (désactivé par défaut)
+    FREYA_TRACE_DIR      dossier des traces (défaut .freya_cache/traces)
+
+Désactivé, span() retourne un span vide partagé: le coût se limite à un test.
+"""
+
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+
+from disk_cache import CACHE_DIR
+
+TRACE_DIR = os.getenv("FREYA_TRACE_DIR", os.path.join(CACHE_DIR, "traces"))
+
+_ids = itertools.count(1)
+
+
+class _NoopSpan:
+    """Span utilisé quand le traçage est désactivé."""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """Intervalle de temps nommé, avec attributs et span parent."""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "attributes",
+                 "start", "end", "wall_start", "thread_id", "thread_name")
+
+    def __init__(self, tracer, name, parent, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = next(_ids)
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else f"{os.getpid():x}-{self.span_id:x}-{int(time.time()):x}"
+        self.attributes = attributes
+        self.start = self.end = None
+        self.wall_start = None
+        thread = threading.current_thread()
+        self.thread_id = thread.ident
+        self.thread_name = thread.name
+
+    def set(self, **attributes):
+        """Ajoute des attributs au span (tokens, hit de cache, taille du résultat...)."""
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    def __enter__(self):
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.tracer._push(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        if exc is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer._pop(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "timestamp": self.wall_start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "thread": self.thread_name,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """Crée les spans, suit le span courant de chaque thread et exporte les traces terminées."""
+
+    def __init__(self, enabled=None, directory=None):
+        if enabled is None:
+            enabled = os.getenv("FREYA_TRACE", "0") == "1"
+        self.enabled = enabled
+        self.directory = directory or TRACE_DIR
+        self._local = threading.local()
+        self._traces = {}  # trace_id -> spans terminés
+        self._open_roots = set()  # Traces dont le span racine est en cours
+        self._lock = threading.Lock()
+        self.last_trace = []  # Spans de la dernière trace exportée
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self):
+        """Span courant du thread (None si aucun)."""
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    def span(self, name, **attributes):
+        """Ouvre un span enfant du span courant (à utiliser avec "with")."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, self.current(), attributes)
+
+    def annotate(self, **attributes):
+        """Ajoute des attributs au span courant."""
+        if self.enabled:
+            span = self.current()
+            if span is not None:
+                span.set(**attributes)
+
+    def propagate(self, func):
+        """
+        Enveloppe une fonction exécutée dans un autre thread pour que ses spans
+        soient rattachés au span courant (pools de threads).
+        """
+        if not self.enabled:
+            return func
+        parent = self.current()
+
+        def wrapper(*args, **kwargs):
+            stack = self._stack()
+            stack.append(parent)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stack.pop()
+        return wrapper if parent is not None else func
+
+    def _push(self, span):
+        if span.parent_id is None:
+            with self._lock:
+                self._open_roots.add(span.trace_id)
+        self._stack().append(span)
+
+    def _pop(self, span):
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        with self._lock:
+            if span.trace_id not in self._open_roots:
+                return  # Span terminé après sa racine (tâche abandonnée): ignoré
+            spans = self._traces.setdefault(span.trace_id, [])
+            spans.append(span)
+            if span.parent_id is not None:
+                return
+            del self._traces[span.trace_id]
+            self._open_roots.discard(span.trace_id)
+        self.last_trace = spans
+        self._export(spans)
+
+    def _export(self, spans):
+        """Écrit une trace terminée en JSONL et au format Chrome trace-event."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, "spans.jsonl"), "a", encoding="utf-8") as f:
+                for span in spans:
+                    f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+            root = spans[-1]
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(root.wall_start))
+            path = os.path.join(self.directory, f"trace-{stamp}-{root.span_id}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(chrome_trace(spans), f, ensure_ascii=False, default=str)
+        except OSError as e:
+            print(f"⚠️ Export de la trace impossible: {e}")
+
+
+def chrome_trace(spans):
+    """Trace au format Chrome trace-event (événements complets "X", en µs)."""
+    pid = os.getpid()
+    origin = min(span.start for span in spans)
+    events = []
+    threads = {}
+    for span in spans:
+        threads[span.thread_id] = span.thread_name
+        events.append({
+            "name": span.name,
+            "cat": "freya",
+            "ph": "X",
+            "ts": round((span.start - origin) * 1e6, 3),
+            "dur": round(span.duration * 1e6, 3),
+            "pid": pid,
+            "tid": span.thread_id,
+            "args": dict(span.attributes, span_id=span.span_id, parent_id=span.parent_id),
+        })
+    for tid, name in threads.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+# Instance globale du traceur
+_tracer = None
+
+def get_tracer():
+    """Retourne le traceur global (FREYA_TRACE=1 pour l'activer)."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+
+def traced(name):
+    """Décorateur: exécute la fonction dans un span (rien de plus si le traçage est désactivé)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = get_tracer()
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Coût d'un span désactivé / activé
+if __name__ == "__main__":
+    import tempfile
+
+    iterations = 200000
+    print("=" * 50)
+    print("⏱️  Coût du traçage par span")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        pass
+    baseline = time.perf_counter() - start
+
+    disabled = Tracer(enabled=False)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with disabled.span("test", tool="list_files"):
+            pass
+    disabled_cost = (time.perf_counter() - start - baseline) / iterations
+
+    with tempfile.TemporaryDirectory() as directory:
+        enabled = Tracer(enabled=True, directory=directory)
+        enabled._export = lambda spans: None  # Mesure sans écriture disque
+        start = time.perf_counter()
+        with enabled.span("respond"):
+            for _ in range(iterations):
+                with enabled.span("test", tool="list_files"):
+                    pass
+        enabled_cost = (time.perf_counter() - start - baseline) / iterations
+
+    print(f"Désactivé: {disabled_cost * 1e9:.0f} ns par span")
+    print(f"Activé:    {enabled_cost * 1e9:.0f} ns par span (hors export)")
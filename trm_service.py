@@ -0,0 +1,340 @@
+"""
+Service de validation TRM partagé entre plusieurs processus FREYA.
+
+Le démon possède l'unique instance Llama (fichier GGUF mappé en mémoire) et
+sert validate / validate_plan / status sur une socket Unix (TCP local sous
+Windows). Les requêtes des clients passent par une file traitée par un seul
+thread: le modèle, non thread-safe, n'est jamais appelé en parallèle.
+
+Protocole: une requête JSON par ligne {"method": ..., "params": {...}},
+une réponse JSON par ligne {"result": ...} ou {"error": "..."}.
+
+Configuration:
+    FREYA_TRM_SERVICE            1 = adresse par défaut, ou chemin de socket / hôte:port
+                                 (get_validator() devient alors un client du service)
+    FREYA_TRM_SERVICE_TIMEOUT    timeout d'une requête au service (secondes, défaut 30)
+
+Utilisation:
+    python trm_service.py                 # démarre le service
+    python trm_service.py --status        # état du service en cours
+    FREYA_TRM_SERVICE=1 python main.py
+"""
+
+import argparse
+import json
+import os
+import queue
+import re
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from disk_cache import CACHE_DIR
+from tracing import get_tracer, traced
+from trm_validator import TRMValidator
+
+# Port TCP local utilisé quand les sockets Unix ne sont pas disponibles (Windows)
+DEFAULT_PORT = 8765
+
+# Délai avant une nouvelle tentative de connexion après un échec (secondes)
+RECONNECT_DELAY = 30.0
+
+
+def default_address():
+    """Socket Unix dans le dossier de cache, ou 127.0.0.1:8765 sans AF_UNIX."""
+    if hasattr(socket, "AF_UNIX"):
+        return os.path.join(CACHE_DIR, "trm.sock")
+    return ("127.0.0.1", DEFAULT_PORT)
+
+
+def parse_address(value):
+    """'1' → adresse par défaut, 'hôte:port' → TCP, sinon chemin de socket Unix."""
+    if value in ("1", "true", "yes"):
+        return default_address()
+    match = re.fullmatch(r"([\w.-]+):(\d+)", value)
+    if match:
+        return (match.group(1), int(match.group(2)))
+    return value
+
+
+def service_address():
+    """Adresse du service configurée (FREYA_TRM_SERVICE), None si désactivé."""
+    value = os.getenv("FREYA_TRM_SERVICE", "").strip()
+    if not value or value in ("0", "false", "no"):
+        return None
+    return parse_address(value)
+
+
+def _connect(address, timeout):
+    if isinstance(address, tuple):
+        return socket.create_connection(address, timeout=timeout)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+class _Job:
+    """Requête en attente dans la file du service."""
+
+    __slots__ = ("method", "params", "response", "done")
+
+    def __init__(self, method, params):
+        self.method = method
+        self.params = params
+        self.response = None
+        self.done = threading.Event()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Connexion d'un client: lit les requêtes ligne par ligne."""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("objet JSON attendu")
+                params = request.get("params") or {}
+                if not isinstance(params, dict):
+                    raise ValueError("params doit être un objet JSON")
+                response = self.server.service.submit(request.get("method"), params)
+            except ValueError as e:
+                response = {"error": f"Requête invalide: {e}"}
+            self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.wfile.flush()
+            if self.server.service.stopped:
+                break
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class TRMService:
+    """Démon de validation: une instance Llama, une file, un thread de traitement."""
+
+    def __init__(self, address=None, validator=None):
+        self.address = address or default_address()
+        self.validator = validator
+        self.queue = queue.Queue()
+        self.handled = 0
+        self.started = time.time()
+        self.stopped = False
+        self._server = None
+
+    def _execute(self, method, params):
+        try:
+            if method == "validate":
+                result = self.validator.validate(
+                    params["tool_name"], params.get("arguments") or {}, params.get("user_request", ""),
+                    use_trm=params.get("use_trm", True)
+                )
+            elif method == "validate_plan":
+                result = self.validator.validate_plan(params.get("plan"), params.get("user_request", ""))
+            elif method == "status":
+                result = dict(
+                    self.validator.status(),
+                    pid=os.getpid(),
+                    queued=self.queue.qsize(),
+                    handled=self.handled,
+                    uptime=time.time() - self.started
+                )
+            else:
+                return {"error": f"Méthode inconnue: {method}"}
+            return {"result": result}
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+
+    def _worker(self):
+        """Traite les requêtes une par une (accès exclusif au modèle)."""
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            job.response = self._execute(job.method, job.params)
+            self.handled += 1
+            job.done.set()
+
+        # Service arrêté: les requêtes restantes reçoivent une erreur
+        while True:
+            try:
+                job = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job.response = {"error": "Service TRM arrêté"}
+                job.done.set()
+
+    def submit(self, method, params):
+        """Place une requête dans la file et attend sa réponse."""
+        if self.stopped:
+            return {"error": "Service TRM arrêté"}
+        job = _Job(method, params)
+        self.queue.put(job)
+        job.done.wait()
+        return job.response
+
+    def _bind(self):
+        if isinstance(self.address, tuple):
+            return _TCPServer(self.address, _Handler)
+        if os.path.exists(self.address):
+            # Socket restante d'un service arrêté, sauf si un service répond encore
+            try:
+                _connect(self.address, 1.0).close()
+                raise RuntimeError(f"Un service TRM écoute déjà sur {self.address}")
+            except OSError:
+                os.unlink(self.address)
+        os.makedirs(os.path.dirname(self.address) or ".", exist_ok=True)
+        return _UnixServer(self.address, _Handler)
+
+    def serve_forever(self):
+        """Charge le modèle (si besoin) puis sert les requêtes jusqu'à shutdown()."""
+        if self.validator is None:
+            self.validator = TRMValidator(enabled=True)
+        self._server = self._bind()
+        self._server.service = self
+        threading.Thread(target=self._worker, name="freya-trm-worker", daemon=True).start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self.stopped = True
+            self._server.server_close()
+            self.queue.put(None)
+            if not isinstance(self.address, tuple) and os.path.exists(self.address):
+                os.unlink(self.address)
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+
+class TRMServiceClient:
+    """
+    Client du service TRM, avec la même interface que TRMValidator.
+    Si le service est indisponible, la validation se fait dans le processus
+    par règles uniquement (nouvelle tentative de connexion après 30 s).
+    """
+
+    format_validation_result = TRMValidator.format_validation_result
+
+    def __init__(self, address=None, timeout=None):
+        self.address = address or default_address()
+        if timeout is None:
+            timeout = float(os.getenv("FREYA_TRM_SERVICE_TIMEOUT", "30"))
+        self.timeout = timeout
+        self.fallbacks = 0  # Validations faites par règles car le service était indisponible
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+        self._rules = None
+
+    def _close(self):
+        for resource in (self._file, self._sock):
+            if resource is not None:
+                try:
+                    resource.close()
+                except OSError:
+                    pass
+        self._sock = self._file = None
+
+    def _call(self, method, **params):
+        if time.monotonic() < self._retry_at:
+            raise ConnectionError("Service TRM indisponible")
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._sock = _connect(self.address, self.timeout)
+                    self._file = self._sock.makefile("rwb")
+                self._file.write((json.dumps({"method": method, "params": params}, ensure_ascii=False) + "\n").encode("utf-8"))
+                self._file.flush()
+                line = self._file.readline()
+                if not line:
+                    raise ConnectionError("Connexion fermée par le service TRM")
+            except OSError:
+                self._close()
+                self._retry_at = time.monotonic() + RECONNECT_DELAY
+                raise
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def _local_rules(self):
+        """Validateur local sans modèle (règles statiques)."""
+        if self._rules is None:
+            self._rules = TRMValidator(enabled=False, verbose=False)
+        return self._rules
+
+    def _rules_only(self, error):
+        """Validateur local sans modèle, utilisé quand le service ne répond pas."""
+        self.fallbacks += 1
+        get_tracer().annotate(trm_service="unavailable")
+        if self.fallbacks == 1:
+            print(f"⚠️ Service TRM indisponible ({error}): validation par règles uniquement")
+        return self._local_rules()
+
+    def validate(self, tool_name: str, arguments: dict, user_request: str, use_trm: bool = True) -> dict:
+        if not use_trm:
+            # Règles seules: pas besoin du modèle, donc pas d'aller-retour avec le service
+            return self._local_rules().validate(tool_name, arguments, user_request, use_trm=False)
+        try:
+            return self._call("validate", tool_name=tool_name, arguments=arguments, user_request=user_request)
+        except (OSError, ValueError, RuntimeError) as e:
+            return self._rules_only(e).validate(tool_name, arguments, user_request)
+
+    @traced("validate_plan")
+    def validate_plan(self, plan: dict, user_request: str) -> dict:
+        try:
+            return self._call("validate_plan", plan=plan, user_request=user_request)
+        except (OSError, ValueError, RuntimeError) as e:
+            return self._rules_only(e).validate_plan(plan, user_request)
+
+    def status(self) -> dict:
+        """État du service distant (ou du repli local s'il est indisponible)."""
+        try:
+            return dict(self._call("status"), service=True)
+        except (OSError, ValueError, RuntimeError):
+            return {"ready": True, "loaded": False, "load_time": None, "service": False, "fallbacks": self.fallbacks}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Service de validation TRM partagé")
+    parser.add_argument("--address", help="Chemin de socket Unix ou hôte:port (défaut: FREYA_TRM_SERVICE ou socket du cache)")
+    parser.add_argument("--status", action="store_true", help="Afficher l'état du service en cours")
+    args = parser.parse_args()
+
+    address = parse_address(args.address) if args.address else (service_address() or default_address())
+
+    if args.status:
+        client = TRMServiceClient(address, timeout=5)
+        try:
+            print(json.dumps(client._call("status"), indent=2, ensure_ascii=False))
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"❌ Service TRM injoignable sur {address}: {e}")
+            sys.exit(1)
+        sys.exit(0)
+
+    service = TRMService(address)
+    label = f"{address[0]}:{address[1]}" if isinstance(address, tuple) else address
+    print("🧠 Service TRM: chargement du modèle...")
+    service.validator = TRMValidator(enabled=True)
+    print(f"✅ Service TRM à l'écoute sur {label}")
+    print(f"   FREYA_TRM_SERVICE={label} python main.py")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Service TRM arrêté")
@@ -3,22 +3,70 @@ TRM Validator - Utilise DeepSeek R1 1.5B pour valider les appels d'outils
 Architecture: LLM Groq → Plan → TRM Validation → Exécution
 """
 
-from llama_cpp import Llama
+import hashlib
 import json
 import os
 import re
+import threading
+import time
+import unicodedata
+from disk_cache import CACHE_DIR, DiskCache
+from rules_engine import get_rules_engine
+from tracing import get_tracer, traced
 
 # Configuration du modèle
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "DeepSeek-R1-Distill-Qwen-1.5B-Q8_0.gguf")
 
-# Chemins dangereux à bloquer
-DANGEROUS_PATHS = [
-    "C:\\Windows",
-    "C:\\Program Files",
-    "C:\\Program Files (x86)",
-    "C:\\Users\\Default",
-    "C:\\System32",
-]
+# Taille du contexte du TRM (préfixe fixe + plan + réponse)
+TRM_CTX = int(os.getenv("FREYA_TRM_CTX", "2048"))
+
+# Début fixe des prompts du TRM: évalué une seule fois, état du modèle mis de côté
+# puis restauré à chaque validation (seule la partie variable est évaluée)
+CALL_PROMPT_PREFIX = """You check actions of a personal assistant before they are executed.
+Is the action safe and does it match the user request? Answer ONLY with:
+APPROVED - if action is safe and correct
+REJECTED: <reason> - if action should be blocked
+WARNING: <message> - if action needs attention but can proceed
+
+"""
+
+PLAN_PROMPT_PREFIX = """You check execution plans of a personal assistant before they are executed.
+Validate:
+1. Does the plan match the user's intent?
+2. Is the order of steps correct?
+3. Are there any security risks?
+
+For each step marked [CHECK], answer on its own line:
+<step number>: APPROVED
+<step number>: REJECTED: <reason>
+<step number>: WARNING: <message>
+Then one last line for the whole plan:
+PLAN: APPROVED or PLAN: REJECTED: <reason> or PLAN: SUGGEST: <improvement>
+
+"""
+
+PROMPT_PREFIXES = {"call": CALL_PROMPT_PREFIX, "plan": PLAN_PROMPT_PREFIX}
+
+# Décodage contraint par grammaire GBNF: le modèle ne peut produire qu'un verdict
+# (plus une raison courte), sans texte de raisonnement (FREYA_TRM_GRAMMAR=0 pour le désactiver)
+TRM_GRAMMAR = os.getenv("FREYA_TRM_GRAMMAR", "1") == "1"
+
+_GRAMMAR_RULES = r"""
+verdict ::= "APPROVED" | "REJECTED: " reason | "WARNING: " reason
+reason ::= [^\n]{1,60}
+"""
+
+CALL_GRAMMAR = "root ::= verdict" + _GRAMMAR_RULES
+
+
+def plan_grammar(checked):
+    """Grammaire d'une validation groupée: une ligne par étape vérifiée, puis la ligne PLAN."""
+    lines = " ".join(f'"{number}: " verdict "\\n"' for number in checked)
+    return (
+        f'root ::= {lines} plan\n'
+        'plan ::= "PLAN: " ("APPROVED" | "REJECTED: " reason | "SUGGEST: " reason)'
+        + _GRAMMAR_RULES
+    )
 
 # Actions qui nécessitent validation TRM (seulement si règles passent)
 TRM_VALIDATED_ACTIONS = ["modify_file", "git_push"]  # delete_path géré par règles
@@ -26,41 +74,364 @@ TRM_VALIDATED_ACTIONS = ["modify_file", "git_push"]  # delete_path géré par r
 # Actions dangereuses qui nécessitent une attention particulière
 HIGH_RISK_ACTIONS = ["delete_path", "modify_file", "git_push", "git_workflow"]
 
+# Attente max du modèle en cours de chargement avant de valider par règles seules (secondes)
+TRM_WAIT = float(os.getenv("FREYA_TRM_WAIT", "0"))
+
+# Arguments contenant un chemin (normalisés dans la clé du cache de verdicts)
+PATH_ARGS = ("path", "filename", "target_path")
+
+
+def _normalize_request(text):
+    """Requête utilisateur normalisée: casse, espaces et ponctuation finale ignorés."""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return re.sub(r"\s+", " ", text).strip(" .!?;")
+
+
+def _canonical_args(arguments):
+    """Arguments triés, chemins normalisés (même action = même clé)."""
+    canonical = {}
+    for name, value in sorted((arguments or {}).items()):
+        if name in PATH_ARGS and isinstance(value, str) and value:
+            value = os.path.normpath(value)
+        canonical[name] = value
+    return canonical
+
+
+def verdict_key(kind, payload, user_request):
+    """
+    Clé du cache de verdicts: type de validation ("call" ou "plan"), action(s)
+    avec arguments canoniques, requête normalisée et modèle utilisé.
+    """
+    data = json.dumps({
+        "kind": kind,
+        "payload": payload,
+        "request": _normalize_request(user_request),
+        "model": os.path.basename(MODEL_PATH),
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """
+    Cache des verdicts du TRM (LRU borné, TTL distincts pour les approbations
+    et les rejets). Chaque hit évite une inférence locale: le temps CPU et le
+    temps d'attente économisés sont comptés.
+    """
+
+    def __init__(self, path=":memory:", max_entries=1000, approved_ttl=3600.0, rejected_ttl=600.0):
+        """
+        Args:
+            path: fichier SQLite (":memory:" = non persistant)
+            approved_ttl / rejected_ttl: durée de vie des approbations / des rejets (secondes)
+        """
+        self.cache = DiskCache(path, max_entries=max_entries, memory_entries=max_entries)
+        self.approved_ttl = approved_ttl
+        self.rejected_ttl = rejected_ttl
+        self.approved_hits = 0
+        self.rejected_hits = 0
+        self.cpu_saved = 0.0  # Temps CPU d'inférence économisé (secondes)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Verdict en cache, None si absent ou expiré."""
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        with self._lock:
+            if entry["result"]["approved"]:
+                self.approved_hits += 1
+            else:
+                self.rejected_hits += 1
+            self.cpu_saved += entry["cpu"]
+        return entry["result"]
+
+    def set(self, key, result, seconds, cpu):
+        """Enregistre un verdict (seconds / cpu = coût de l'inférence)."""
+        ttl = self.approved_ttl if result["approved"] else self.rejected_ttl
+        if ttl > 0:
+            self.cache.set(key, {"result": result, "cpu": cpu}, ttl=ttl, cost=seconds)
+
+    def stats(self):
+        """Compteurs: hits par verdict, taux de hit, temps d'inférence et CPU économisés."""
+        stats = self.cache.stats()
+        stats.update(
+            approved_hits=self.approved_hits,
+            rejected_hits=self.rejected_hits,
+            cpu_saved_seconds=round(self.cpu_saved, 3)
+        )
+        return stats
+
+
+# Instance globale du cache de verdicts
+_verdict_cache = None
+_verdict_cache_lock = threading.Lock()
+
+def get_verdict_cache():
+    """
+    Retourne le cache global des verdicts TRM (None si désactivé avec FREYA_TRM_CACHE=0).
+
+    Configuration:
+        FREYA_TRM_CACHE_SIZE: nombre max de verdicts (défaut 1000)
+        FREYA_TRM_CACHE_TTL: durée de vie d'une approbation en secondes (défaut 1 heure)
+        FREYA_TRM_CACHE_REJECT_TTL: durée de vie d'un rejet en secondes (défaut 10 minutes)
+        FREYA_TRM_CACHE_PERSIST=1: conserve les verdicts sur disque entre les sessions
+    """
+    global _verdict_cache
+    if os.getenv("FREYA_TRM_CACHE", "1") == "0":
+        return None
+    with _verdict_cache_lock:
+        if _verdict_cache is None:
+            persist = os.getenv("FREYA_TRM_CACHE_PERSIST", "0") == "1"
+            _verdict_cache = VerdictCache(
+                os.path.join(CACHE_DIR, "trm_verdicts.sqlite") if persist else ":memory:",
+                max_entries=int(os.getenv("FREYA_TRM_CACHE_SIZE", "1000")),
+                approved_ttl=float(os.getenv("FREYA_TRM_CACHE_TTL", "3600")),
+                rejected_ttl=float(os.getenv("FREYA_TRM_CACHE_REJECT_TTL", "600"))
+            )
+    return _verdict_cache
+
+
+# Verdict d'une étape: "2: REJECTED: raison", "Step 2 - APPROVED"...
+STEP_VERDICT_RE = re.compile(r"^\W*(?:STEP\s*)?#?(\d+)\s*[:.)\-]?\s*(APPROVED|REJECTED|WARNING)\b\W*(.*)$", re.IGNORECASE)
+# Repli: numéro d'étape et verdict n'importe où dans la ligne ("step 3 is rejected because ...")
+LOOSE_STEP_VERDICT_RE = re.compile(r"\bSTEP\s*#?(\d+)\b.*?\b(APPROVED|REJECTED|WARNING)\b\W*(.*)$", re.IGNORECASE)
+PLAN_VERDICT_RE = re.compile(r"^\W*PLAN\W*(APPROVED|REJECTED|SUGGEST)\b\W*(.*)$", re.IGNORECASE)
+
+
+def parse_batch_verdicts(output: str, checked: list):
+    """
+    Lit la réponse d'une validation groupée.
+
+    Args:
+        checked: numéros des étapes pour lesquelles un verdict est attendu
+
+    Returns:
+        (verdicts, plan_verdict) - verdicts = {numéro: (APPROVED|REJECTED|WARNING, message)},
+        plan_verdict = (APPROVED|REJECTED|SUGGEST, message) ou None
+    """
+    verdicts = {}
+    plan_verdict = None
+    for line in output.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        match = PLAN_VERDICT_RE.match(line)
+        if match:
+            plan_verdict = (match.group(1).upper(), match.group(2).strip())
+            continue
+        match = STEP_VERDICT_RE.match(line) or LOOSE_STEP_VERDICT_RE.search(line)
+        if match and int(match.group(1)) in checked:
+            verdicts.setdefault(int(match.group(1)), (match.group(2).upper(), match.group(3).strip()))
+    
+    # Repli: réponse libre sans numéros d'étape (ancien format APPROVED / REJECTED / SUGGEST)
+    if not verdicts and plan_verdict is None:
+        upper = output.upper()
+        for kind in ("REJECTED", "SUGGEST"):
+            if kind in upper:
+                plan_verdict = (kind, output[upper.rindex(kind) + len(kind):].lstrip(" :").strip())
+                break
+    return verdicts, plan_verdict
+
+
 class TRMValidator:
-    def __init__(self, enabled=True):
+    def __init__(self, enabled=True, background=False, wait=None, verbose=True):
+        """
+        Args:
+            background: charge le modèle dans un thread de fond; en attendant,
+                        la validation se fait par règles uniquement
+            wait: attente max du chargement lors d'une validation (secondes,
+                  défaut FREYA_TRM_WAIT=0)
+            verbose: affiche l'état du chargement
+        """
         self.enabled = enabled
+        self.verbose = verbose
         self.llm = None
-        self._load_model()
+        self._llm_lock = threading.Lock()  # llama.cpp n'est pas thread-safe (étapes de plan parallèles)
+        self.wait = TRM_WAIT if wait is None else wait
+        self.ready = threading.Event()  # Posé quand le chargement est terminé (réussi ou non)
+        self.load_time = None  # Durée du chargement (secondes)
+        self.rules_only_checks = 0  # Validations faites sans TRM car le modèle chargeait encore
+        self._prefix_states = {}  # Type de prompt -> (état du modèle après le préfixe, nombre de tokens)
+        self.use_grammar = TRM_GRAMMAR
+        self._grammars = {}  # Texte de la grammaire -> LlamaGrammar compilée
+        # Latence, tokens générés et réponses illisibles, par mode de décodage
+        self.decoding_stats = {
+            mode: {"calls": 0, "seconds": 0.0, "tokens": 0, "parse_failures": 0}
+            for mode in ("free", "grammar")
+        }
+        self._stats_lock = threading.Lock()
+        if background:
+            threading.Thread(target=self._load_model, name="freya-trm-warmup", daemon=True).start()
+        else:
+            self._load_model()
     
     def _load_model(self):
         """Charge le modèle TRM."""
-        if not self.enabled:
-            print("⚠️ TRM Validator désactivé")
-            return
-        
-        if not os.path.exists(MODEL_PATH):
-            print(f"⚠️ Modèle TRM non trouvé: {MODEL_PATH}")
-            print("   Le validateur fonctionnera en mode règles uniquement.")
-            return
-        
+        start = time.perf_counter()
         try:
-            print("🧠 Chargement du TRM (DeepSeek R1 1.5B)...")
-            self.llm = Llama(
-                model_path=MODEL_PATH,
-                n_ctx=1024,      # Contexte réduit pour la validation
-                n_threads=4,
-                n_gpu_layers=0,  # CPU pour l'instant
-                verbose=False
-            )
-            print("✅ TRM chargé avec succès")
-        except Exception as e:
-            print(f"⚠️ Erreur chargement TRM: {e}")
-            self.llm = None
+            if not self.enabled:
+                if self.verbose:
+                    print("⚠️ TRM Validator désactivé")
+                return
+            
+            if not os.path.exists(MODEL_PATH):
+                print(f"⚠️ Modèle TRM non trouvé: {MODEL_PATH}")
+                print("   Le validateur fonctionnera en mode règles uniquement.")
+                return
+            
+            try:
+                if self.verbose:
+                    print("🧠 Chargement du TRM (DeepSeek R1 1.5B)...")
+                from llama_cpp import Llama  # Importé seulement si le modèle est présent
+                self.llm = Llama(
+                    model_path=MODEL_PATH,
+                    n_ctx=TRM_CTX,   # Préfixe fixe + plan + réponse (FREYA_TRM_CTX)
+                    n_threads=4,
+                    n_gpu_layers=0,  # CPU pour l'instant
+                    use_mmap=True,   # GGUF mappé en mémoire (pages partagées par le cache système)
+                    verbose=False
+                )
+                self._snapshot_prefixes()
+                if self.verbose:
+                    print(f"✅ TRM chargé avec succès ({time.perf_counter() - start:.1f}s)")
+            except Exception as e:
+                print(f"⚠️ Erreur chargement TRM: {e}")
+                self.llm = None
+        finally:
+            self.load_time = time.perf_counter() - start
+            self.ready.set()
+    
+    def _model(self):
+        """
+        Modèle TRM à utiliser pour une validation, None si indisponible.
+        Pendant le chargement, attend au plus self.wait secondes puis passe
+        en validation par règles uniquement.
+        """
+        if not self.ready.is_set() and not self.ready.wait(self.wait):
+            self.rules_only_checks += 1
+            get_tracer().annotate(trm_ready=False)
+            return None
+        return self.llm
+    
+    def _snapshot_prefixes(self):
+        """
+        Évalue chaque préfixe fixe une fois et garde l'état du modèle (cache KV).
+        Sans save_state/load_state (ancienne version de llama-cpp-python), les
+        prompts complets sont évalués à chaque appel.
+        """
+        for kind, prefix in PROMPT_PREFIXES.items():
+            try:
+                tokens = self.llm.tokenize(prefix.encode("utf-8"), special=True)
+                self.llm.reset()
+                self.llm.eval(tokens)
+                self._prefix_states[kind] = (self.llm.save_state(), len(tokens))
+            except Exception as e:
+                if self.verbose:
+                    print(f"⚠️ Préfixe TRM non mis en cache ({kind}): {e}")
+                self._prefix_states.pop(kind, None)
+    
+    def _grammar(self, text):
+        """Grammaire compilée (mémorisée), None si le décodage contraint est indisponible."""
+        if not self.use_grammar:
+            return None
+        grammar = self._grammars.get(text)
+        if grammar is None:
+            try:
+                from llama_cpp import LlamaGrammar
+                grammar = LlamaGrammar.from_string(text, verbose=False)
+            except Exception as e:
+                print(f"⚠️ Grammaire TRM indisponible, décodage libre: {e}")
+                self.use_grammar = False
+                return None
+            self._grammars[text] = grammar
+        return grammar
     
-    def validate(self, tool_name: str, arguments: dict, user_request: str) -> dict:
+    def _complete(self, kind: str, suffix: str, grammar=None, **kwargs) -> str:
+        """
+        Génère la réponse du TRM au prompt PROMPT_PREFIXES[kind] + suffix.
+        L'état après le préfixe est restauré: llama.cpp reconnaît le début
+        commun du prompt et n'évalue que la partie variable.
+        Avec une grammaire, la sortie est contrainte au format des verdicts.
+        """
+        if grammar is not None:
+            kwargs["grammar"] = grammar
+        start = time.perf_counter()
+        with self._llm_lock:
+            snapshot = self._prefix_states.get(kind)
+            if snapshot is not None:
+                self.llm.load_state(snapshot[0])
+                get_tracer().annotate(prefix_tokens_reused=snapshot[1])
+            response = self.llm(PROMPT_PREFIXES[kind] + suffix, **kwargs)
+        
+        tokens = (response.get("usage") or {}).get("completion_tokens", 0)
+        with self._stats_lock:
+            stats = self.decoding_stats["grammar" if grammar is not None else "free"]
+            stats["calls"] += 1
+            stats["seconds"] += time.perf_counter() - start
+            stats["tokens"] += tokens
+        get_tracer().annotate(grammar=grammar is not None, completion_tokens=tokens)
+        return response["choices"][0]["text"].strip()
+    
+    def _parse_failed(self, grammar):
+        """Compte une réponse du TRM sans verdict lisible."""
+        with self._stats_lock:
+            self.decoding_stats["grammar" if grammar is not None else "free"]["parse_failures"] += 1
+    
+    def decoding_report(self) -> dict:
+        """Latence moyenne, tokens générés et taux de réponses illisibles par mode de décodage."""
+        report = {}
+        with self._stats_lock:
+            for mode, stats in self.decoding_stats.items():
+                calls = stats["calls"]
+                report[mode] = {
+                    "calls": calls,
+                    "avg_latency": stats["seconds"] / calls if calls else None,
+                    "avg_tokens": stats["tokens"] / calls if calls else None,
+                    "parse_failures": stats["parse_failures"],
+                    "parse_failure_rate": stats["parse_failures"] / calls if calls else None,
+                }
+        return report
+    
+    def status(self) -> dict:
+        """État du chargement du modèle (prêt, chargé, durée), des préfixes en cache et du cache de verdicts."""
+        cache = get_verdict_cache()
+        return {
+            "ready": self.ready.is_set(),
+            "loaded": self.llm is not None,
+            "load_time": self.load_time,
+            "rules_only_checks": self.rules_only_checks,
+            "prefix_tokens": {kind: tokens for kind, (_, tokens) in self._prefix_states.items()},
+            "decoding": self.decoding_report(),
+            "verdict_cache": cache.stats() if cache is not None else None
+        }
+    
+    def _cached_verdict(self, kind, payload, user_request, infer):
+        """
+        Verdict du TRM depuis le cache, sinon infer() puis mise en cache.
+        Les validations en erreur ne sont pas mises en cache.
+        """
+        cache = get_verdict_cache()
+        key = verdict_key(kind, payload, user_request) if cache is not None else None
+        if cache is not None:
+            verdict = cache.get(key)
+            if verdict is not None:
+                get_tracer().annotate(verdict_cache_hit=True)
+                return verdict
+        
+        start, cpu_start = time.perf_counter(), time.process_time()
+        verdict = infer()
+        failed = verdict.pop("_failed", False)
+        if cache is not None and not failed:
+            cache.set(key, verdict, time.perf_counter() - start, time.process_time() - cpu_start)
+        return verdict
+    
+    def validate(self, tool_name: str, arguments: dict, user_request: str, use_trm: bool = True) -> dict:
         """
         Valide un appel d'outil avant exécution.
         
+        Args:
+            use_trm: False pour les règles seules (étape d'un plan déjà validé par le TRM)
+        
         Returns:
             {
                 "approved": bool,
@@ -84,8 +455,11 @@ class TRMValidator:
         result["warnings"].extend(rule_check.get("warnings", []))
         
         # 2. Validation par TRM (si disponible et action sensible)
-        if self.llm and tool_name in TRM_VALIDATED_ACTIONS:
-            trm_check = self._validate_with_trm(tool_name, arguments, user_request)
+        if use_trm and tool_name in TRM_VALIDATED_ACTIONS and self._model():
+            trm_check = self._cached_verdict(
+                "call", {"tool": tool_name, "args": _canonical_args(arguments)}, user_request,
+                lambda: self._validate_with_trm(tool_name, arguments, user_request)
+            )
             if not trm_check["approved"]:
                 return trm_check
             result["warnings"].extend(trm_check.get("warnings", []))
@@ -93,109 +467,38 @@ class TRMValidator:
         return result
     
     def _check_rules(self, tool_name: str, arguments: dict) -> dict:
-        """Validation par règles statiques (rapide)."""
-        result = {"approved": True, "reason": "", "warnings": []}
-        
-        # Vérifier les chemins dangereux
-        path_args = ["path", "filename", "target_path"]
-        for arg in path_args:
-            if arg in arguments:
-                path = arguments[arg]
-                if isinstance(path, str):
-                    # Normaliser le chemin
-                    norm_path = os.path.normpath(path).upper()
-                    
-                    # Vérifier les chemins système
-                    for dangerous in DANGEROUS_PATHS:
-                        if norm_path.startswith(dangerous.upper()):
-                            result["approved"] = False
-                            result["reason"] = f"🚫 BLOQUÉ: Chemin système protégé ({dangerous})"
-                            return result
-                    
-                    # Avertissement pour chemins sensibles
-                    if "WINDOWS" in norm_path or "SYSTEM32" in norm_path:
-                        result["warnings"].append(f"⚠️ Attention: chemin sensible détecté ({path})")
-        
-        # Vérifier delete_path
-        if tool_name == "delete_path":
-            path = arguments.get("path", "")
-            if path in [".", "/", "\\", "C:\\", "D:\\"]:
-                result["approved"] = False
-                result["reason"] = "🚫 BLOQUÉ: Tentative de suppression de la racine"
-                return result
-            
-            # Avertir pour les suppressions de dossiers
-            if os.path.isdir(path):
-                result["warnings"].append(f"⚠️ Suppression d'un dossier: {path}")
-        
-        # Vérifier write_file sur fichiers de code existants (DANGEREUX - écrase!)
-        if tool_name == "write_file":
-            filename = arguments.get("filename", "")
-            code_extensions = [".py", ".js", ".ts", ".java", ".cpp", ".c", ".h", ".cs", ".go", ".rs", ".rb", ".php"]
-            is_code_file = any(filename.endswith(ext) for ext in code_extensions)
-            file_exists = os.path.exists(filename)
-            
-            if is_code_file and file_exists:
-                result["approved"] = False
-                result["reason"] = f"🚫 BLOQUÉ: write_file sur fichier de code existant '{filename}'. Utilise modify_file avec action='append' pour ajouter du code!"
-                return result
-        
-        # Vérifier git_push (pas de push sur main sans confirmation)
-        if tool_name == "git_push":
-            branch = arguments.get("branch", "main")
-            if branch == "main":
-                result["warnings"].append("⚠️ Push sur la branche main")
-        
-        # Vérifier les arguments requis
-        required_args = {
-            "write_file": ["filename", "content"],
-            "read_file": ["filename"],
-            "delete_path": ["path"],
-            "create_folder": ["path"],
-            "modify_file": ["filename", "replacement_text"],  # search_text peut être vide pour append
-        }
-        
-        if tool_name in required_args:
-            for req in required_args[tool_name]:
-                if req not in arguments or not arguments[req]:
-                    result["approved"] = False
-                    result["reason"] = f"🚫 Argument manquant: {req}"
-                    return result
-        
-        return result
+        """Validation par règles statiques (rapide, politique compilée de rules_engine)."""
+        return get_rules_engine().check(tool_name, arguments)
     
     def _validate_with_trm(self, tool_name: str, arguments: dict, user_request: str) -> dict:
         """Validation avec le modèle TRM (pour actions sensibles)."""
         result = {"approved": True, "reason": "", "warnings": []}
         
-        # Construire le prompt de validation
-        prompt = f"""Validate this action:
+        # Partie variable du prompt (le préfixe fixe est déjà évalué)
+        suffix = f"""Validate this action:
 User request: "{user_request}"
 Tool: {tool_name}
 Arguments: {json.dumps(arguments, ensure_ascii=False)}
 
-Is this action safe and matches the user request? Answer ONLY with:
-APPROVED - if action is safe and correct
-REJECTED: <reason> - if action should be blocked
-WARNING: <message> - if action needs attention but can proceed
-
 Answer:"""
 
         try:
-            response = self.llm(
-                prompt,
-                max_tokens=100,
+            grammar = self._grammar(CALL_GRAMMAR)
+            output = self._complete(
+                "call", suffix, grammar=grammar,
+                max_tokens=24 if grammar is not None else 100,
                 temperature=0.1,
                 stop=["\\n\\n", "User:", "Validate", "<think>", "</think>"]
             )
             
-            output = response["choices"][0]["text"].strip()
-            
             # Nettoyer la sortie du modèle (enlever les balises think)
             if "<think>" in output.lower():
                 output = output.split("</think>")[-1].strip()
             output = output.upper()
             
+            if not any(verdict in output for verdict in ("APPROVED", "REJECTED", "WARNING")):
+                self._parse_failed(grammar)
+            
             if "REJECTED" in output:
                 result["approved"] = False
                 # Extraire la raison après REJECTED
@@ -209,9 +512,11 @@ Answer:"""
         except Exception as e:
             # En cas d'erreur TRM, on laisse passer avec warning
             result["warnings"].append(f"⚠️ Validation TRM échouée: {e}")
+            result["_failed"] = True
         
         return result
     
+    @traced("validate_plan")
     def validate_plan(self, plan: dict, user_request: str) -> dict:
         """
         Valide un plan d'exécution complet AVANT que Groq ne l'exécute.
@@ -233,7 +538,8 @@ Answer:"""
                 "corrected_plan": dict | None,  # Plan corrigé si nécessaire
                 "blocked_steps": list,  # Étapes bloquées avec raison
                 "warnings": list[str],
-                "feedback": str  # Message à renvoyer à Groq
+                "feedback": str,  # Message à renvoyer à Groq
+                "trm_checked_steps": list[int]  # Étapes (du plan à exécuter) évaluées par le TRM
             }
         """
         result = {
@@ -241,7 +547,8 @@ Answer:"""
             "corrected_plan": None,
             "blocked_steps": [],
             "warnings": [],
-            "feedback": ""
+            "feedback": "",
+            "trm_checked_steps": []
         }
         
         if not plan or "steps" not in plan:
@@ -249,14 +556,14 @@ Answer:"""
             result["feedback"] = "Plan invalide: format incorrect. Le plan doit contenir 'steps'."
             return result
         
-        corrected_steps = []
+        steps = plan.get("steps", [])
+        kept = []  # Indices (0-based) des étapes approuvées par les règles
         
-        for i, step in enumerate(plan.get("steps", [])):
+        # Valider toutes les étapes avec les règles (un accès disque par chemin)
+        rule_checks = get_rules_engine().check_plan(steps)
+        
+        for i, (step, step_validation) in enumerate(zip(steps, rule_checks)):
             action = step.get("action", "")
-            args = step.get("args", {})
-            
-            # Valider chaque étape avec les règles
-            step_validation = self._check_rules(action, args)
             
             if not step_validation["approved"]:
                 result["blocked_steps"].append({
@@ -266,25 +573,56 @@ Answer:"""
                 })
                 result["approved"] = False
             else:
-                # Étape valide, l'ajouter au plan corrigé
-                corrected_steps.append(step)
+                # Étape valide, gardée pour le plan corrigé
+                kept.append(i)
                 result["warnings"].extend(step_validation.get("warnings", []))
         
-        # Si actions sensibles, valider avec TRM
-        has_high_risk = any(
-            step.get("action") in HIGH_RISK_ACTIONS 
-            for step in plan.get("steps", [])
-        )
+        # Si actions sensibles, valider avec TRM les étapes restantes (celles qui seront exécutées)
+        has_high_risk = any(steps[i].get("action") in HIGH_RISK_ACTIONS for i in kept)
+        scored = set()  # Indices (0-based) des étapes ayant reçu un verdict du TRM
         
-        if self.llm and has_high_risk and result["approved"]:
-            trm_validation = self._validate_plan_with_trm(plan, user_request)
+        if has_high_risk and self._model():
+            trm_steps = list(kept)  # Étape n du plan soumis au TRM = steps[trm_steps[n - 1]]
+            trm_plan = plan if len(kept) == len(steps) else {
+                "summary": plan.get("summary", ""),
+                "steps": [steps[i] for i in kept]
+            }
+            payload = [
+                {"action": step.get("action"), "args": _canonical_args(step.get("args"))}
+                for step in trm_plan["steps"]
+            ]
+            trm_validation = self._cached_verdict(
+                "plan", payload, user_request,
+                lambda: self._validate_plan_with_trm(trm_plan, user_request)
+            )
             if not trm_validation["approved"]:
                 result["approved"] = False
                 result["feedback"] = trm_validation.get("feedback", "Plan rejeté par TRM")
+                kept = []  # Plan rejeté dans son ensemble
             else:
                 result["warnings"].extend(trm_validation.get("warnings", []))
                 if trm_validation.get("suggestions"):
                     result["feedback"] = trm_validation["suggestions"]
+                # Étapes rejetées individuellement: retirées du plan corrigé
+                rejected = set()
+                for verdict in trm_validation.get("step_verdicts", []):
+                    index = trm_steps[verdict["step"] - 1]
+                    scored.add(index)
+                    if not verdict["approved"]:
+                        rejected.add(index)
+                        result["blocked_steps"].append({
+                            "step": index + 1,
+                            "action": verdict["action"],
+                            "reason": f"Rejeté par TRM: {verdict['message'] or 'action jugée incorrecte'}"
+                        })
+                if rejected:
+                    result["approved"] = False
+                    kept = [i for i in kept if i not in rejected]
+        
+        corrected_steps = [steps[i] for i in kept]
+        # Étapes évaluées par le TRM, numérotées dans le plan à exécuter (plan corrigé s'il y en a un):
+        # les autres étapes sensibles sont revalidées avec le TRM juste avant leur exécution
+        result["trm_checked_steps"] = [n for n, i in enumerate(kept, 1) if i in scored]
         
         # Construire le plan corrigé
         if corrected_steps:
@@ -305,60 +643,110 @@ Answer:"""
         else:
             result["feedback"] = "✅ Plan validé - Prêt pour exécution"
         
+        get_tracer().annotate(
+            approved=result["approved"],
+            steps=len(plan.get("steps", [])),
+            blocked=len(result["blocked_steps"])
+        )
         return result
     
-    def _validate_plan_with_trm(self, plan: dict, user_request: str) -> dict:
-        """Validation du plan complet avec TRM."""
-        result = {"approved": True, "warnings": [], "suggestions": "", "feedback": ""}
-        
-        # Construire un résumé du plan pour le TRM
-        steps_summary = "\n".join([
-            f"{i+1}. {s.get('action')}({json.dumps(s.get('args', {}), ensure_ascii=False)[:100]})"
-            for i, s in enumerate(plan.get("steps", []))
-        ])
-        
-        prompt = f"""Analyze this execution plan:
+    def _batch_prompt(self, plan: dict, user_request: str):
+        """
+        Partie variable du prompt de validation groupée (après PLAN_PROMPT_PREFIX):
+        tout le plan, les étapes sensibles marquées [CHECK] reçoivent chacune un
+        verdict sur une ligne.
+
+        Returns:
+            (suffixe du prompt, numéros des étapes à vérifier)
+        """
+        lines = []
+        checked = []
+        for i, step in enumerate(plan.get("steps", [])):
+            action = step.get("action")
+            args = json.dumps(step.get("args", {}), ensure_ascii=False)[:100]
+            mark = ""
+            if action in HIGH_RISK_ACTIONS:
+                checked.append(i + 1)
+                mark = "  [CHECK]"
+            lines.append(f"{i+1}. {action}({args}){mark}")
+        steps_summary = "\n".join(lines)
+        
+        suffix = f"""Analyze this execution plan:
 User request: "{user_request}"
 
 Plan steps:
 {steps_summary}
 
-Validate:
-1. Does the plan match the user's intent?
-2. Is the order of steps correct?
-3. Are there any security risks?
-
-Answer with ONE line:
-APPROVED - if plan is correct
-REJECTED: <reason> - if plan should be blocked
-SUGGEST: <improvement> - if plan can be improved
-
-Answer:"""
+Answers:
+"""
+        return suffix, checked
+    
+    @traced("trm_inference")
+    def _validate_plan_with_trm(self, plan: dict, user_request: str) -> dict:
+        """
+        Validation du plan complet avec TRM, en une seule inférence: un verdict
+        par étape sensible et un verdict global.
+        Les étapes sans verdict lisible sont revalidées une par une.
+        """
+        result = {"approved": True, "warnings": [], "suggestions": "", "feedback": "", "step_verdicts": []}
+        steps = plan.get("steps", [])
+        suffix, checked = self._batch_prompt(plan, user_request)
 
         try:
-            response = self.llm(
-                prompt,
-                max_tokens=150,
+            grammar = self._grammar(plan_grammar(checked))
+            output = self._complete(
+                "plan", suffix, grammar=grammar,
+                max_tokens=24 * (len(checked) + 1) if grammar is not None else min(400, 60 + 40 * len(checked)),
                 temperature=0.1,
                 stop=["\n\n", "User:", "Analyze", "<think>"]
             )
-            
-            output = response["choices"][0]["text"].strip()
-            
-            # Nettoyer
-            if "<think>" in output.lower():
-                output = output.split("</think>")[-1].strip()
-            
-            output_upper = output.upper()
-            
-            if "REJECTED" in output_upper:
-                result["approved"] = False
-                result["feedback"] = output.split("REJECTED")[-1].replace(":", "").strip()
-            elif "SUGGEST" in output_upper:
-                result["suggestions"] = output.split("SUGGEST")[-1].replace(":", "").strip()
-            
         except Exception as e:
             result["warnings"].append(f"⚠️ Validation TRM plan échouée: {e}")
+            result["_failed"] = True
+            return result
+        
+        # Nettoyer
+        if "<think>" in output.lower():
+            output = output.split("</think>")[-1].strip()
+        
+        verdicts, plan_verdict = parse_batch_verdicts(output, checked)
+        get_tracer().annotate(batched_steps=len(checked), parsed_steps=len(verdicts))
+        if len(verdicts) < len(checked) or plan_verdict is None:
+            self._parse_failed(grammar)
+        
+        if plan_verdict is not None:
+            kind, message = plan_verdict
+            if kind == "REJECTED":
+                result["approved"] = False
+                result["feedback"] = message or "Plan rejeté par TRM"
+                return result
+            if kind == "SUGGEST":
+                result["suggestions"] = message
+        
+        for number in checked:
+            step = steps[number - 1]
+            if number in verdicts:
+                kind, message = verdicts[number]
+            elif step.get("action") in TRM_VALIDATED_ACTIONS:
+                # Verdict illisible: validation individuelle de l'étape
+                single = self._validate_with_trm(step.get("action"), step.get("args", {}), user_request)
+                single.pop("_failed", None)
+                if not single["approved"]:
+                    kind, message = "REJECTED", single["reason"]
+                elif single["warnings"]:
+                    kind, message = "WARNING", "; ".join(single["warnings"])
+                else:
+                    kind, message = "APPROVED", ""
+            else:
+                continue
+            result["step_verdicts"].append({
+                "step": number,
+                "action": step.get("action"),
+                "approved": kind != "REJECTED",
+                "message": message
+            })
+            if kind == "WARNING":
+                result["warnings"].append(f"⚠️ Étape {number} ({step.get('action')}): {message or 'Attention requise'}")
         
         return result
     
@@ -377,15 +765,38 @@ Answer:"""
 # Instance globale du validateur
 _validator = None
 
-def get_validator(enabled=True) -> TRMValidator:
-    """Retourne l'instance globale du validateur TRM."""
+_validator_lock = threading.Lock()
+
+def get_validator(enabled=True, background=False) -> TRMValidator:
+    """
+    Retourne l'instance globale du validateur TRM.
+    Avec FREYA_TRM_SERVICE, c'est un client du service partagé (trm_service.py)
+    au lieu d'un modèle chargé dans ce processus.
+    """
     global _validator
-    if _validator is None:
-        _validator = TRMValidator(enabled=enabled)
+    with _validator_lock:
+        if _validator is None:
+            from trm_service import TRMServiceClient, service_address
+            address = service_address() if enabled else None
+            if address is not None:
+                _validator = TRMServiceClient(address)
+            else:
+                _validator = TRMValidator(enabled=enabled, background=background)
     return _validator
 
 
-def validate_tool_call(tool_name: str, arguments: dict, user_request: str = "") -> dict:
+def warm_up_validator() -> TRMValidator:
+    """
+    Lance le chargement du TRM en arrière-plan (au démarrage de l'agent).
+    Désactivable avec FREYA_TRM_WARMUP=0: le modèle est alors chargé à la
+    première validation.
+    """
+    if os.getenv("FREYA_TRM_WARMUP", "1") != "1":
+        return None
+    return get_validator(background=True)
+
+
+def validate_tool_call(tool_name: str, arguments: dict, user_request: str = "", use_trm: bool = True) -> dict:
     """
     Fonction utilitaire pour valider un appel d'outil.
     
@@ -395,11 +806,100 @@ def validate_tool_call(tool_name: str, arguments: dict, user_request: str = "")
             print(result["reason"])
     """
     validator = get_validator()
-    return validator.validate(tool_name, arguments, user_request)
+    return validator.validate(tool_name, arguments, user_request, use_trm=use_trm)
+
+
+# Plans représentatifs des benchmarks du TRM: (nom, requête, étapes)
+BENCHMARK_PLANS = [
+        ("modifier puis pousser", "ajoute une fonction dans utils.py et push sur dev", [
+            {"action": "modify_file", "args": {"filename": "utils.py", "search_text": "", "replacement_text": "def helper(): pass", "action": "append"}},
+            {"action": "git_push", "args": {"branch": "dev", "message": "Ajout de helper"}},
+        ]),
+        ("trois modifications", "remplace print par logging dans les trois modules", [
+            {"action": "modify_file", "args": {"filename": name, "search_text": "print(", "replacement_text": "logging.info("}}
+            for name in ("agent.py", "tools.py", "main.py")
+        ]),
+        ("nettoyage et workflow git", "supprime le dossier build, corrige le README et publie", [
+            {"action": "delete_path", "args": {"path": "build"}},
+            {"action": "modify_file", "args": {"filename": "README.md", "search_text": "FREYA", "replacement_text": "Freya"}},
+            {"action": "git_workflow", "args": {"message": "Nettoyage", "branch": "main"}},
+            {"action": "git_push", "args": {"branch": "main"}},
+        ]),
+]
+
+
+def benchmark_batched_validation(validator, runs=3):
+    """
+    Compare la validation étape par étape (une inférence par étape sensible)
+    à la validation groupée (une inférence pour tout le plan), sur des plans
+    représentatifs.
+    """
+    print(f"\n{'Plan':<28} {'étapes':>6} {'par étape (s)':>14} {'groupé (s)':>11} {'gain':>6}")
+    print("-" * 70)
+    for name, request, steps in BENCHMARK_PLANS:
+        plan = {"summary": name, "steps": steps}
+        sensitive = [step for step in steps if step["action"] in HIGH_RISK_ACTIONS]
+        per_step, batched = [], []
+        for _ in range(runs):
+            start = time.perf_counter()
+            for step in sensitive:
+                validator._validate_with_trm(step["action"], step["args"], request)
+            per_step.append(time.perf_counter() - start)
+            
+            start = time.perf_counter()
+            validator._validate_plan_with_trm(plan, request)
+            batched.append(time.perf_counter() - start)
+        per_step_median = sorted(per_step)[len(per_step) // 2]
+        batched_median = sorted(batched)[len(batched) // 2]
+        print(f"{name:<28} {len(sensitive):>6} {per_step_median:>14.2f} {batched_median:>11.2f} {per_step_median / batched_median:>5.1f}x")
 
 
-# Test du module
+def benchmark_constrained_decoding(validator, runs=3):
+    """
+    Compare le décodage libre au décodage contraint par grammaire: latence,
+    tokens générés et réponses illisibles, pour les appels seuls et les plans.
+    """
+    print(f"\n{'Mode':<10} {'appels':>7} {'latence moy. (s)':>17} {'tokens moy.':>12} {'illisibles':>11}")
+    print("-" * 62)
+    for use_grammar in (False, True):
+        validator.use_grammar = use_grammar
+        for stats in validator.decoding_stats.values():
+            stats.update(calls=0, seconds=0.0, tokens=0, parse_failures=0)
+        for _ in range(runs):
+            for name, request, steps in BENCHMARK_PLANS:
+                validator._validate_plan_with_trm({"summary": name, "steps": steps}, request)
+                for step in steps:
+                    if step["action"] in TRM_VALIDATED_ACTIONS:
+                        validator._validate_with_trm(step["action"], step["args"], request)
+        mode = "grammar" if use_grammar else "free"
+        report = validator.decoding_report()[mode]
+        if not report["calls"]:
+            print(f"{mode:<10} grammaire indisponible")
+            continue
+        print(f"{mode:<10} {report['calls']:>7} {report['avg_latency']:>17.2f} {report['avg_tokens']:>12.1f} "
+              f"{report['parse_failures']:>5} ({report['parse_failure_rate']:.0%})")
+    validator.use_grammar = TRM_GRAMMAR
+
+
+def run_benchmarks(runs=3):
+    """Benchmarks du TRM (nécessitent le modèle GGUF)."""
+    validator = TRMValidator(enabled=True)
+    if validator.llm is None:
+        print("⚠️ Modèle TRM requis pour le benchmark")
+        return 1
+    os.environ["FREYA_TRM_CACHE"] = "0"  # Chaque validation doit passer par le modèle
+    benchmark_batched_validation(validator, runs)
+    benchmark_constrained_decoding(validator, runs)
+    return 0
+
+
+# Test du module (python trm_validator.py --benchmark: validation groupée vs par étape,
+# décodage libre vs contraint)
 if __name__ == "__main__":
+    import sys
+    if "--benchmark" in sys.argv:
+        sys.exit(run_benchmarks())
+    
     print("=" * 50)
     print("🧪 Test du TRM Validator")
     print("=" * 50)